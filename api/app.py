@@ -1,11 +1,50 @@
 """FastAPI application."""
+import asyncio
 import logging
+import math
+import queue
 import time
-from fastapi import FastAPI, HTTPException
+import uuid
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Optional
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from api.models import QueryRequest, QueryResponse, HealthResponse, ErrorResponse, SourceReference
-from api.startup import initialize_pipeline
-from src.utils import setup_logging
+from fastapi.responses import PlainTextResponse
+from api.concurrency import (
+    PRIORITIES,
+    AdmissionController,
+    ClientPolicy,
+    Overloaded,
+    RateLimiter,
+    SingleFlight,
+    StageExecutors
+)
+from api.models import (
+    QueryRequest,
+    QueryResponse,
+    BatchQueryRequest,
+    BatchQueryResponse,
+    BatchQueryItem,
+    HealthResponse,
+    ReadinessResponse,
+    ErrorResponse,
+    DocumentRequest,
+    IngestionJobResponse,
+    IndexReloadRequest,
+    IndexReloadResponse,
+    SearchHit,
+    SearchRequest,
+    SearchResponse,
+    SourceReference
+)
+from api.startup import StartupProgress, create_ingestion_worker, initialize_pipeline, reload_index
+from src.config import get_config
+from src.data_loader import Document
+from src.deadline import Deadline, DeadlineExceeded
+from src.metrics import REGISTRY
+from src.snapshots import current_snapshot
+from src.utils import PhaseTimer, normalize_question, setup_logging
 
 # Setup logging
 setup_logging("INFO")
@@ -31,77 +70,662 @@ app.add_middleware(
 STATE = {
     "pipeline": None,
     "initialized": False,
-    "error": None
+    "error": None,
+    "config": get_config(),
+    "admission": None,
+    "rate_limiter": RateLimiter(),
+    "executors": None,
+    "single_flight": SingleFlight(),
+    "startup": None,
+    "startup_task": None,
+    "ingestion": None,
+    "reload_lock": None,
+    "snapshot_watcher": None
 }
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize pipeline on startup."""
+DISCONNECT_POLL_INTERVAL = 0.1  # seconds
+STARTUP_RETRY_AFTER = 5  # seconds, while loading without an ETA
+INGEST_RETRY_AFTER = 5  # seconds, when the ingestion queue is full
+API_KEY_HEADER = "X-API-Key"
+
+REQUESTS = REGISTRY.counter("legalrag_requests_total", "API requests", ["endpoint", "status"])
+REQUEST_SECONDS = REGISTRY.histogram("legalrag_request_seconds", "API request latency", ["endpoint"])
+QUEUE_DEPTH = REGISTRY.gauge("legalrag_queue_depth", "Requests waiting for an in-flight slot")
+PRIORITY_QUEUE_DEPTH = REGISTRY.gauge(
+    "legalrag_priority_queue_depth",
+    "Requests waiting for an in-flight slot per priority class",
+    ["priority"]
+)
+IN_FLIGHT = REGISTRY.gauge("legalrag_in_flight_requests", "Requests currently being processed")
+COALESCED = REGISTRY.counter(
+    "legalrag_coalesced_requests_total",
+    "Requests answered by joining an identical in-flight request"
+)
+INGEST_QUEUE_DEPTH = REGISTRY.gauge("legalrag_ingest_queue_depth", "Document ingestion jobs waiting")
+INDEX_RELOADS = REGISTRY.counter("legalrag_index_reloads_total", "Index snapshot hot swaps", ["status"])
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count requests and observe latency per route."""
+    start_time = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        endpoint = route.path if route is not None else "other"
+        REQUESTS.inc(endpoint=endpoint, status=str(status))
+        REQUEST_SECONDS.observe(time.perf_counter() - start_time, endpoint=endpoint)
+
+async def cancel_on_disconnect(request: Request, cancel: Callable[[], Any], done: Callable[[], bool]):
+    """Call cancel() as soon as the client goes away, unless done() first."""
+    while not done():
+        if await request.is_disconnected():
+            logger.info("Client disconnected, cancelling request")
+            cancel()
+            return
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+def queued_with_priority(priority: str) -> int:
+    return STATE["admission"].queued_by_priority()[priority]
+
+async def initialize_in_background(progress: StartupProgress):
+    """Build the pipeline on a worker thread; the server answers probes meanwhile."""
     try:
         logger.info("Initializing RAG pipeline...")
-        STATE["pipeline"] = initialize_pipeline(use_mock=True)  # use_mock=True for demo
+        STATE["pipeline"] = await asyncio.to_thread(
+            initialize_pipeline, STATE["config"], timer=progress.timer
+        )
+        STATE["ingestion"] = create_ingestion_worker(STATE["config"], STATE["pipeline"].embedding_manager)
         STATE["initialized"] = True
+        on_pipeline_ready()
+        progress.finish()
         logger.info("Pipeline initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize pipeline: {e}")
         STATE["error"] = str(e)
         STATE["initialized"] = False
+        progress.fail(str(e))
+
+async def swap_index(snapshot=None) -> dict:
+    """Load a snapshot on a worker thread and swap it in; one reload at a time."""
+    async with STATE["reload_lock"]:
+        try:
+            result = await asyncio.to_thread(reload_index, STATE["pipeline"], STATE["config"], snapshot)
+        except Exception:
+            INDEX_RELOADS.inc(status="error")
+            raise
+        INDEX_RELOADS.inc(status="success")
+        return result
+
+async def watch_snapshots(interval: float):
+    """Swap in a new snapshot whenever the CURRENT pointer changes."""
+    snapshot_dir = Path(STATE["config"].data.snapshot_dir)
+    index = STATE["pipeline"].embedding_manager.index
+    last_seen = index.snapshot if index is not None else None
+    
+    while True:
+        await asyncio.sleep(interval)
+        snapshot = current_snapshot(snapshot_dir)
+        if snapshot is None or snapshot.name == last_seen:
+            continue
+        # Not retried: a broken snapshot stays skipped until CURRENT changes again
+        last_seen = snapshot.name
+        try:
+            await swap_index(snapshot)
+        except Exception as e:
+            logger.error(f"Failed to swap in index snapshot {snapshot.name}: {e}")
+
+def on_pipeline_ready():
+    """Connect the loaded pipeline to this process's server state."""
+    pipeline = STATE["pipeline"]
+    if pipeline.overload_policy is not None:
+        # Requests waiting for an admission slot are waiting for the LLM
+        pipeline.overload_policy.queue_depth = lambda: STATE["admission"].queued
+    
+    interval = STATE["config"].rag.index_watch_interval
+    if interval:
+        STATE["snapshot_watcher"] = asyncio.create_task(watch_snapshots(interval))
+
+@app.on_event("startup")
+async def startup_event():
+    """Start pipeline initialisation in the background (see /ready)."""
+    api_config = STATE["config"].api
+    STATE["admission"] = AdmissionController(api_config.max_in_flight, api_config.max_queue)
+    STATE["executors"] = StageExecutors(api_config.retrieval_workers, api_config.max_in_flight)
+    QUEUE_DEPTH.set_function(lambda: STATE["admission"].queued)
+    for priority in PRIORITIES:
+        PRIORITY_QUEUE_DEPTH.set_function(partial(queued_with_priority, priority), priority=priority)
+    IN_FLIGHT.set_function(lambda: STATE["admission"].in_flight)
+    INGEST_QUEUE_DEPTH.set_function(lambda: STATE["ingestion"].queued if STATE["ingestion"] is not None else None)
+    
+    STATE["reload_lock"] = asyncio.Lock()
+    
+    progress = StartupProgress(STATE["config"].data.startup_timings_path)
+    STATE["startup"] = progress
+    
+    if STATE["pipeline"] is not None:
+        # Pre-fork worker: the parent process already loaded the pipeline
+        logger.info("Using preloaded pipeline")
+        progress.ready = True
+        on_pipeline_ready()
+        return
+    
+    STATE["startup_task"] = asyncio.create_task(initialize_in_background(progress))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop executor and ingestion threads."""
+    if STATE["snapshot_watcher"] is not None:
+        STATE["snapshot_watcher"].cancel()
+    if STATE["executors"] is not None:
+        STATE["executors"].shutdown()
+    if STATE["ingestion"] is not None:
+        STATE["ingestion"].stop()
 
 @app.get("/health", response_model=HealthResponse)
-async def health_check():
-    """Health check endpoint."""
+async def health_check(response: Response):
+    """Liveness: the process is up. Only a failed initialisation reports 503.
+    
+    Use /ready to know whether queries can be served.
+    """
+    if STATE["error"] is not None:
+        response.status_code = 503
     return HealthResponse(
-        status="ok" if STATE["initialized"] else "error",
+        status="error" if STATE["error"] is not None else "ok",
         model_loaded=STATE["initialized"],
         index_loaded=STATE["initialized"]
     )
 
-@app.post("/ask", response_model=QueryResponse)
-async def ask_question(request: QueryRequest):
-    """Main query endpoint."""
+@app.get("/ready", response_model=ReadinessResponse)
+async def readiness_check(response: Response):
+    """Readiness: 200 once the pipeline is loaded, 503 with load progress before."""
+    progress = STATE["startup"]
+    if STATE["error"] is not None:
+        status = "error"
+    elif STATE["initialized"]:
+        status = "ready"
+    else:
+        status = "loading"
+    
+    if status != "ready":
+        response.status_code = 503
     
-    if not STATE["initialized"]:
+    if progress is None:
+        return ReadinessResponse(ready=False, status=status, elapsed_seconds=0.0, error=STATE["error"])
+    
+    return ReadinessResponse(
+        ready=status == "ready",
+        status=status,
+        phase=progress.phase,
+        progress=progress.fraction_done(),
+        eta_seconds=progress.eta_seconds(),
+        elapsed_seconds=time.monotonic() - progress.started_at,
+        timings=progress.timer.timings,
+        error=STATE["error"]
+    )
+
+def require_ready():
+    """Raise 503 until the pipeline is ready; Retry-After follows the startup ETA."""
+    if STATE["initialized"]:
+        return
+    
+    if STATE["error"] is not None:
+        raise HTTPException(status_code=503, detail=f"Pipeline failed to initialize: {STATE['error']}")
+    
+    progress = STATE["startup"]
+    eta = progress.eta_seconds() if progress is not None else None
+    retry_after = max(1, math.ceil(eta)) if eta is not None else STARTUP_RETRY_AFTER
+    phase = progress.phase if progress is not None else None
+    eta_text = f"about {retry_after}s" if eta is not None else "unknown"
+    raise HTTPException(
+        status_code=503,
+        detail=f"Pipeline is loading (phase: {phase}, ETA: {eta_text}). Check /ready.",
+        headers={"Retry-After": str(retry_after)}
+    )
+
+def format_response(result) -> QueryResponse:
+    """Convert a RAGResult into the API response model."""
+    sources = [
+        SourceReference(
+            document=source['document'],
+            chunk_id=source['chunk_id'],
+            similarity=source['similarity']
+        )
+        for source in result.sources
+    ]
+    
+    return QueryResponse(
+        question=result.question,
+        answer=result.answer,
+        sources=sources,
+        latency_ms=result.latency_ms,
+        confidence_score=result.confidence_score,
+        truncated=result.truncated,
+        status="truncated" if result.truncated else "degraded" if result.degraded else "success",
+        timings=result.timings,
+        prompt_tokens=result.prompt_tokens,
+        completion_tokens=result.completion_tokens,
+        tokens_per_second=result.tokens_per_second,
+        cached=result.cached,
+        degraded=result.degraded,
+        extractive=result.extractive,
+        safety=result.safety
+    )
+
+def format_hit(chunk: dict, rank: int, request: SearchRequest) -> SearchHit:
+    """Project a search result onto the requested fields."""
+    hit = SearchHit(
+        rank=rank,
+        chunk_id=chunk['chunk_id'],
+        vector_id=chunk['vector_id'],
+        score=chunk['similarity_score']
+    )
+    if request.fields == "ids":
+        return hit
+    
+    hit.source_doc_id = chunk.get('source_doc_id')
+    hit.source_title = chunk.get('source_title')
+    if request.fields == "snippets":
+        content = chunk.get('content', '')
+        hit.snippet = content[:request.snippet_chars] + ("..." if len(content) > request.snippet_chars else "")
+    else:
+        hit.chunk = {key: value for key, value in chunk.items() if key not in ('vector_id', 'similarity_score')}
+    return hit
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics (text exposition format) of the worker that serves the request.
+    
+    Pre-fork workers also serve their own metrics on api.metrics_port + i.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def client_policy(http_request: Request, priority: Optional[str] = None) -> ClientPolicy:
+    """Scheduling policy of the caller, looked up by its API key.
+    
+    Keys not listed in api.clients all share the "anonymous" identity (and
+    its rate limit), so new keys neither escape limits nor add state.
+    priority, if given, can only lower the client's class (e.g. batch calls).
+    """
+    api_config = STATE["config"].api
+    key = http_request.headers.get(API_KEY_HEADER)
+    if key not in api_config.clients:
+        key = None
+    overrides = api_config.clients.get(key, {}) if key else {}
+    policy = ClientPolicy(
+        client=key or "anonymous",
+        priority=overrides.get("priority", api_config.default_priority),
+        weight=overrides.get("weight", api_config.default_weight),
+        rate_limit=overrides.get("rate_limit", api_config.default_rate_limit),
+        rate_burst=overrides.get("rate_burst", api_config.default_rate_burst)
+    )
+    if priority is not None and PRIORITIES.index(priority) > PRIORITIES.index(policy.priority):
+        policy.priority = priority
+    return policy
+
+def enforce_rate_limit(policy: ClientPolicy):
+    """Raise 429 with Retry-After when the client is over its rate limit."""
+    try:
+        STATE["rate_limiter"].check(policy)
+    except Overloaded as e:
+        logger.warning(f"Rate limiting {policy.priority} client: {e}")
         raise HTTPException(
-            status_code=503,
-            detail="Pipeline not initialized. Check /health endpoint."
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
         )
+
+def coalescing_key(request: QueryRequest, prompt_template: str, priority: str) -> tuple:
+    """Requests with equal keys produce the same answer and can share one computation."""
+    return (
+        priority,
+        normalize_question(request.question),
+        request.top_k,
+        request.use_rag,
+        request.use_cache,
+        request.allow_degraded,
+        request.answer_mode,
+        prompt_template,
+        request.temperature,
+        request.max_tokens,
+        request.do_sample,
+        tuple(request.stop) if request.stop else None
+    )
+
+async def answer_question(request: QueryRequest, policy: ClientPolicy):
+    """Run retrieval and generation for one question on the stage executors."""
+    deadline = Deadline(STATE["config"].api.timeout)
+    pipeline = STATE["pipeline"]
+    executors = STATE["executors"]
+    timer = PhaseTimer()
+    
+    generation_params = {
+        'temperature': request.temperature,
+        'max_tokens': request.max_tokens,
+        'do_sample': request.do_sample,
+        'stop': request.stop
+    }
     
     try:
-        start_time = time.time()
+        # Cache hits skip the admission queue
+        if request.use_cache:
+            cached = await executors.run_retrieval(
+                pipeline.cached_result,
+                request.question,
+                request.top_k,
+                request.use_rag,
+                request.answer_mode,
+                **generation_params
+            )
+            if cached is not None:
+                return cached
+        
+        query_params = {
+            'question': request.question,
+            'top_k': request.top_k,
+            'use_rag': request.use_rag,
+            'deadline': deadline,
+            'timer': timer,
+            'use_cache': request.use_cache,
+            # cached_result() already missed above; keep only the semantic cache
+            'check_answer_cache': False,
+            'allow_degraded': request.allow_degraded,
+            'answer_mode': request.answer_mode,
+            **generation_params
+        }
+        
+        # Extractive answers never need the LLM: skip the queue
+        if request.use_rag and request.answer_mode == "extractive":
+            return await executors.run_retrieval(pipeline.query, **query_params)
         
-        # Execute query
-        result = STATE["pipeline"].query(
-            question=request.question,
-            top_k=request.top_k,
-            use_rag=request.use_rag
+        # Overloaded: answer extractively right away instead of queueing for the LLM
+        degrade_reason = pipeline.degrade_reason() if request.use_rag and request.allow_degraded else None
+        if degrade_reason is not None:
+            return await executors.run_retrieval(pipeline.query, degrade_reason=degrade_reason, **query_params)
+        
+        # Blocking work runs on bounded stage executors, never on the event loop
+        async with STATE["admission"].slot(timeout=deadline.remaining(), policy=policy):
+            retrieved_chunks = None
+            # LLM query rewrites belong on the generation executor: pipeline.query retrieves there
+            if request.use_rag and not pipeline.multi_query_llm:
+                retrieved_chunks = await executors.run_retrieval(
+                    pipeline.retrieve, request.question, request.top_k, timer=timer
+                )
+            
+            # Holding an LLM slot: generate even if the service overloads meanwhile
+            return await executors.run_generation(
+                pipeline.query,
+                retrieved_chunks=retrieved_chunks,
+                **{**query_params, 'allow_degraded': False}
+            )
+    except asyncio.CancelledError:
+        # Every waiting client went away: stop generation in the executor thread
+        deadline.cancel()
+        raise
+
+async def _uncoalesced(coro):
+    return await coro, False
+
+@app.post("/ask", response_model=QueryResponse)
+async def ask_question(request: QueryRequest, http_request: Request, background_tasks: BackgroundTasks):
+    """Main query endpoint.
+    
+    Enforces APIConfig.timeout end to end; on timeout the partial answer is
+    returned with status "truncated". Identical concurrent questions (see
+    coalescing_key) share one computation when APIConfig.coalesce_requests is on.
+    Requests are scheduled by the caller's priority class and fair share
+    (see client_policy); clients over their rate limit get 429.
+    Deferred safety checks run after the response has been sent.
+    """
+    
+    require_ready()
+    policy = client_policy(http_request)
+    enforce_rate_limit(policy)
+    
+    if STATE["config"].api.coalesce_requests:
+        key = coalescing_key(request, STATE["pipeline"].prompt_template, policy.priority)
+        work = asyncio.ensure_future(
+            STATE["single_flight"].run(key, partial(answer_question, request, policy))
         )
+    else:
+        work = asyncio.ensure_future(_uncoalesced(answer_question(request, policy)))
+    watcher = asyncio.create_task(cancel_on_disconnect(http_request, work.cancel, work.done))
+    
+    try:
+        result, coalesced = await work
+        if coalesced:
+            COALESCED.inc()
         
-        # Format response
-        sources = [
-            SourceReference(
-                document=source['document'],
-                chunk_id=source['chunk_id'],
-                similarity=source['similarity']
+        response = format_response(result)
+        if not coalesced:
+            background_tasks.add_task(
+                STATE["executors"].run_retrieval, STATE["pipeline"].run_deferred_safety_checks, result
             )
-            for source in result.sources
-        ]
         
-        response = QueryResponse(
-            question=result.question,
-            answer=result.answer,
-            sources=sources,
-            latency_ms=result.latency_ms,
-            confidence_score=result.confidence_score,
-            status="success"
+        logger.info(
+            f"Query processed: {request.question[:50]}... (latency: {result.latency_ms:.0f}ms"
+            f"{', coalesced' if coalesced else ''})"
         )
         
-        logger.info(f"Query processed: {request.question[:50]}... (latency: {result.latency_ms:.0f}ms)")
-        
         return response
     
+    except asyncio.CancelledError:
+        if asyncio.current_task().cancelling():
+            raise
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except Overloaded as e:
+        logger.warning(f"Rejecting query: {e}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except DeadlineExceeded as e:
+        logger.warning(f"Query not completed: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing query: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        watcher.cancel()
+
+@app.post("/search", response_model=SearchResponse, response_model_exclude_none=True)
+async def search(request: SearchRequest):
+    """Retrieval-only search: ranked chunks without calling the LLM.
+    
+    Runs on the retrieval executor and skips the admission queue, which only
+    bounds generation work. Fields left out by the projection are omitted.
+    """
+    
+    require_ready()
+    
+    start_time = time.perf_counter()
+    timer = PhaseTimer()
+    
+    try:
+        # One extra result tells whether another page exists
+        chunks = await STATE["executors"].run_retrieval(
+            STATE["pipeline"].embedding_manager.search,
+            request.query,
+            request.k + 1,
+            timer=timer,
+            offset=request.offset,
+            filters=request.filters,
+            mmr_lambda=request.mmr_lambda,
+            fetch_k=STATE["config"].rag.mmr_fetch_k
+        )
+    except Exception as e:
+        logger.error(f"Error processing search: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    results = [
+        format_hit(chunk, request.offset + position + 1, request)
+        for position, chunk in enumerate(chunks[:request.k])
+    ]
+    latency_ms = (time.perf_counter() - start_time) * 1000
+    
+    return SearchResponse(
+        query=request.query,
+        results=results,
+        offset=request.offset,
+        k=request.k,
+        has_more=len(chunks) > request.k,
+        latency_ms=latency_ms,
+        timings=timer.timings
+    )
+
+def require_ingestion():
+    """Return the ingestion worker; 409 where online ingestion is unavailable."""
+    require_ready()
+    worker = STATE["ingestion"]
+    if worker is None:
+        # Pre-fork workers each hold their own index copy, so one update would reach only one of them
+        raise HTTPException(status_code=409, detail="Online ingestion requires api.workers == 1")
+    return worker
+
+def submit_job(submit: Callable, *args) -> IngestionJobResponse:
+    try:
+        job = submit(*args)
+    except queue.Full:
+        raise HTTPException(
+            status_code=503,
+            detail="Ingestion queue is full",
+            headers={"Retry-After": str(INGEST_RETRY_AFTER)}
+        )
+    logger.info(f"Queued ingestion job {job.job_id}: {job.operation} {job.doc_id}")
+    return IngestionJobResponse(**job.to_dict())
+
+@app.post("/documents", response_model=IngestionJobResponse, status_code=202)
+async def add_document(request: DocumentRequest):
+    """Queue a document for indexing; an existing document with the same id is replaced.
+    
+    Poll /documents/jobs/{job_id} to see when it becomes searchable.
+    """
+    worker = require_ingestion()
+    document = Document(
+        doc_id=request.doc_id or uuid.uuid4().hex,
+        title=request.title,
+        content=request.content,
+        source=request.source,
+        metadata=request.metadata
+    )
+    return submit_job(worker.submit_add, document)
+
+@app.delete("/documents/{doc_id}", response_model=IngestionJobResponse, status_code=202)
+async def delete_document(doc_id: str):
+    """Queue removal of a document's chunks from the index."""
+    worker = require_ingestion()
+    return submit_job(worker.submit_delete, doc_id)
+
+@app.get("/documents/jobs/{job_id}", response_model=IngestionJobResponse)
+async def ingestion_job_status(job_id: str):
+    """Status of an ingestion job."""
+    job = require_ingestion().get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return IngestionJobResponse(**job.to_dict())
+
+@app.post("/admin/index/reload", response_model=IndexReloadResponse)
+async def reload_index_snapshot(request: Optional[IndexReloadRequest] = None):
+    """Hot-swap the index to a snapshot without restarting.
+    
+    Queries keep being served during the load; those already running finish on
+    the old index. Documents added online since the last snapshot are dropped.
+    """
+    
+    require_ready()
+    
+    config = STATE["config"]
+    if config.api.workers > 1:
+        raise HTTPException(
+            status_code=409,
+            detail="With api.workers > 1 use rag.index_watch_interval so every worker swaps"
+        )
+    
+    name = request.snapshot if request is not None else None
+    snapshot = Path(config.data.snapshot_dir) / name if name else None
+    if snapshot is not None and not snapshot.is_dir():
+        raise HTTPException(status_code=404, detail=f"Unknown snapshot: {name}")
+    
+    try:
+        result = await swap_index(snapshot)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        logger.warning(f"Rejecting index snapshot: {e}")
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error reloading index: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return IndexReloadResponse(**result)
+
+@app.post("/ask/batch", response_model=BatchQueryResponse)
+async def ask_batch(request: BatchQueryRequest, http_request: Request):
+    """Answer many questions in one call.
+    
+    Questions are embedded together, searched with one multi-query FAISS call
+    and generated in batches. Results are returned in request order; a failed
+    item carries its error instead of failing the whole batch. Batches are
+    scheduled in the "batch" class with a fair-queuing cost of one per question.
+    """
+    
+    require_ready()
+    policy = client_policy(http_request, priority="batch")
+    enforce_rate_limit(policy)
+    
+    api_config = STATE["config"].api
+    if len(request.queries) > api_config.max_batch_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {len(request.queries)} exceeds max_batch_size={api_config.max_batch_size}"
+        )
+    
+    deadline = Deadline(api_config.batch_timeout)
+    watcher = asyncio.create_task(cancel_on_disconnect(http_request, deadline.cancel, deadline.should_stop))
+    start_time = time.perf_counter()
+    
+    try:
+        # The whole batch is one unit of work on the generation executor
+        async with STATE["admission"].slot(
+            timeout=deadline.remaining(), policy=policy, cost=len(request.queries)
+        ):
+            results = await STATE["executors"].run_generation(
+                STATE["pipeline"].query_batch,
+                [query.model_dump() for query in request.queries],
+                deadline=deadline
+            )
+    except Overloaded as e:
+        logger.warning(f"Rejecting batch: {e}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except DeadlineExceeded as e:
+        logger.warning(f"Batch not completed: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error processing batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        watcher.cancel()
+    
+    items = []
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            items.append(BatchQueryItem(index=index, status="error", error=str(result)))
+        else:
+            response = format_response(result)
+            items.append(BatchQueryItem(index=index, status=response.status, result=response))
+    
+    latency_ms = (time.perf_counter() - start_time) * 1000
+    logger.info(f"Batch processed: {len(items)} queries (latency: {latency_ms:.0f}ms)")
+    
+    return BatchQueryResponse(results=items, latency_ms=latency_ms)
 
 @app.get("/")
 async def root():
@@ -111,7 +735,12 @@ async def root():
         "version": "0.1.0",
         "endpoints": {
             "health": "/health",
+            "ready": "/ready",
+            "search": "/search",
+            "documents": "/documents",
             "query": "/ask",
+            "batch_query": "/ask/batch",
+            "metrics": "/metrics",
             "docs": "/docs"
         }
     }
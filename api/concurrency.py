@@ -0,0 +1,263 @@
+"""Bounded executors, admission control and scheduling for blocking pipeline work."""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import partial
+from typing import Optional, Callable, Any, Awaitable, Dict, Hashable, List, Tuple
+from src.metrics import REGISTRY
+
+# Scheduling classes, highest priority first
+PRIORITIES = ("interactive", "batch")
+
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "legalrag_queue_wait_seconds",
+    "Time requests waited for an in-flight slot",
+    ["priority"]
+)
+RATE_LIMITED = REGISTRY.counter(
+    "legalrag_rate_limited_total",
+    "Requests rejected by a client rate limit",
+    ["priority"]
+)
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; maps to an HTTP error with Retry-After."""
+    
+    def __init__(self, message: str, retry_after: int, status_code: int = 503):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+@dataclass
+class ClientPolicy:
+    """How one client (API key) is scheduled."""
+    client: str
+    priority: str = "interactive"  # one of PRIORITIES
+    weight: float = 1.0  # share of capacity relative to other clients of the same priority
+    rate_limit: Optional[float] = None  # requests per second (None = unlimited)
+    rate_burst: int = 10
+
+class TokenBucket:
+    """Allows rate tokens per second on average and bursts of up to burst."""
+    
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+    
+    def take(self, amount: float = 1.0) -> float:
+        """Take amount tokens; returns 0 on success, else seconds until they are available."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= amount:
+            self._tokens -= amount
+            return 0.0
+        return (amount - self._tokens) / self.rate
+
+class RateLimiter:
+    """Per-client token buckets; requests over the limit are rejected with 429."""
+    
+    def __init__(self):
+        self._buckets: Dict[str, TokenBucket] = {}
+    
+    def check(self, policy: ClientPolicy):
+        if policy.rate_limit is None:
+            return
+        bucket = self._buckets.get(policy.client)
+        if bucket is None or (bucket.rate, bucket.burst) != (policy.rate_limit, policy.rate_burst):
+            bucket = self._buckets[policy.client] = TokenBucket(policy.rate_limit, policy.rate_burst)
+        wait_s = bucket.take()
+        if wait_s > 0:
+            RATE_LIMITED.inc(priority=policy.priority)
+            raise Overloaded(
+                f"Rate limit of {policy.rate_limit:g} requests/s exceeded",
+                max(1, math.ceil(wait_s)),
+                status_code=429
+            )
+
+class AdmissionController:
+    """Limits concurrently executing requests and schedules the queue in front of them.
+
+    Requests beyond max_in_flight wait in the queue; once max_queue requests are
+    waiting, new ones are rejected immediately so latency stays bounded under bursts
+    (a queued request of a lower priority class is evicted first to make room).
+
+    The queue is ordered by priority class (PRIORITIES; strict), then by
+    start-time fair queuing between clients: each request gets a virtual start
+    tag max(virtual time, the client's previous finish tag), and its finish tag
+    adds cost / weight. A client sending many requests therefore interleaves
+    with others in proportion to the weights instead of running ahead. With a
+    single client the queue is FIFO.
+    """
+    
+    def __init__(self, max_in_flight: int = 4, max_queue: int = 32):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.in_flight = 0
+        # Heap of [priority rank, start tag, sequence, future]
+        self._waiters: List[list] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._finish_tags: Dict[Hashable, float] = {}
+        self._avg_service_s = 1.0
+    
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+    
+    def queued_by_priority(self) -> Dict[str, int]:
+        counts = dict.fromkeys(PRIORITIES, 0)
+        for rank, _, _, _ in self._waiters:
+            counts[PRIORITIES[rank]] += 1
+        return counts
+    
+    def retry_after(self) -> int:
+        """Estimated seconds until a slot frees up for a new request."""
+        wait_s = (self.queued + 1) * self._avg_service_s / self.max_in_flight
+        return max(1, math.ceil(wait_s))
+    
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None, policy: Optional[ClientPolicy] = None, cost: float = 1.0):
+        """Hold one in-flight slot; waits at most timeout seconds in the queue.
+        
+        cost is the request's size for fair queuing (e.g. questions in a batch).
+        """
+        policy = policy if policy is not None else ClientPolicy("")
+        enqueued_at = time.monotonic()
+        await self._acquire(timeout, policy, cost)
+        start_time = time.monotonic()
+        QUEUE_WAIT_SECONDS.observe(start_time - enqueued_at, priority=policy.priority)
+        try:
+            yield
+        finally:
+            self._avg_service_s = 0.8 * self._avg_service_s + 0.2 * (time.monotonic() - start_time)
+            self._release()
+    
+    def _tag(self, policy: ClientPolicy, cost: float) -> float:
+        start = max(self._virtual_time, self._finish_tags.get(policy.client, 0.0))
+        self._finish_tags[policy.client] = start + cost / policy.weight
+        return start
+    
+    async def _acquire(self, timeout: Optional[float], policy: ClientPolicy, cost: float):
+        rank = PRIORITIES.index(policy.priority)
+        
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self._virtual_time = self._tag(policy, cost)
+            self.in_flight += 1
+            return
+        
+        if self.queued >= self.max_queue and not self._evict_below(rank):
+            raise Overloaded(
+                f"Server busy: {self.in_flight} in flight, {self.queued} queued",
+                self.retry_after()
+            )
+        
+        waiter = asyncio.get_running_loop().create_future()
+        entry = [rank, self._tag(policy, cost), next(self._sequence), waiter]
+        heapq.heappush(self._waiters, entry)
+        try:
+            # The slot is handed over by _release, which increments in_flight for us
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                waiter.result()  # re-raises if evicted
+                return
+            self._remove(entry)
+            raise Overloaded("Timed out waiting in queue", self.retry_after())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.exception():
+                self._release()
+            elif not waiter.done():
+                self._remove(entry)
+            raise
+    
+    def _evict_below(self, rank: int) -> bool:
+        """Reject the newest queued request of the lowest class worse than rank, if any."""
+        candidates = [entry for entry in self._waiters if entry[0] > rank]
+        if not candidates:
+            return False
+        victim = max(candidates, key=lambda entry: (entry[0], entry[2]))
+        self._remove(victim)
+        victim[3].set_exception(Overloaded("Evicted from queue by higher-priority traffic", self.retry_after()))
+        return True
+    
+    def _remove(self, entry: list):
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+    
+    def _release(self):
+        while self._waiters:
+            _, start, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                self._virtual_time = max(self._virtual_time, start)
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+class StageExecutors:
+    """Dedicated bounded thread pools for retrieval and generation."""
+    
+    def __init__(self, retrieval_workers: int = 4, generation_workers: int = 4):
+        self.retrieval = ThreadPoolExecutor(retrieval_workers, thread_name_prefix="retrieval")
+        self.generation = ThreadPoolExecutor(generation_workers, thread_name_prefix="generation")
+    
+    async def run_retrieval(self, fn: Callable, *args, **kwargs) -> Any:
+        return await self._run(self.retrieval, fn, *args, **kwargs)
+    
+    async def run_generation(self, fn: Callable, *args, **kwargs) -> Any:
+        return await self._run(self.generation, fn, *args, **kwargs)
+    
+    async def _run(self, executor: ThreadPoolExecutor, fn: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, partial(fn, *args, **kwargs))
+    
+    def shutdown(self):
+        self.retrieval.shutdown(wait=False, cancel_futures=True)
+        self.generation.shutdown(wait=False, cancel_futures=True)
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one shared computation.
+    
+    The first caller starts fn(); callers arriving while it runs await the same
+    task and receive its result (or exception). A caller that is cancelled only
+    detaches; the computation is cancelled once no caller is waiting for it.
+    """
+    
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+    
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+    
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, coalesced); coalesced is True if another caller started the work."""
+        task = self._flights.get(key)
+        coalesced = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(partial(self._forget, key))
+        
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task), coalesced
+        finally:
+            if self._flights.get(key) is task:
+                self._waiters[key] -= 1
+                if self._waiters[key] == 0 and not task.done():
+                    task.cancel()
+    
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+            del self._waiters[key]
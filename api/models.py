@@ -1,5 +1,5 @@
 """Pydantic models for API."""
-from typing import List, Dict, Any, Optional
+from typing import Annotated, List, Dict, Any, Literal, Optional, Union
 from pydantic import BaseModel, Field
 
 class QueryRequest(BaseModel):
@@ -8,6 +8,19 @@ class QueryRequest(BaseModel):
     top_k: int = Field(3, description="Number of documents to retrieve")
     use_rag: bool = Field(True, description="Use RAG or zero-shot generation")
     temperature: float = Field(0.3, ge=0.0, le=1.0, description="LLM temperature")
+    max_tokens: Optional[int] = Field(None, ge=1, le=2048, description="Maximum tokens to generate")
+    do_sample: Optional[bool] = Field(None, description="Sample (true) or greedy decode (false)")
+    stop: Optional[List[Annotated[str, Field(min_length=1)]]] = Field(
+        None,
+        max_length=4,
+        description="Stop sequences (non-empty)"
+    )
+    use_cache: bool = Field(True, description="Serve from the answer caches if possible (false = always generate)")
+    allow_degraded: bool = Field(True, description="Accept an extractive answer when the LLM is overloaded")
+    answer_mode: Literal["auto", "generate", "extractive"] = Field(
+        "auto",
+        description="extractive: best-matching document sentences, no LLM; auto: extractive when confident"
+    )
 
 class SourceReference(BaseModel):
     """Source reference."""
@@ -22,7 +35,114 @@ class QueryResponse(BaseModel):
     sources: List[SourceReference]
     latency_ms: float
     confidence_score: float
+    truncated: bool = False
     status: str = "success"
+    timings: Dict[str, float] = Field(default_factory=dict, description="Per-stage latency (ms)")
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    tokens_per_second: Optional[float] = None
+    cached: bool = False
+    degraded: bool = Field(False, description="Extractive answer served without the LLM (overload)")
+    extractive: bool = Field(False, description="Answered with document sentences instead of the LLM")
+    safety: Optional[Dict[str, Dict[str, Any]]] = Field(
+        None,
+        description="Safety check results (deferred checks are logged and counted in /metrics only)"
+    )
+
+class BatchQueryRequest(BaseModel):
+    """Batch query request model."""
+    queries: List[QueryRequest] = Field(..., min_length=1, description="Questions to answer")
+
+class BatchQueryItem(BaseModel):
+    """Result for one question of a batch."""
+    index: int
+    status: str
+    result: Optional[QueryResponse] = None
+    error: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    """Batch query response model."""
+    results: List[BatchQueryItem]
+    latency_ms: float
+
+class SearchRequest(BaseModel):
+    """Retrieval-only search request."""
+    query: str = Field(..., description="Search query")
+    k: int = Field(10, ge=1, le=100, description="Results per page")
+    offset: int = Field(0, ge=0, le=1000, description="Results to skip (pagination)")
+    filters: Optional[Dict[str, Union[str, int, List[Union[str, int]]]]] = Field(
+        None,
+        description="Chunk field (e.g. source_doc_id, or metadata.<key>) -> value or list of allowed values"
+    )
+    fields: Literal["ids", "snippets", "full"] = Field(
+        "snippets",
+        description="ids: ids and scores only; snippets: plus source and a content snippet; full: whole chunk"
+    )
+    snippet_chars: int = Field(200, ge=1, le=2000, description="Snippet length in characters")
+    mmr_lambda: Optional[float] = Field(
+        None,
+        ge=0.0,
+        le=1.0,
+        description="Diversify results by Maximal Marginal Relevance (1 = relevance only, 0 = diversity only)"
+    )
+
+class SearchHit(BaseModel):
+    """One ranked chunk."""
+    rank: int
+    chunk_id: str
+    vector_id: int
+    score: float
+    source_doc_id: Optional[str] = None
+    source_title: Optional[str] = None
+    snippet: Optional[str] = None
+    chunk: Optional[Dict[str, Any]] = None
+
+class SearchResponse(BaseModel):
+    """Search response model."""
+    query: str
+    results: List[SearchHit]
+    offset: int
+    k: int
+    has_more: bool
+    latency_ms: float
+    timings: Dict[str, float] = Field(default_factory=dict, description="Per-stage latency (ms)")
+
+class DocumentRequest(BaseModel):
+    """Document to add to (or replace in) the index."""
+    doc_id: Optional[str] = Field(None, min_length=1, description="Document id (generated if omitted)")
+    title: str = Field("Untitled", description="Document title")
+    content: str = Field(..., min_length=1, description="Document text")
+    source: str = Field("api", description="Where the document came from")
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+
+class IngestionJobResponse(BaseModel):
+    """Status of a document ingestion job."""
+    job_id: str
+    operation: str
+    doc_id: str
+    status: str  # "queued", "running", "done" or "failed"
+    chunks: int = 0
+    error: Optional[str] = None
+    index_version: Optional[str] = None
+    submitted_at: float
+    finished_at: Optional[float] = None
+
+class IndexReloadRequest(BaseModel):
+    """Index snapshot to swap in."""
+    snapshot: Optional[str] = Field(
+        None,
+        pattern=r"^[^/\\.][^/\\]*$",
+        description="Snapshot directory name under data.snapshot_dir (default: the one CURRENT points at)"
+    )
+
+class IndexReloadResponse(BaseModel):
+    """Result of an index hot swap."""
+    snapshot: str
+    version: str
+    num_vectors: int
+    previous_snapshot: Optional[str] = None
+    previous_version: Optional[str] = None
+    load_ms: float
 
 class HealthResponse(BaseModel):
     """Health check response."""
@@ -30,6 +150,17 @@ class HealthResponse(BaseModel):
     model_loaded: bool
     index_loaded: bool
 
+class ReadinessResponse(BaseModel):
+    """Readiness and startup progress."""
+    ready: bool
+    status: str  # "loading", "ready" or "error"
+    phase: Optional[str] = None
+    progress: Optional[float] = Field(None, description="Fraction of expected startup time done")
+    eta_seconds: Optional[float] = None
+    elapsed_seconds: float
+    timings: Dict[str, float] = Field(default_factory=dict, description="Completed startup phases (ms)")
+    error: Optional[str] = None
+
 class ErrorResponse(BaseModel):
     """Error response."""
     status: str = "error"
@@ -0,0 +1,127 @@
+"""Pre-fork multi-worker serving.
+
+The parent process loads the pipeline (embedding model, FAISS index, chunk
+metadata, LLM) once, then forks uvicorn workers that accept on one shared
+listening socket. Workers inherit the loaded objects copy-on-write, so N
+workers cost little more memory than one. Each worker keeps its own
+admission controller, executors and metrics; /metrics on the shared socket
+reaches an arbitrary worker, so worker i also serves its metrics on
+api.metrics_port + i (scrape all of them). Index snapshots swapped in later
+are loaded by every worker separately, so they are memory-mapped
+(rag.index_mmap is forced on) to keep a single copy in the page cache.
+"""
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+import uvicorn
+from api.app import app, STATE
+from api.startup import initialize_pipeline
+from src.config import AppConfig
+from src.metrics import start_metrics_server
+from src.utils import configure_threads
+
+logger = logging.getLogger(__name__)
+
+RESPAWN_DELAY = 1.0  # seconds between restarts of a crashed worker
+
+def preload(config: AppConfig):
+    """Load the pipeline into STATE before forking (same LLM as a single worker)."""
+    STATE["config"] = config
+    STATE["pipeline"] = initialize_pipeline(config)
+    STATE["initialized"] = True
+    
+    # Move everything loaded so far into the permanent generation: GC passes in
+    # the workers would otherwise write to these objects and un-share their pages
+    gc.collect()
+    gc.freeze()
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """Listening socket shared by all workers (the kernel balances accepts)."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(sock: socket.socket, config: AppConfig, worker_index: int = 0):
+    """Serve requests in a forked child until uvicorn shuts down."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    
+    if config.api.metrics_port is not None:
+        start_metrics_server(config.api.metrics_port + worker_index, config.api.host)
+    
+    # Split the cores between workers unless pinned explicitly
+    cpus = os.cpu_count() or 1
+    configure_threads(config.model.num_threads or max(1, cpus // config.api.workers))
+    
+    after_fork = getattr(STATE["pipeline"].llm_client, "after_fork", None)
+    if after_fork is not None:
+        after_fork()
+    
+    server = uvicorn.Server(uvicorn.Config(app, log_level="info"))
+    server.run(sockets=[sock])
+
+def serve(config: AppConfig):
+    """Load once, fork config.api.workers workers and supervise them."""
+    if not config.rag.index_mmap:
+        logger.info("Memory-mapping index snapshots so that workers share them")
+        config.rag.index_mmap = True
+    preload(config)
+    sock = bind_socket(config.api.host, config.api.port)
+    logger.info(f"Listening on {config.api.host}:{config.api.port} with {config.api.workers} workers")
+    
+    workers = {}  # pid -> worker index (a restarted worker keeps its index and metrics port)
+    stopping = False
+    
+    def spawn(worker_index: int):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                run_worker(sock, config, worker_index)
+            except BaseException:
+                logger.exception("Worker failed")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        workers[pid] = worker_index
+        logger.info(f"Started worker {pid}")
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    
+    for worker_index in range(config.api.workers):
+        spawn(worker_index)
+    
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        worker_index = workers.pop(pid, None)
+        if worker_index is None:
+            continue
+        
+        if not stopping:
+            logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            time.sleep(RESPAWN_DELAY)
+            if not stopping:
+                spawn(worker_index)
+    
+    sock.close()
+    logger.info("All workers stopped")
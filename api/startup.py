@@ -1,60 +1,147 @@
 """Startup and initialization logic."""
+import json
 import logging
+import time
 from pathlib import Path
+from typing import Any, Dict, Optional
+from src.cache import SemanticCache, create_answer_cache
 from src.config import get_config
 from src.data_loader import DocumentLoader
 from src.document_processor import DocumentProcessor
-from src.embedding_manager import EmbeddingManager
-from src.llm_client import LocalLLMClient, MockLLMClient
-from src.rag_pipeline import RAGPipeline
+from src.embedding_manager import EmbeddingManager, FAISSIndex
+from src.ingestion import IngestionWorker
+from src.llm_client import LocalLLMClient, HTTPLLMClient, MockLLMClient
+from src.rag_pipeline import OverloadPolicy, RAGPipeline
+from src.reranker import CrossEncoderReranker
+from src.snapshots import current_snapshot, load_snapshot
+from src.utils import PhaseTimer, configure_threads
 
 logger = logging.getLogger(__name__)
 
-def initialize_pipeline(use_mock: bool = False):
-    """Initialize RAG pipeline."""
-    
-    config = get_config()
-    
-    # Load documents (or use mock)
-    if config.data.raw_data_path.exists():
-        logger.info("Loading real documents...")
-        loader = DocumentLoader()
-        documents = loader.load_from_json(config.data.raw_data_path)
-    else:
-        logger.info("Using mock documents for demo...")
-        from scripts.generate_synthetic_data import generate_mock_documents
-        documents = generate_mock_documents(5)
-    
-    # Process documents
-    logger.info("Processing documents...")
-    processor = DocumentProcessor(
-        chunk_size=config.rag.chunk_size,
-        chunk_overlap=config.rag.chunk_overlap
-    )
-    chunks = processor.process_documents(documents)
-    
-    # Build index
-    logger.info("Building embedding index...")
-    embedding_manager = EmbeddingManager(
-        embedding_model=config.model.embedding_model_name,
-        device=config.model.device,
-        metric=config.rag.metric_type
-    )
-    embedding_manager.build_index(chunks)
-    
-    # Initialize LLM
-    if use_mock:
+def create_llm_client(config):
+    """Create the LLM client selected by config.model.llm_backend."""
+    if config.model.llm_backend == "mock":
         logger.info("Using MockLLMClient for demo...")
-        llm_client = MockLLMClient()
+        return MockLLMClient()
+    elif config.model.llm_backend == "http":
+        logger.info("Connecting to inference server...")
+        return HTTPLLMClient(
+            base_url=config.model.llm_server_url,
+            model_name=config.model.llm_model_name,
+            max_tokens=config.model.llm_max_tokens,
+            temperature=config.model.llm_temperature,
+            top_p=config.model.llm_top_p,
+            timeout=config.model.llm_server_timeout,
+            max_retries=config.model.llm_server_max_retries,
+            max_connections=config.model.llm_server_max_connections
+        )
     else:
         logger.info("Loading LLM model...")
-        llm_client = LocalLLMClient(
+        return LocalLLMClient(
             model_name=config.model.llm_model_name,
             device=config.model.device,
             quantize=config.model.quantization,
             max_tokens=config.model.llm_max_tokens,
             temperature=config.model.llm_temperature,
-            top_p=config.model.llm_top_p
+            top_p=config.model.llm_top_p,
+            draft_model_name=config.model.draft_model_name,
+            draft_min_acceptance_rate=config.model.draft_min_acceptance_rate,
+            low_memory=config.model.low_memory_loading,
+            warmup_tokens=config.model.warmup_tokens if config.model.warmup else 0
+        )
+
+def load_chunks(config, timer: PhaseTimer) -> list:
+    """Load documents (or mock documents) and split them into chunks."""
+    with timer.phase("documents"):
+        if config.data.raw_data_path.exists():
+            logger.info("Loading real documents...")
+            loader = DocumentLoader()
+            documents = loader.load_from_json(config.data.raw_data_path)
+        else:
+            logger.info("Using mock documents for demo...")
+            from scripts.generate_synthetic_data import generate_mock_documents
+            documents = generate_mock_documents(5)
+    
+    # Process documents
+    logger.info("Processing documents...")
+    with timer.phase("chunking"):
+        processor = DocumentProcessor(
+            chunk_size=config.rag.chunk_size,
+            chunk_overlap=config.rag.chunk_overlap
+        )
+        return processor.process_documents(documents)
+
+def initialize_pipeline(config=None, timer: Optional[PhaseTimer] = None):
+    """Initialize RAG pipeline from config (default: get_config()); phases are recorded in timer if given."""
+    
+    config = config if config is not None else get_config()
+    timer = timer if timer is not None else PhaseTimer()
+    
+    configure_threads(config.model.num_threads, config.model.num_interop_threads)
+    
+    # Load embedding model
+    with timer.phase("embedding_model"):
+        embedding_manager = EmbeddingManager(
+            embedding_model=config.model.embedding_model_name,
+            device=config.model.device,
+            metric=config.rag.metric_type,
+            low_memory=config.model.low_memory_loading,
+            warmup=config.model.warmup
+        )
+    
+    snapshot = current_snapshot(Path(config.data.snapshot_dir))
+    if snapshot is not None:
+        logger.info(f"Loading index snapshot {snapshot.name}...")
+        with timer.phase("index"):
+            index, manifest = load_snapshot(snapshot, mmap=config.rag.index_mmap)
+            check_snapshot(manifest, embedding_manager)
+            embedding_manager.index = index
+    elif config.rag.index_mmap and Path(config.data.index_path).exists():
+        # Prebuilt index (scripts/build_index.py), mapped rather than copied into memory
+        logger.info(f"Memory-mapping index from {config.data.index_path}...")
+        with timer.phase("index"):
+            embedding_manager.index = FAISSIndex.load(
+                Path(config.data.index_path),
+                metric=config.rag.metric_type,
+                mmap=True
+            )
+    else:
+        chunks = load_chunks(config, timer)
+        logger.info("Building embedding index...")
+        with timer.phase("index"):
+            embedding_manager.build_index(chunks)
+    
+    reranker = None
+    if config.model.reranker_model_name:
+        with timer.phase("reranker"):
+            reranker = CrossEncoderReranker(
+                config.model.reranker_model_name,
+                device=config.model.device,
+                cache_size=config.rag.rerank_cache_size,
+                batch_size=config.rag.rerank_batch_size,
+                warmup=config.model.warmup
+            )
+    
+    # Initialize LLM
+    with timer.phase("llm"):
+        llm_client = create_llm_client(config)
+    
+    semantic_cache = None
+    if config.rag.semantic_cache:
+        semantic_cache = SemanticCache(
+            embedding_manager.embedding_generator.embedding_dim,
+            threshold=config.rag.semantic_cache_threshold,
+            max_entries=config.rag.semantic_cache_max_entries,
+            ttl=config.rag.answer_cache_ttl,
+            min_chunk_overlap=config.rag.semantic_cache_min_chunk_overlap
+        )
+    
+    overload_policy = None
+    if config.rag.degrade_queue_depth is not None or config.rag.degrade_latency_ms is not None:
+        overload_policy = OverloadPolicy(
+            max_queue_depth=config.rag.degrade_queue_depth,
+            max_latency_ms=config.rag.degrade_latency_ms,
+            window=config.rag.degrade_window
         )
     
     # Create pipeline
@@ -63,10 +150,175 @@ def initialize_pipeline(use_mock: bool = False):
         llm_client=llm_client,
         retriever_config={
             'top_k': config.rag.top_k,
-            'similarity_threshold': config.rag.similarity_threshold
+            'similarity_threshold': config.rag.similarity_threshold,
+            'mmr_lambda': config.rag.mmr_lambda,
+            'mmr_fetch_k': config.rag.mmr_fetch_k
         },
-        prompt_template=config.rag.system_prompt_template
+        prompt_template=config.rag.system_prompt_template,
+        cache=create_answer_cache(
+            config.rag.answer_cache,
+            config.rag.answer_cache_max_entries,
+            config.rag.answer_cache_ttl,
+            Path(config.data.answer_cache_path)
+        ),
+        semantic_cache=semantic_cache,
+        overload_policy=overload_policy,
+        extractive_sentences=config.rag.extractive_sentences,
+        extractive_threshold=config.rag.extractive_threshold,
+        extractive_max_candidates=config.rag.extractive_max_candidates,
+        safety_checks=config.rag.enable_safety_checks,
+        defer_safety_checks=config.rag.defer_safety_checks,
+        check_hallucination=config.rag.check_hallucination,
+        grounding_threshold=config.rag.grounding_threshold,
+        reranker=reranker,
+        rerank_candidates=config.rag.rerank_candidates,
+        multi_query_variants=config.rag.multi_query_variants,
+        multi_query_llm=config.rag.multi_query_llm,
+        rrf_k=config.rag.rrf_k,
+        llm_batch_size=config.rag.llm_batch_size
     )
     
     logger.info("Pipeline initialized successfully")
+    logger.info(f"Startup timings: {timer.summary()} (total {timer.total_ms():.0f}ms)")
     return pipeline
+
+def check_snapshot(manifest: Dict[str, Any], embedding_manager: EmbeddingManager):
+    """Raise ValueError if a snapshot was not built for the running embedding model."""
+    generator = embedding_manager.embedding_generator
+    model = manifest.get('embedding_model')
+    if model is not None and model != generator.model_name:
+        raise ValueError(f"Snapshot {manifest['name']} was built with {model}, serving {generator.model_name}")
+    if manifest['embedding_dim'] != generator.embedding_dim:
+        raise ValueError(
+            f"Snapshot {manifest['name']} has dimension {manifest['embedding_dim']}, model has {generator.embedding_dim}"
+        )
+    if manifest['metric'] != embedding_manager.metric:
+        raise ValueError(f"Snapshot {manifest['name']} uses metric {manifest['metric']}, serving {embedding_manager.metric}")
+
+def reload_index(pipeline: RAGPipeline, config, snapshot: Optional[Path] = None) -> Dict[str, Any]:
+    """Load a snapshot (default: the current one) and swap it into the running pipeline.
+    
+    Loading happens before the swap, so queries keep being served from the old
+    index meanwhile. Searches already running hold a reference to the old index
+    and finish on it; it is freed when the last one is done. Models and caches
+    stay warm; cached answers are keyed by index version.
+    """
+    if snapshot is None:
+        snapshot = current_snapshot(Path(config.data.snapshot_dir))
+        if snapshot is None:
+            raise FileNotFoundError(f"No current snapshot in {config.data.snapshot_dir}")
+    
+    start_time = time.perf_counter()
+    manager = pipeline.embedding_manager
+    index, manifest = load_snapshot(snapshot, mmap=config.rag.index_mmap)
+    check_snapshot(manifest, manager)
+    
+    with manager.update_lock:
+        previous = manager.index
+        manager.index = index
+    
+    load_ms = (time.perf_counter() - start_time) * 1000
+    logger.info(f"Swapped in index snapshot {index.snapshot} (version {index.version}, {load_ms:.0f}ms)")
+    return {
+        'snapshot': index.snapshot,
+        'version': index.version,
+        'num_vectors': int(index.index.ntotal),
+        'previous_snapshot': previous.snapshot if previous is not None else None,
+        'previous_version': previous.version if previous is not None else None,
+        'load_ms': load_ms
+    }
+
+def create_ingestion_worker(config, embedding_manager: EmbeddingManager) -> IngestionWorker:
+    """Start the background worker behind POST/DELETE /documents."""
+    worker = IngestionWorker(
+        embedding_manager,
+        DocumentProcessor(
+            chunk_size=config.rag.chunk_size,
+            chunk_overlap=config.rag.chunk_overlap
+        ),
+        batch_size=config.rag.ingest_batch_size,
+        batch_wait=config.rag.ingest_batch_wait,
+        max_queue=config.rag.ingest_max_queue
+    )
+    worker.start()
+    return worker
+
+class StartupProgress:
+    """Progress of background pipeline initialisation, reported by /ready.
+    
+    The ETA is based on the phase durations of the last successful startup,
+    saved to data.startup_timings_path; without that history it is unknown.
+    """
+    
+    def __init__(self, timings_path: Optional[Path] = None):
+        self.timings_path = Path(timings_path) if timings_path is not None else None
+        self.timer = PhaseTimer(on_phase=self._on_phase)
+        self.phase: Optional[str] = None
+        self.ready = False
+        self.error: Optional[str] = None
+        self.started_at = time.monotonic()
+        self._phase_started_at = self.started_at
+        self._expected_ms = self._load_expected()
+    
+    def _load_expected(self) -> Dict[str, float]:
+        if self.timings_path is None or not self.timings_path.exists():
+            return {}
+        try:
+            with open(self.timings_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring startup timings at {self.timings_path}: {e}")
+            return {}
+    
+    def _on_phase(self, name: str):
+        self.phase = name
+        self._phase_started_at = time.monotonic()
+        logger.info(f"Startup phase: {name}")
+    
+    def finish(self):
+        """Mark the pipeline ready and remember phase durations for the next ETA."""
+        self.ready = True
+        self.phase = None
+        if self.timings_path is None:
+            return
+        try:
+            self.timings_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.timings_path, 'w', encoding='utf-8') as f:
+                json.dump(self.timer.timings, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Could not save startup timings: {e}")
+    
+    def fail(self, error: str):
+        self.error = error
+        self.phase = None
+    
+    def _remaining_ms(self) -> Optional[float]:
+        if not self._expected_ms:
+            return None
+        remaining = 0.0
+        for name, expected in self._expected_ms.items():
+            if name in self.timer.timings:
+                continue
+            if name == self.phase:
+                expected -= (time.monotonic() - self._phase_started_at) * 1000
+            remaining += max(expected, 0.0)
+        return remaining
+    
+    def eta_seconds(self) -> Optional[float]:
+        """Estimated seconds until ready (0 when ready, None if unknown)."""
+        if self.ready:
+            return 0.0
+        if self.error is not None:
+            return None
+        remaining_ms = self._remaining_ms()
+        return remaining_ms / 1000 if remaining_ms is not None else None
+    
+    def fraction_done(self) -> Optional[float]:
+        """Share of the expected startup time already done (None if unknown)."""
+        if self.ready:
+            return 1.0
+        total_ms = sum(self._expected_ms.values())
+        remaining_ms = self._remaining_ms()
+        if not total_ms or remaining_ms is None:
+            return None
+        return min(max(1.0 - remaining_ms / total_ms, 0.0), 0.99)
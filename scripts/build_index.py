@@ -5,6 +5,7 @@ from src.config import get_config
 from src.data_loader import DocumentLoader, DataValidator
 from src.document_processor import DocumentProcessor
 from src.embedding_manager import EmbeddingManager
+from src.snapshots import prune_snapshots, set_current, write_snapshot
 from src.utils import setup_logging, save_jsonl
 
 setup_logging("INFO")
@@ -47,12 +48,26 @@ def main():
     )
     
     index = embedding_manager.build_index(chunks)
-    index.save(config.data.index_path)
+    index.save(Path(config.data.index_path))
+    
+    # Versioned snapshot; a running API picks it up via /admin/index/reload or rag.index_watch_interval
+    snapshot_dir = Path(config.data.snapshot_dir)
+    snapshot = write_snapshot(
+        index,
+        snapshot_dir,
+        embedding_model=config.model.embedding_model_name,
+        chunk_size=config.rag.chunk_size,
+        chunk_overlap=config.rag.chunk_overlap,
+        num_documents=len(documents)
+    )
+    set_current(snapshot_dir, snapshot)
+    prune_snapshots(snapshot_dir, config.data.snapshots_keep)
     
     logger.info("Index built successfully!")
     logger.info(f"  Documents: {len(documents)}")
     logger.info(f"  Chunks: {len(chunks)}")
     logger.info(f"  Index path: {config.data.index_path}")
+    logger.info(f"  Snapshot: {snapshot}")
 
 if __name__ == "__main__":
     main()
@@ -101,7 +101,7 @@ def evaluate_generation(pipeline, queries):
 def main():
     """Run evaluation."""
     logger.info("Initializing pipeline for evaluation...")
-    pipeline = initialize_pipeline(use_mock=False)
+    pipeline = initialize_pipeline()
     
     logger.info("Evaluating retrieval...")
     retrieval_metrics = evaluate_retrieval(pipeline, TEST_QUERIES)
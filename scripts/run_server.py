@@ -1,12 +1,20 @@
 """Run FastAPI server."""
 import uvicorn
 import logging
+from src.config import get_config
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "api.app:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
+    config = get_config()
+    
+    if config.api.workers > 1:
+        # Load the pipeline once and share it with forked workers
+        from api.prefork import serve
+        serve(config)
+    else:
+        uvicorn.run(
+            "api.app:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=True,
+            log_level="info"
+        )
@@ -0,0 +1,312 @@
+"""Answer caches: exact-match and semantic (near-duplicate question) caches of RAG results."""
+import abc
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+import faiss
+import numpy as np
+from src.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CACHE_REQUESTS = REGISTRY.counter(
+    "legalrag_answer_cache_requests_total",
+    "Answer cache lookups",
+    ["result"]
+)
+SEMANTIC_CACHE_REQUESTS = REGISTRY.counter(
+    "legalrag_semantic_cache_requests_total",
+    "Semantic cache lookups",
+    ["result"]
+)
+
+class CacheBackend(abc.ABC):
+    """Key-value store for serialized results; expired entries read as missing."""
+    
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        ...
+    
+    @abc.abstractmethod
+    def set(self, key: str, value: Dict[str, Any]):
+        ...
+    
+    @abc.abstractmethod
+    def clear(self):
+        ...
+    
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        ...
+
+class MemoryCache(CacheBackend):
+    """In-process LRU with a per-entry TTL (seconds, None = no expiry)."""
+    
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: Dict[str, Any]):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class DiskCache(CacheBackend):
+    """Persistent SQLite store shared by processes on one host.
+
+    Expiry uses wall-clock time so entries stay valid across restarts. Each
+    process (e.g. a pre-fork worker) opens its own connection on first use.
+    """
+    
+    def __init__(self, path: Path, ttl: Optional[float] = 3600.0, max_entries: int = 100000):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+    
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            self._pid = os.getpid()
+        return self._conn
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value, expires_at FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and now >= expires_at:
+                conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE answers SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+    
+    def set(self, key: str, value: Dict[str, Any]):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at, now)
+            )
+            # Drop expired entries, then the least recently used beyond max_entries
+            conn.execute("DELETE FROM answers WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM answers WHERE key IN "
+                "(SELECT key FROM answers ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+    
+    def clear(self):
+        with self._lock:
+            self._connection().execute("DELETE FROM answers")
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+class AnswerCache:
+    """Exact-match cache of complete answers.
+
+    Keys cover everything that determines an answer: the normalized question,
+    retrieval parameters, prompt template, model id and index version, so a
+    rebuilt or updated index never serves stale answers.
+    """
+    
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+    
+    @staticmethod
+    def make_key(**parts) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {e}")
+            value = None
+        CACHE_REQUESTS.inc(result="hit" if value is not None else "miss")
+        return value
+    
+    def set(self, key: str, value: Dict[str, Any]):
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            logger.warning(f"Answer cache store failed: {e}")
+    
+    def clear(self):
+        self.backend.clear()
+
+class SemanticCache:
+    """Reuses answers to earlier questions that mean the same thing.
+    
+    Question embeddings live in a small separate FAISS inner-product index.
+    A lookup hits when a stored question has cosine similarity >= threshold,
+    was answered with the same parameters (params_key) against the same index
+    version, and retrieved a compatible chunk set: Jaccard overlap of chunk
+    ids >= min_chunk_overlap (1.0 = the same chunks). The oldest entries are
+    evicted beyond max_entries.
+    """
+    
+    CANDIDATES = 8  # nearest stored questions checked per lookup
+    
+    def __init__(
+        self,
+        embedding_dim: int,
+        threshold: float = 0.92,
+        max_entries: int = 2048,
+        ttl: Optional[float] = 3600.0,
+        min_chunk_overlap: float = 1.0
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.min_chunk_overlap = min_chunk_overlap
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(embedding_dim))
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vector = np.array(embedding, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+    
+    def _chunks_compatible(self, stored: frozenset, current: frozenset) -> bool:
+        union = stored | current
+        return not union or len(stored & current) / len(union) >= self.min_chunk_overlap
+    
+    def lookup(
+        self,
+        embedding: np.ndarray,
+        params_key: str,
+        chunk_ids: Sequence[str],
+        index_version: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Return the stored value of the most similar compatible question, or None."""
+        vector = self._normalize(embedding)
+        chunk_ids = frozenset(chunk_ids)
+        now = time.monotonic()
+        value = None
+        
+        with self._lock:
+            if self._entries:
+                similarities, ids = self.index.search(vector, min(self.CANDIDATES, len(self._entries)))
+                expired = []
+                for similarity, entry_id in zip(similarities[0], ids[0]):
+                    entry = self._entries.get(int(entry_id))
+                    if entry is None:
+                        continue
+                    if entry['expires_at'] is not None and now >= entry['expires_at']:
+                        expired.append(int(entry_id))
+                        continue
+                    if similarity < self.threshold:
+                        break
+                    if (
+                        entry['params_key'] == params_key
+                        and entry['index_version'] == index_version
+                        and self._chunks_compatible(entry['chunk_ids'], chunk_ids)
+                    ):
+                        value = entry['value']
+                        break
+                self._remove(expired)
+        
+        SEMANTIC_CACHE_REQUESTS.inc(result="hit" if value is not None else "miss")
+        return value
+    
+    def add(
+        self,
+        embedding: np.ndarray,
+        params_key: str,
+        chunk_ids: Sequence[str],
+        index_version: Optional[str],
+        value: Dict[str, Any]
+    ):
+        """Store the answer to a question."""
+        vector = self._normalize(embedding)
+        
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = {
+                'params_key': params_key,
+                'chunk_ids': frozenset(chunk_ids),
+                'index_version': index_version,
+                'expires_at': time.monotonic() + self.ttl if self.ttl is not None else None,
+                'value': value
+            }
+            
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                self._remove(list(self._entries)[:overflow])
+    
+    def clear(self):
+        with self._lock:
+            self.index.reset()
+            self._entries.clear()
+    
+    def _remove(self, entry_ids: List[int]):
+        if not entry_ids:
+            return
+        self.index.remove_ids(np.array(entry_ids, dtype=np.int64))
+        for entry_id in entry_ids:
+            del self._entries[entry_id]
+
+def create_answer_cache(backend: Optional[str], max_entries: int, ttl: Optional[float], path: Path) -> Optional[AnswerCache]:
+    """Build the cache selected by config ("memory", "disk" or None to disable)."""
+    if not backend:
+        return None
+    if backend == "memory":
+        return AnswerCache(MemoryCache(max_entries, ttl))
+    if backend == "disk":
+        return AnswerCache(DiskCache(path, ttl, max_entries))
+    raise ValueError(f"Unknown answer cache backend: {backend}")
@@ -17,12 +17,33 @@ class ModelConfig:
     embedding_dim: int = 384
     
     llm_model_name: str = "mistralai/Mistral-7B-Instruct-v0.2"
+    llm_backend: str = "mock"  # "mock" (demo answers, no model), "local" or "http"
     llm_max_tokens: int = 512
     llm_temperature: float = 0.3
     llm_top_p: float = 0.9
     
     device: str = "cpu"  # "cpu" or "cuda"
     quantization: bool = False  # Use 8-bit quantization for memory efficiency
+    
+    # Cold start
+    low_memory_loading: bool = True  # mmap safetensors, no random init + copy
+    num_threads: Optional[int] = None  # torch intra-op threads (None = torch default)
+    num_interop_threads: Optional[int] = None
+    warmup: bool = True  # Warm-up generate/encode before reporting ready
+    warmup_tokens: int = 4
+    
+    # Cross-encoder reranking of retrieved chunks (local path or cached model; None = off)
+    reranker_model_name: Optional[str] = None
+    
+    # Assisted (speculative) decoding: small LM sharing the main model's tokenizer
+    draft_model_name: Optional[str] = None
+    draft_min_acceptance_rate: float = 0.4  # Fall back to normal decoding below this
+    
+    # OpenAI-compatible inference server (llm_backend: "http")
+    llm_server_url: str = "http://127.0.0.1:8080"
+    llm_server_timeout: float = 60.0
+    llm_server_max_retries: int = 2
+    llm_server_max_connections: int = 16
 
 @dataclass
 class RAGConfig:
@@ -32,19 +53,60 @@ class RAGConfig:
     chunk_overlap: int = 100
     top_k: int = 3
     similarity_threshold: float = 0.5
+    mmr_lambda: Optional[float] = None  # diversify results by MMR: 1 = relevance only, 0 = diversity only (None = off)
+    mmr_fetch_k: int = 20  # candidates MMR picks top_k from
+    rerank_candidates: int = 20  # chunks the reranker (model.reranker_model_name) picks top_k from
+    rerank_cache_size: int = 4096  # cached (query, chunk) scores
+    rerank_batch_size: int = 32  # (query, chunk) pairs per cross-encoder forward pass
+    
+    # Multi-query retrieval: rephrasings searched together, rankings fused by reciprocal rank
+    multi_query_variants: int = 0  # rephrasings per question (0 = off)
+    multi_query_llm: bool = False  # also ask the LLM for rephrasings (one extra generation before retrieval)
+    rrf_k: int = 60  # reciprocal rank fusion constant
     
     # Indexing
     index_type: str = "faiss"  # "faiss" or "chroma"
     metric_type: str = "l2"
+    index_mmap: bool = False  # Memory-map the saved index (snapshot or data.index_path) instead of rebuilding
+    index_watch_interval: Optional[float] = None  # seconds between checks for a new current snapshot (None = off)
     
     # Generation
     max_source_tokens: int = 2000
     system_prompt_template: str = "legal"  # Шаблон промпта
+    llm_batch_size: int = 8  # prompts per generate_batch call in /ask/batch (bounds the KV cache)
     
     # Safety
     enable_safety_checks: bool = True
-    check_hallucination: bool = True
+    defer_safety_checks: bool = True  # non-critical checks run after /ask has responded
+    check_hallucination: bool = True  # embedding grounding of answer sentences (needs enable_safety_checks)
+    grounding_threshold: float = 0.35  # cosine similarity a sentence needs to some retrieved chunk
     max_refusal_rate: float = 0.1
+    
+    # Exact-match answer cache
+    answer_cache: Optional[str] = "memory"  # "memory", "disk" or None (off)
+    answer_cache_max_entries: int = 1024
+    answer_cache_ttl: Optional[float] = 3600.0  # seconds (None = no expiry)
+    
+    # Semantic cache: reuse answers to paraphrased questions (same TTL as answer_cache)
+    semantic_cache: bool = False
+    semantic_cache_threshold: float = 0.92  # cosine similarity of question embeddings
+    semantic_cache_max_entries: int = 2048
+    semantic_cache_min_chunk_overlap: float = 1.0  # Jaccard overlap of retrieved chunk ids
+    
+    # Load shedding: answer extractively (no LLM) when overloaded; None disables a trigger
+    degrade_queue_depth: Optional[int] = None  # requests waiting for generation
+    degrade_latency_ms: Optional[float] = None  # p95 generation latency over degrade_window
+    degrade_window: float = 30.0  # seconds
+    extractive_sentences: int = 3
+    
+    # Extractive answers picked with the embedding model (answer_mode "extractive"/"auto", and load shedding)
+    extractive_threshold: Optional[float] = None  # "auto" answers extractively at this sentence similarity (None = off)
+    extractive_max_candidates: int = 200  # sentences embedded per question
+    
+    # Online ingestion (POST/DELETE /documents), applied to the index in micro-batches
+    ingest_batch_size: int = 16
+    ingest_batch_wait: float = 0.2  # seconds to wait for more jobs after the first
+    ingest_max_queue: int = 1000
 
 @dataclass
 class DataConfig:
@@ -53,6 +115,10 @@ class DataConfig:
     processed_data_path: Path = DATA_DIR / "processed" / "chunks.jsonl"
     index_path: Path = DATA_DIR / "indices" / "faiss_index.bin"
     metadata_path: Path = DATA_DIR / "indices" / "metadata.json"
+    snapshot_dir: Path = DATA_DIR / "indices" / "snapshots"  # versioned index snapshots (scripts/build_index.py)
+    snapshots_keep: int = 3
+    answer_cache_path: Path = DATA_DIR / "cache" / "answers.sqlite"
+    startup_timings_path: Path = DATA_DIR / "cache" / "startup_timings.json"  # ETA for /ready
     
     test_split: float = 0.1
     val_split: float = 0.1
@@ -64,8 +130,35 @@ class APIConfig:
     host: str = "0.0.0.0"
     port: int = 8000
     reload: bool = True
-    workers: int = 1
+    workers: int = 1  # >1: pre-fork workers sharing the parent's pipeline (scripts/run_server.py)
+    metrics_port: Optional[int] = 9100  # pre-fork: worker i serves /metrics on metrics_port + i (None = off)
     timeout: float = 30.0
+    
+    # Admission control: requests beyond max_in_flight queue, beyond max_queue get 503
+    max_in_flight: int = 4
+    max_queue: int = 32
+    retrieval_workers: int = 4
+    
+    # Concurrent identical /ask requests share one computation
+    coalesce_requests: bool = True
+    
+    # Batch endpoint
+    max_batch_size: int = 256
+    batch_timeout: float = 300.0
+    
+    # Scheduling per client (X-API-Key header): priority class ("interactive" or
+    # "batch"), fair-share weight and token-bucket rate limit (requests/second).
+    # clients maps an API key to overrides, e.g. {"key": {"priority": "batch", "weight": 0.5}};
+    # requests with any other (or no) key share one "anonymous" client
+    default_priority: str = "interactive"
+    default_weight: float = 1.0
+    default_rate_limit: Optional[float] = None  # None = unlimited
+    default_rate_burst: int = 10
+    clients: dict = None
+    
+    def __post_init__(self):
+        if self.clients is None:
+            self.clients = {}
 
 @dataclass
 class EvaluationConfig:
@@ -0,0 +1,46 @@
+"""Request deadlines and cancellation."""
+import threading
+import time
+from typing import Optional
+
+class DeadlineExceeded(Exception):
+    """Raised when a request runs out of time before generation starts."""
+
+class Deadline:
+    """Time budget and cancellation flag shared by all stages of one request.
+
+    Uses a monotonic clock. Generation checks should_stop() on every decoding
+    step and sets triggered when it stops early, so the caller can flag the
+    answer as truncated.
+    """
+    
+    def __init__(self, timeout: Optional[float] = None):
+        self.expires_at = time.monotonic() + timeout if timeout is not None else None
+        self.triggered = False
+        self._cancelled = threading.Event()
+    
+    def remaining(self) -> Optional[float]:
+        """Seconds left (None if there is no time limit)."""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+    
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+    
+    def cancel(self):
+        """Cancel the request (e.g. the client disconnected)."""
+        self._cancelled.set()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+    
+    def should_stop(self) -> bool:
+        return self.cancelled or self.expired()
+    
+    def check(self, stage: str):
+        """Raise DeadlineExceeded if the request should not continue."""
+        if self.should_stop():
+            reason = "cancelled" if self.cancelled else "deadline exceeded"
+            raise DeadlineExceeded(f"Request {reason} before {stage}")
@@ -1,31 +1,58 @@
 """Embedding generation and FAISS index management."""
+import hashlib
 import json
+import threading
+from collections import OrderedDict
 import numpy as np
 import logging
 from pathlib import Path
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 import faiss
 from sentence_transformers import SentenceTransformer
+from src.metrics import timed_stage
+from src.mmr import mmr_select
+from src.utils import PhaseTimer
 
 logger = logging.getLogger(__name__)
 
 class EmbeddingGenerator:
     """Generates embeddings using sentence-transformers."""
     
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2", device: str = "cpu"):
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        device: str = "cpu",
+        low_memory: bool = True,
+        warmup: bool = False
+    ):
         logger.info(f"Loading embedding model: {model_name}")
-        self.model = SentenceTransformer(model_name, device=device)
-        self.embedding_dim = self.model.get_sentence_embedding_dimension()
+        self.model_name = model_name
+        timer = PhaseTimer()
+        
+        model_kwargs = {"low_cpu_mem_usage": True} if low_memory else None
+        with timer.phase("model"):
+            self.model = SentenceTransformer(model_name, device=device, model_kwargs=model_kwargs)
+            self.embedding_dim = self.model.get_sentence_embedding_dimension()
+        
+        if warmup:
+            with timer.phase("warmup"):
+                self.model.encode(["warm-up"], convert_to_numpy=True, show_progress_bar=False)
+        
+        self.load_timings = timer.timings
         logger.info(f"Embedding dimension: {self.embedding_dim}")
+        logger.info(f"Embedding model load timings: {timer.summary()}")
     
-    def encode(self, texts: List[str]) -> np.ndarray:
+    def encode(self, texts: List[str], show_progress_bar: bool = True) -> np.ndarray:
         """Encode texts to embeddings."""
-        embeddings = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=True)
+        embeddings = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=show_progress_bar)
         return embeddings
 
 class FAISSIndex:
     """FAISS index for fast similarity search."""
     
+    # Long free text, left out of the filter postings (filters on it scan the chunks)
+    UNINDEXED_FIELDS = frozenset({"content"})
+    
     def __init__(self, embedding_dim: int, metric: str = "l2"):
         self.embedding_dim = embedding_dim
         self.metric = metric
@@ -39,38 +66,182 @@ class FAISSIndex:
             raise ValueError(f"Unknown metric: {metric}")
         
         self.chunk_metadata = []
+        # Filter postings: field (or "metadata.<key>") -> value -> sorted vector ids
+        self.postings: Dict[str, Dict[Any, np.ndarray]] = {}
+        self.version = ""
+        self.snapshot: Optional[str] = None  # snapshot it was loaded from (see src.snapshots)
+    
+    def _update_version(self, added: List[Dict[str, Any]], removed: List[Dict[str, Any]] = ()):
+        """Derive a new version from the previous one and the removed and added chunks.
+        
+        Added chunks count with their full metadata, content included, so
+        re-indexing edited documents under the same chunk ids changes the
+        version; removed chunks count by id. Deterministic, so the same index
+        built or loaded in another process gets the same version (answer cache
+        keys depend on it).
+        """
+        changes = "\n".join(
+            ["-" + str(m.get('chunk_id', '')) for m in removed]
+            + [json.dumps(m, sort_keys=True, ensure_ascii=False, default=str) for m in added]
+        )
+        self.version = hashlib.sha1(f"{self.version}\n{changes}".encode("utf-8")).hexdigest()[:16]
+    
+    @classmethod
+    def _scalar_fields(cls, chunk_meta: Dict[str, Any], prefix: str = ""):
+        for key, value in chunk_meta.items():
+            name = prefix + key
+            if isinstance(value, dict):
+                yield from cls._scalar_fields(value, name + ".")
+            elif name not in cls.UNINDEXED_FIELDS:
+                yield name, value
+    
+    def _build_postings(self):
+        """Rebuild the filter postings from chunk_metadata."""
+        self.postings = {}
+        self._extend_postings(self.chunk_metadata, 0)
+    
+    def _extend_postings(self, metadata: List[Dict[str, Any]], start: int):
+        """Add chunks with vector ids from start on (higher than all indexed ones) to the postings.
+        
+        Unhashable values are left out. Id arrays are replaced, never modified
+        in place, so copies only need their own dicts.
+        """
+        added: Dict[str, Dict[Any, List[int]]] = {}
+        for vector_id, chunk_meta in enumerate(metadata, start):
+            for name, value in self._scalar_fields(chunk_meta):
+                try:
+                    added.setdefault(name, {}).setdefault(value, []).append(vector_id)
+                except TypeError:
+                    continue
+        for name, values in added.items():
+            postings = self.postings.setdefault(name, {})
+            for value, ids in values.items():
+                ids = np.array(ids, dtype=np.int64)
+                postings[value] = np.concatenate([postings[value], ids]) if value in postings else ids
+    
+    def matching_ids(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Sorted vector ids of chunks matching every filter (a value or a list of allowed values).
+        
+        Looked up in the postings; only UNINDEXED_FIELDS are scanned.
+        """
+        ids = None
+        for name, value in filters.items():
+            values = set(value) if isinstance(value, (list, tuple, set)) else {value}
+            if name in self.UNINDEXED_FIELDS:
+                field_ids = np.array([
+                    vector_id for vector_id, chunk_meta in enumerate(self.chunk_metadata)
+                    if chunk_meta.get(name) in values
+                ], dtype=np.int64)
+            else:
+                postings = self.postings.get(name, {})
+                matched = [postings[v] for v in values if v in postings]
+                field_ids = np.unique(np.concatenate(matched)) if matched else np.empty(0, dtype=np.int64)
+            ids = field_ids if ids is None else np.intersect1d(ids, field_ids, assume_unique=True)
+            if not len(ids):
+                break
+        return ids if ids is not None else np.arange(len(self.chunk_metadata), dtype=np.int64)
     
     def add(self, embeddings: np.ndarray, metadata: List[Dict[str, Any]]):
         """Add embeddings and metadata to index."""
-        if isinstance(embeddings, list):
-            embeddings = np.array(embeddings, dtype=np.float32)
+        self.replace_documents([], embeddings, metadata)
+        logger.info(f"Added {len(metadata)} embeddings. Total: {self.index.ntotal}")
+    
+    def remove_documents(self, doc_ids: List[str]) -> int:
+        """Remove all chunks of the given documents; returns the number removed.
         
-        # Ensure correct dtype and shape
-        embeddings = np.asarray(embeddings, dtype=np.float32)
-        if embeddings.ndim == 1:
-            embeddings = embeddings.reshape(1, -1)
+        Remaining vectors are renumbered in order, like chunk_metadata.
+        """
+        removed = self.replace_documents(doc_ids)
+        if removed:
+            logger.info(f"Removed {removed} embeddings. Total: {self.index.ntotal}")
+        return removed
+    
+    def replace_documents(
+        self,
+        doc_ids: List[str],
+        embeddings: Optional[np.ndarray] = None,
+        metadata: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        """Remove all chunks of doc_ids, then add the given chunks, as one update.
         
-        # Normalize for cosine similarity if needed
-        if self.metric == "cosine":
-            faiss.normalize_L2(embeddings)
+        The version and the filter postings are updated once for the whole
+        change, so a batch of documents costs one pass over the index instead
+        of one per document, and adding alone only indexes the new chunks.
+        Returns the number of chunks removed.
+        """
+        postings = self.postings.get('source_doc_id', {})
+        matched = [postings[doc_id] for doc_id in set(doc_ids) if doc_id in postings]
+        positions = np.unique(np.concatenate(matched)) if matched else np.empty(0, dtype=np.int64)
+        removed_metadata = [self.chunk_metadata[i] for i in positions]
+        if len(positions):
+            self.index.remove_ids(positions)
+            removed = set(positions.tolist())
+            self.chunk_metadata = [m for i, m in enumerate(self.chunk_metadata) if i not in removed]
         
-        self.index.add(embeddings)
-        self.chunk_metadata.extend(metadata)
+        metadata = metadata or []
+        if metadata:
+            # Ensure correct dtype and shape
+            embeddings = np.array(embeddings, dtype=np.float32)
+            if embeddings.ndim == 1:
+                embeddings = embeddings.reshape(1, -1)
+            
+            # Normalize for cosine similarity if needed
+            if self.metric == "cosine":
+                faiss.normalize_L2(embeddings)
+            
+            self.index.add(embeddings)
+            self.chunk_metadata.extend(metadata)
         
-        logger.info(f"Added {len(embeddings)} embeddings. Total: {self.index.ntotal}")
+        if len(positions) or metadata:
+            self._update_version(metadata, removed_metadata)
+            if len(positions):
+                # Removal renumbers the vectors after it
+                self._build_postings()
+            else:
+                self._extend_postings(metadata, len(self.chunk_metadata) - len(metadata))
+        return len(positions)
+    
+    def copy(self) -> 'FAISSIndex':
+        """Independent in-memory copy (also of a memory-mapped index) to modify off to the side."""
+        obj = FAISSIndex(self.embedding_dim, self.metric)
+        obj.index = faiss.clone_index(self.index)
+        obj.chunk_metadata = list(self.chunk_metadata)
+        obj.postings = {name: dict(values) for name, values in self.postings.items()}
+        obj.version = self.version
+        obj.snapshot = self.snapshot
+        return obj
+    
+    def reconstruct_batch(self, ids: List[int]) -> np.ndarray:
+        """Stored vectors for the given ids (normalized for cosine), in one call."""
+        return self.index.reconstruct_batch(np.asarray(ids, dtype=np.int64))
     
     def search(self, query_embedding: np.ndarray, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
         """Search for k nearest neighbors."""
-        if query_embedding.ndim == 1:
-            query_embedding = query_embedding.reshape(1, -1)
+        distances, indices = self.search_batch(query_embedding, k)
+        return distances[0], indices[0]
+    
+    def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = 5,
+        ids: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Search k nearest neighbors for several queries in one call (rows = queries).
+        
+        If ids is given, only those vector ids are considered.
+        """
+        if query_embeddings.ndim == 1:
+            query_embeddings = query_embeddings.reshape(1, -1)
         
-        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        query_embeddings = np.array(query_embeddings, dtype=np.float32)
         
         if self.metric == "cosine":
-            faiss.normalize_L2(query_embedding)
+            faiss.normalize_L2(query_embeddings)
         
-        distances, indices = self.index.search(query_embedding, k)
-        return distances[0], indices[0]
+        if ids is not None:
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(np.asarray(ids, dtype=np.int64)))
+            return self.index.search(query_embeddings, k, params=params)
+        return self.index.search(query_embeddings, k)
     
     def save(self, path: Path):
         """Save index to disk."""
@@ -85,9 +256,19 @@ class FAISSIndex:
         logger.info(f"Saved index to {path} and metadata to {metadata_path}")
     
     @classmethod
-    def load(cls, path: Path, metric: str = "l2") -> 'FAISSIndex':
-        """Load index from disk."""
-        index = faiss.read_index(str(path))
+    def load(cls, path: Path, metric: str = "l2", mmap: bool = False) -> 'FAISSIndex':
+        """Load index from disk.
+        
+        With mmap=True the vectors are memory-mapped read-only instead of read
+        into process memory, so several processes serving the same file share
+        one copy through the page cache.
+        """
+        if mmap:
+            # IO_FLAG_MMAP_IFC also maps flat indexes (FAISS >= 1.8)
+            flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+            index = faiss.read_index(str(path), flags)
+        else:
+            index = faiss.read_index(str(path))
         embedding_dim = index.d
         
         obj = cls(embedding_dim, metric)
@@ -98,6 +279,8 @@ class FAISSIndex:
         if metadata_path.exists():
             with open(metadata_path, 'r', encoding='utf-8') as f:
                 obj.chunk_metadata = json.load(f)
+        obj._update_version(obj.chunk_metadata)
+        obj._build_postings()
         
         logger.info(f"Loaded index from {path} with {index.ntotal} embeddings")
         return obj
@@ -105,10 +288,45 @@ class FAISSIndex:
 class EmbeddingManager:
     """Manages embedding generation and indexing."""
     
-    def __init__(self, embedding_model: str, device: str = "cpu", metric: str = "l2"):
-        self.embedding_generator = EmbeddingGenerator(embedding_model, device)
+    QUERY_EMBEDDING_CACHE_SIZE = 256
+    
+    def __init__(
+        self,
+        embedding_model: str,
+        device: str = "cpu",
+        metric: str = "l2",
+        low_memory: bool = True,
+        warmup: bool = False
+    ):
+        self.embedding_generator = EmbeddingGenerator(embedding_model, device, low_memory, warmup)
         self.index = None
         self.metric = metric
+        # Held by writers that replace self.index (ingestion, snapshot reload); readers never take it
+        self.update_lock = threading.Lock()
+        
+        # Recent query embeddings, so later stages (e.g. the semantic cache) reuse them
+        self._query_embeddings: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_embeddings_lock = threading.Lock()
+    
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed queries in one encode call, reusing recently computed embeddings."""
+        with self._query_embeddings_lock:
+            cached = {q: self._query_embeddings.get(q) for q in queries}
+            for query, embedding in cached.items():
+                if embedding is not None:
+                    self._query_embeddings.move_to_end(query)
+        missing = [q for q, e in cached.items() if e is None]
+        
+        if missing:
+            embeddings = self.embedding_generator.encode(missing, show_progress_bar=False)
+            with self._query_embeddings_lock:
+                for query, embedding in zip(missing, embeddings):
+                    cached[query] = embedding
+                    self._query_embeddings[query] = embedding
+                while len(self._query_embeddings) > self.QUERY_EMBEDDING_CACHE_SIZE:
+                    self._query_embeddings.popitem(last=False)
+        
+        return np.stack([cached[q] for q in queries])
     
     def build_index(self, chunks: List) -> FAISSIndex:
         """Build FAISS index from chunks."""
@@ -132,17 +350,139 @@ class EmbeddingManager:
         
         return self.index
     
-    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        timer: Optional[PhaseTimer] = None,
+        offset: int = 0,
+        filters: Optional[Dict[str, Any]] = None,
+        mmr_lambda: Optional[float] = None,
+        fetch_k: int = 20
+    ) -> List[Dict[str, Any]]:
         """Search for similar chunks."""
-        query_embedding = self.embedding_generator.encode([query])
-        distances, indices = self.index.search(query_embedding[0], k)
+        return self.search_batch(
+            [query], k, timer=timer, offset=offset, filters=filters, mmr_lambda=mmr_lambda, fetch_k=fetch_k
+        )[0]
+    
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        timer: Optional[PhaseTimer] = None,
+        offset: int = 0,
+        filters: Optional[Dict[str, Any]] = None,
+        mmr_lambda: Optional[float] = None,
+        fetch_k: int = 20
+    ) -> List[List[Dict[str, Any]]]:
+        """Search for several queries with one encode call and one FAISS search.
         
+        Returns results offset..offset+k of each ranking. filters maps a chunk
+        field (or "metadata.<key>") to a value or a list of allowed values;
+        non-matching chunks are excluded inside the FAISS search. With
+        mmr_lambda, the ranking is diversified by Maximal Marginal Relevance
+        (see src.mmr) over the top fetch_k candidates (at least offset + k).
+        Stage durations (query_embedding, metadata_filter, vector_search,
+        diversify, metadata_fetch) are added to timer when given.
+        """
+        # Read the index once: updates replace it with a new object (see IngestionWorker)
+        index = self.index
+        
+        ids = None
+        if filters:
+            with timed_stage("metadata_filter", timer):
+                ids = index.matching_ids(filters)
+            if not len(ids):
+                return [[] for _ in queries]
+        
+        with timed_stage("query_embedding", timer):
+            query_embeddings = self.encode_queries(queries)
+        with timed_stage("vector_search", timer):
+            distances, indices = index.search_batch(
+                query_embeddings, offset + k if mmr_lambda is None else max(fetch_k, offset + k), ids
+            )
+        if mmr_lambda is not None:
+            with timed_stage("diversify", timer):
+                distances, indices = self._diversify(index, query_embeddings, distances, indices, offset + k, mmr_lambda)
+        with timed_stage("metadata_fetch", timer):
+            return [self._to_results(index, d[offset:], i[offset:]) for d, i in zip(distances, indices)]
+    
+    def chunk_embeddings(self, chunks: List[Dict[str, Any]]) -> np.ndarray:
+        """Embeddings of search results, reconstructed from the index rather than re-encoded.
+        
+        Chunks whose vector_id no longer refers to them (the index was replaced
+        since the search) are encoded from their content instead.
+        """
+        index = self.index
+        stored = [
+            i for i, chunk in enumerate(chunks)
+            if index is not None
+            and 0 <= chunk.get('vector_id', -1) < len(index.chunk_metadata)
+            and index.chunk_metadata[chunk['vector_id']].get('chunk_id') == chunk.get('chunk_id')
+        ]
+        missing = sorted(set(range(len(chunks))) - set(stored))
+        
+        dim = index.embedding_dim if index is not None else self.embedding_generator.embedding_dim
+        embeddings = np.empty((len(chunks), dim), dtype=np.float32)
+        if stored:
+            embeddings[stored] = index.reconstruct_batch([chunks[i]['vector_id'] for i in stored])
+        if missing:
+            embeddings[missing] = self.embedding_generator.encode(
+                [chunks[i].get('content', '') for i in missing],
+                show_progress_bar=False
+            )
+        return embeddings
+    
+    def diversify(
+        self,
+        query_embedding: np.ndarray,
+        chunks: List[Dict[str, Any]],
+        k: int,
+        lambda_mult: float
+    ) -> List[Dict[str, Any]]:
+        """Pick k of the given search results by MMR, using their vectors from the index."""
+        if not chunks:
+            return []
+        return [chunks[i] for i in mmr_select(query_embedding, self.chunk_embeddings(chunks), k, lambda_mult)]
+    
+    @staticmethod
+    def _diversify(
+        index: FAISSIndex,
+        query_embeddings: np.ndarray,
+        distances: np.ndarray,
+        indices: np.ndarray,
+        k: int,
+        lambda_mult: float
+    ) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Reorder each query's candidates by MMR, keeping the best k.
+        
+        The candidates' stored vectors are reconstructed from the index in one
+        call for all queries.
+        """
+        candidate_ids = np.unique(indices[indices >= 0])
+        if not len(candidate_ids):
+            return list(distances[:, :k]), list(indices[:, :k])
+        vectors = index.reconstruct_batch(candidate_ids)
+        
+        picked_distances, picked_indices = [], []
+        for query_embedding, query_distances, query_indices in zip(query_embeddings, distances, indices):
+            valid = query_indices >= 0
+            query_distances, query_indices = query_distances[valid], query_indices[valid]
+            rows = np.searchsorted(candidate_ids, query_indices)
+            order = mmr_select(query_embedding, vectors[rows], k, lambda_mult)
+            picked_distances.append(query_distances[order])
+            picked_indices.append(query_indices[order])
+        return picked_distances, picked_indices
+    
+    def _to_results(self, index: FAISSIndex, distances: np.ndarray, indices: np.ndarray) -> List[Dict[str, Any]]:
         results = []
         for distance, idx in zip(distances, indices):
-            if idx < len(self.index.chunk_metadata):
-                chunk_meta = self.index.chunk_metadata[int(idx)]
+            # FAISS pads with -1 when the index holds fewer than k vectors
+            if 0 <= idx < len(index.chunk_metadata):
+                chunk_meta = index.chunk_metadata[int(idx)]
                 results.append({
                     **chunk_meta,
+                    'vector_id': int(idx),
                     'similarity_score': float(1 / (1 + distance)) if self.metric == "l2" else float(distance)
                 })
         
@@ -0,0 +1,42 @@
+"""Extractive answers: the question's most similar sentences from retrieved chunks, without an LLM."""
+import re
+from typing import Any, Callable, Dict, List, Tuple
+import numpy as np
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?;])\s+|\n+')
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences (also at line breaks, for clauses and list items)."""
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+def rank_sentences_by_embedding(
+    question_embedding: np.ndarray,
+    chunks: List[Dict[str, Any]],
+    encode: Callable[[List[str]], np.ndarray],
+    max_candidates: int = 200
+) -> List[Tuple[float, str, Dict[str, Any]]]:
+    """Score sentences by cosine similarity to the question embedding, best first.
+    
+    All candidate sentences (at most max_candidates, in retrieval order) are
+    embedded with a single encode call.
+    """
+    candidates = [
+        (sentence, chunk)
+        for chunk in chunks
+        for sentence in split_sentences(chunk.get('content', ''))
+    ][:max_candidates]
+    if not candidates:
+        return []
+    
+    embeddings = np.asarray(encode([sentence for sentence, _ in candidates]), dtype=np.float32)
+    embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(question_embedding, dtype=np.float32)
+    similarities = embeddings @ (query / max(float(np.linalg.norm(query)), 1e-12))
+    
+    # Stable sort keeps retrieval order among equal scores
+    order = np.argsort(-similarities, kind="stable")
+    return [(float(similarities[i]), candidates[i][0], candidates[i][1]) for i in order]
+
+def format_spans(picks: List[Tuple[str, Dict[str, Any]]]) -> str:
+    """One sentence per line, each followed by its source document."""
+    return "\n".join(f"{sentence} [{chunk.get('source_title', 'Unknown')}]" for sentence, chunk in picks)
@@ -0,0 +1,206 @@
+"""Online document ingestion: a background worker applying document adds and deletes to the live index."""
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from src.data_loader import Document
+from src.document_processor import DocumentProcessor
+from src.embedding_manager import EmbeddingManager, FAISSIndex
+from src.metrics import REGISTRY, timed_stage
+
+logger = logging.getLogger(__name__)
+
+INGEST_JOBS = REGISTRY.counter(
+    "legalrag_ingest_jobs_total",
+    "Document ingestion jobs processed",
+    ["operation", "status"]
+)
+
+@dataclass
+class IngestionJob:
+    """One queued document add or delete."""
+    job_id: str
+    operation: str  # "add" or "delete"
+    doc_id: str
+    document: Optional[Document] = None
+    status: str = "queued"  # "queued", "running", "done" or "failed"
+    chunks: int = 0  # chunks added (add) or removed (delete)
+    error: Optional[str] = None
+    index_version: Optional[str] = None  # index version that first contains the change
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.job_id,
+            'operation': self.operation,
+            'doc_id': self.doc_id,
+            'status': self.status,
+            'chunks': self.chunks,
+            'error': self.error,
+            'index_version': self.index_version,
+            'submitted_at': self.submitted_at,
+            'finished_at': self.finished_at
+        }
+
+class IngestionWorker:
+    """Applies queued document changes to an EmbeddingManager's index in micro-batches.
+
+    A batch collects up to batch_size jobs (waiting at most batch_wait seconds
+    after the first), chunks the added documents and embeds them in one encode
+    call, applies all changes in submission order to a copy of the index and
+    then replaces embedding_manager.index with it. Searches keep using the
+    index they started with, so readers never wait for or see a half-applied
+    batch, and the new index version invalidates cached answers.
+
+    Adding a document that is already indexed replaces its chunks. Changes live
+    in memory only; they are lost on restart or when a snapshot is swapped in.
+    """
+    
+    MAX_JOBS = 10000  # finished jobs kept for status lookups
+    
+    def __init__(
+        self,
+        embedding_manager: EmbeddingManager,
+        processor: DocumentProcessor,
+        batch_size: int = 16,
+        batch_wait: float = 0.2,
+        max_queue: int = 1000
+    ):
+        self.embedding_manager = embedding_manager
+        self.processor = processor
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._queue: "queue.Queue[IngestionJob]" = queue.Queue(maxsize=max_queue)
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ingestion", daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+    
+    def submit_add(self, document: Document) -> IngestionJob:
+        """Queue a document to be indexed (raises queue.Full when the queue is full)."""
+        return self._submit(IngestionJob(uuid.uuid4().hex, "add", document.doc_id, document=document))
+    
+    def submit_delete(self, doc_id: str) -> IngestionJob:
+        """Queue removal of all chunks of a document (raises queue.Full when the queue is full)."""
+        return self._submit(IngestionJob(uuid.uuid4().hex, "delete", doc_id))
+    
+    def get_job(self, job_id: str) -> Optional[IngestionJob]:
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+    
+    def _submit(self, job: IngestionJob) -> IngestionJob:
+        with self._jobs_lock:
+            self._queue.put_nowait(job)
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > self.MAX_JOBS:
+                self._jobs.popitem(last=False)
+        return job
+    
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            
+            batch = [job]
+            batch_deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = batch_deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            self.process_batch(batch)
+    
+    def process_batch(self, jobs: List[IngestionJob]):
+        """Apply jobs to the index as one update."""
+        for job in jobs:
+            job.status = "running"
+        
+        try:
+            with timed_stage("ingestion"):
+                self._apply(jobs)
+        except Exception as e:
+            logger.error(f"Ingestion batch of {len(jobs)} jobs failed: {e}")
+            for job in jobs:
+                job.status = "failed"
+                job.error = str(e)
+        else:
+            for job in jobs:
+                job.status = "done"
+        
+        finished_at = time.time()
+        for job in jobs:
+            job.finished_at = finished_at
+            INGEST_JOBS.inc(operation=job.operation, status=job.status)
+    
+    def _apply(self, jobs: List[IngestionJob]):
+        manager = self.embedding_manager
+        
+        chunks_by_job = {
+            job.job_id: self.processor.process_documents([job.document])
+            for job in jobs if job.operation == "add"
+        }
+        texts = [chunk.content for chunks in chunks_by_job.values() for chunk in chunks]
+        embeddings = manager.embedding_generator.encode(texts, show_progress_bar=False) if texts else None
+        
+        with manager.update_lock:
+            if manager.index is not None:
+                index = manager.index.copy()
+            else:
+                index = FAISSIndex(manager.embedding_generator.embedding_dim, manager.metric)
+            
+            # Replay the jobs in submission order, so e.g. a delete after an add of the
+            # same document wins, and only apply each document's final state
+            indexed = index.postings.get('source_doc_id', {})
+            chunk_counts = {}
+            final_rows = {}  # doc_id -> embedding rows of its last add (None if deleted)
+            offset = 0
+            for job in jobs:
+                current = chunk_counts.get(job.doc_id, len(indexed.get(job.doc_id, ())))
+                final_rows.pop(job.doc_id, None)
+                if job.operation == "add":
+                    chunks = chunks_by_job[job.job_id]
+                    final_rows[job.doc_id] = (job.job_id, range(offset, offset + len(chunks)))
+                    offset += len(chunks)
+                    job.chunks = chunk_counts[job.doc_id] = len(chunks)
+                else:
+                    final_rows[job.doc_id] = None
+                    chunk_counts[job.doc_id] = 0
+                    job.chunks = current
+            
+            added = [value for value in final_rows.values() if value is not None]
+            rows = [row for _, job_rows in added for row in job_rows]
+            index.replace_documents(
+                list(final_rows),
+                embeddings[rows] if rows else None,
+                [chunk.to_dict() for job_id, _ in added for chunk in chunks_by_job[job_id]]
+            )
+            
+            manager.index = index
+        for job in jobs:
+            job.index_version = index.version
+        
+        logger.info(f"Applied {len(jobs)} ingestion jobs (index version {index.version}, {index.index.ntotal} vectors)")
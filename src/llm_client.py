@@ -1,11 +1,260 @@
 """LLM client for inference."""
+import asyncio
+import json
 import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, AsyncIterator, Iterator, List, Tuple
+import httpx
 import torch
-from typing import Optional
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+from transformers import (
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    pipeline
+)
+from src.deadline import Deadline
+from src.metrics import REGISTRY
+from src.utils import PhaseTimer
 
 logger = logging.getLogger(__name__)
 
+LLM_GENERATE_SECONDS = REGISTRY.histogram(
+    "legalrag_llm_generate_seconds",
+    "Latency of LLM generate calls",
+    ["backend"]
+)
+TOKENS_GENERATED = REGISTRY.counter(
+    "legalrag_llm_tokens_generated_total",
+    "Completion tokens generated by the LLM",
+    ["backend"]
+)
+ASSISTED_ACCEPTANCE_RATE = REGISTRY.gauge(
+    "legalrag_assisted_acceptance_rate",
+    "Fraction of draft tokens accepted by the main model"
+)
+ASSISTED_SPEEDUP = REGISTRY.gauge(
+    "legalrag_assisted_speedup",
+    "Assisted over plain decoding throughput"
+)
+
+@dataclass
+class GenerationStats:
+    """Token counts and prefill/decode split of one generate call.
+    
+    Pass an instance as stats= to a client's generate(); fields the backend
+    cannot measure stay None.
+    """
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    prefill_ms: Optional[float] = None
+    decode_ms: Optional[float] = None
+    
+    def tokens_per_second(self) -> Optional[float]:
+        """Decode throughput (the first token is produced by the prefill)."""
+        if not self.completion_tokens or not self.decode_ms:
+            return None
+        return max(self.completion_tokens - 1, 1) / (self.decode_ms / 1000)
+
+class AssistedDecodingMonitor:
+    """Tracks draft acceptance rate and decides when assisted decoding pays off.
+
+    Each verification pass of the main model accepts some of the draft tokens and
+    adds one token of its own, so accepted = new_tokens - main_forward_passes and
+    proposed = draft_forward_passes.
+    """
+    
+    def __init__(
+        self,
+        min_acceptance_rate: float = 0.4,
+        window: int = 20,
+        min_samples: int = 5,
+        probe_interval: int = 50
+    ):
+        self.min_acceptance_rate = min_acceptance_rate
+        self.min_samples = min_samples
+        self.probe_interval = probe_interval
+        
+        self._samples = deque(maxlen=window)  # (accepted, proposed)
+        self._lock = threading.Lock()
+        self._plain_since_fallback = 0
+        
+        self.enabled = True
+        self.assisted_generations = 0
+        self.plain_generations = 0
+        self.fallbacks = 0
+        self.assisted_tokens_per_s = 0.0
+        self.plain_tokens_per_s = 0.0
+    
+    def use_assistant(self) -> bool:
+        """Whether the next generation should use the draft model."""
+        with self._lock:
+            if self.enabled:
+                return True
+            
+            # Periodically re-probe: the traffic mix may have changed
+            if self._plain_since_fallback >= self.probe_interval:
+                logger.info("Re-enabling assisted decoding after fallback period")
+                self.enabled = True
+                self._samples.clear()
+                return True
+            
+            return False
+    
+    def record(
+        self,
+        assisted: bool,
+        new_tokens: int,
+        elapsed_s: float,
+        main_forwards: int = 0,
+        draft_forwards: int = 0
+    ):
+        """Record one finished generation."""
+        tokens_per_s = new_tokens / elapsed_s if elapsed_s > 0 else 0.0
+        
+        with self._lock:
+            if not assisted:
+                self.plain_generations += 1
+                self._plain_since_fallback += 1
+                self.plain_tokens_per_s = self._ema(self.plain_tokens_per_s, tokens_per_s)
+                return
+            
+            self.assisted_generations += 1
+            self.assisted_tokens_per_s = self._ema(self.assisted_tokens_per_s, tokens_per_s)
+            
+            accepted = max(new_tokens - main_forwards, 0)
+            self._samples.append((accepted, draft_forwards))
+            
+            rate = self._acceptance_rate()
+            if len(self._samples) >= self.min_samples and rate < self.min_acceptance_rate:
+                logger.warning(
+                    f"Draft acceptance rate {rate:.2f} below {self.min_acceptance_rate:.2f}, "
+                    f"falling back to normal decoding"
+                )
+                self.enabled = False
+                self.fallbacks += 1
+                self._plain_since_fallback = 0
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Return acceptance rate and speed-up over plain decoding."""
+        with self._lock:
+            speedup = None
+            if self.assisted_tokens_per_s and self.plain_tokens_per_s:
+                speedup = self.assisted_tokens_per_s / self.plain_tokens_per_s
+            
+            return {
+                'enabled': self.enabled,
+                'acceptance_rate': self._acceptance_rate(),
+                'speedup': speedup,
+                'assisted_tokens_per_s': self.assisted_tokens_per_s,
+                'plain_tokens_per_s': self.plain_tokens_per_s,
+                'assisted_generations': self.assisted_generations,
+                'plain_generations': self.plain_generations,
+                'fallbacks': self.fallbacks
+            }
+    
+    def _acceptance_rate(self) -> float:
+        proposed = sum(p for _, p in self._samples)
+        if proposed == 0:
+            return 0.0
+        return sum(a for a, _ in self._samples) / proposed
+    
+    @staticmethod
+    def _ema(current: float, value: float, alpha: float = 0.2) -> float:
+        return value if current == 0.0 else (1 - alpha) * current + alpha * value
+
+def clean_stop(stop: Optional[List[str]]) -> Optional[List[str]]:
+    """Stop sequences without empty strings (None if none are left)."""
+    stop = [s for s in stop or [] if s]
+    return stop or None
+
+def truncate_at_stop(text: str, stop: Optional[List[str]]) -> str:
+    """Cut text at the earliest occurrence of any stop sequence."""
+    if not stop:
+        return text
+    
+    positions = [text.find(s) for s in stop if s]
+    positions = [p for p in positions if p != -1]
+    return text[:min(positions)] if positions else text
+
+class StopSequenceCriteria(StoppingCriteria):
+    """Stops generation as soon as any stop string appears in the new tokens.
+    
+    Only a short tail of the sequence is decoded per step, so the check stays
+    cheap regardless of how long the answer already is. In a batch, generation
+    stops once every row has hit a stop string or finished with EOS. Rows are
+    remembered as done once they have: later steps pad them and can scroll
+    the stop string out of the tail. A criteria object serves one generate call.
+    """
+    
+    def __init__(self, tokenizer, stop: List[str], prompt_length: int, eos_token_id: Optional[int] = None):
+        self.tokenizer = tokenizer
+        self.stop = [s for s in stop if s]
+        self.prompt_length = prompt_length
+        self.eos_token_id = eos_token_id
+        self.done: Optional[torch.BoolTensor] = None
+        
+        # A stop string can straddle token boundaries: decode a few extra tokens
+        longest = max(len(tokenizer.encode(s, add_special_tokens=False)) for s in self.stop)
+        self.window = longest + 2
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> bool:
+        if self.done is None:
+            self.done = torch.zeros(len(input_ids), dtype=torch.bool)
+        for i, row in enumerate(input_ids):
+            if not self.done[i] and self._row_hit(row[self.prompt_length:]):
+                self.done[i] = True
+        return bool(self.done.all())
+    
+    def _row_hit(self, new_tokens: torch.LongTensor) -> bool:
+        if self.eos_token_id is not None and len(new_tokens) and int(new_tokens[-1]) == self.eos_token_id:
+            return True
+        tail = self.tokenizer.decode(new_tokens[-self.window:], skip_special_tokens=True)
+        return any(s in tail for s in self.stop)
+
+class DeadlineCriteria(StoppingCriteria):
+    """Stops generation when the request deadline passes or it is cancelled."""
+    
+    def __init__(self, deadline: Deadline):
+        self.deadline = deadline
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> bool:
+        if self.deadline.should_stop():
+            self.deadline.triggered = True
+            return True
+        return False
+
+class FirstTokenTimer(StoppingCriteria):
+    """Never stops generation; records when the first new token exists (end of prefill)."""
+    
+    def __init__(self):
+        self.first_token_at = None
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> bool:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        return False
+
+class _ForwardCounter:
+    """Counts forward passes of a module, per calling thread."""
+    
+    def __init__(self, module):
+        self._local = threading.local()
+        module.register_forward_hook(self._hook)
+    
+    def _hook(self, module, inputs, outputs):
+        self._local.count = self.count + 1
+    
+    @property
+    def count(self) -> int:
+        return getattr(self._local, 'count', 0)
+    
+    def reset(self):
+        self._local.count = 0
+
 class LocalLLMClient:
     """Local LLM inference client."""
     
@@ -16,7 +265,11 @@ class LocalLLMClient:
         quantize: bool = False,
         max_tokens: int = 512,
         temperature: float = 0.3,
-        top_p: float = 0.9
+        top_p: float = 0.9,
+        draft_model_name: Optional[str] = None,
+        draft_min_acceptance_rate: float = 0.4,
+        low_memory: bool = True,
+        warmup_tokens: int = 0
     ):
         self.model_name = model_name
         self.device = device
@@ -25,11 +278,13 @@ class LocalLLMClient:
         self.top_p = top_p
         
         logger.info(f"Loading model: {model_name}")
+        timer = PhaseTimer()
         
         # Load tokenizer
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        if self.tokenizer.pad_token is None:
-            self.tokenizer.pad_token = self.tokenizer.eos_token
+        with timer.phase("tokenizer"):
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
         
         # Load model
         model_kwargs = {
@@ -37,25 +292,109 @@ class LocalLLMClient:
             "torch_dtype": torch.float16 if device == "cuda" else torch.float32,
         }
         
+        if low_memory:
+            # safetensors checkpoints are memory-mapped; low_cpu_mem_usage loads them
+            # straight into an empty model instead of random init + copy, keeping
+            # peak RAM near the model size instead of double it
+            model_kwargs["low_cpu_mem_usage"] = True
+        
         if quantize and device == "cuda":
             model_kwargs["load_in_8bit"] = True
         
-        self.model = AutoModelForCausalLM.from_pretrained(
-            model_name,
-            **model_kwargs
-        )
+        with timer.phase("model"):
+            self.model = AutoModelForCausalLM.from_pretrained(
+                model_name,
+                **model_kwargs
+            )
+            self.model.eval()
+        
+        # Optional draft model for assisted (speculative) decoding
+        self.draft_model = None
+        self.assisted_monitor = None
+        if draft_model_name:
+            with timer.phase("draft_model"):
+                self._load_draft_model(draft_model_name, model_kwargs, draft_min_acceptance_rate)
         
+        # Pay for lazy initialisation (kernels, allocator, KV cache) before the first request
+        if warmup_tokens > 0:
+            with timer.phase("warmup"):
+                self.warmup(warmup_tokens)
+        
+        self.load_timings = timer.timings
         logger.info(f"Model loaded successfully. Device: {self.device}")
+        logger.info(f"LLM load timings: {timer.summary()} (total {timer.total_ms():.0f}ms)")
+    
+    def warmup(self, max_tokens: int = 4):
+        """Run a short greedy generation through the main (and draft) model."""
+        input_ids = self.tokenizer("Hello", return_tensors="pt").input_ids.to(self.device)
+        
+        generate_kwargs = {}
+        if self.draft_model is not None:
+            generate_kwargs["assistant_model"] = self.draft_model
+        
+        with torch.no_grad():
+            self.model.generate(
+                input_ids,
+                max_new_tokens=max_tokens,
+                do_sample=False,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **generate_kwargs
+            )
+    
+    def _load_draft_model(self, draft_model_name: str, model_kwargs: dict, min_acceptance_rate: float):
+        """Load a small causal LM that proposes tokens for the main model to verify."""
+        logger.info(f"Loading draft model: {draft_model_name}")
+        
+        draft_tokenizer = AutoTokenizer.from_pretrained(draft_model_name)
+        if draft_tokenizer.get_vocab() != self.tokenizer.get_vocab():
+            logger.warning(
+                f"Draft model {draft_model_name} does not share the tokenizer of "
+                f"{self.model_name}; assisted decoding disabled"
+            )
+            return
+        
+        draft_kwargs = dict(model_kwargs)
+        draft_kwargs.pop("load_in_8bit", None)
+        self.draft_model = AutoModelForCausalLM.from_pretrained(draft_model_name, **draft_kwargs)
+        self.draft_model.eval()
+        self.assisted_monitor = AssistedDecodingMonitor(min_acceptance_rate=min_acceptance_rate)
+        ASSISTED_ACCEPTANCE_RATE.set_function(lambda: self.assisted_monitor.metrics()['acceptance_rate'])
+        ASSISTED_SPEEDUP.set_function(lambda: self.assisted_monitor.metrics()['speedup'])
+        
+        self._main_forwards = _ForwardCounter(self.model)
+        self._draft_forwards = _ForwardCounter(self.draft_model)
+    
+    def decoding_metrics(self) -> Dict[str, Any]:
+        """Assisted decoding metrics (empty when no draft model is configured)."""
+        if self.assisted_monitor is None:
+            return {}
+        return self.assisted_monitor.metrics()
     
     def generate(
         self,
         system_prompt: str,
         user_message: str,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        do_sample: Optional[bool] = None,
+        stop: Optional[List[str]] = None,
+        deadline: Optional[Deadline] = None,
+        stats: Optional[GenerationStats] = None
     ) -> str:
-        """Generate response."""
+        """Generate response.
+        
+        Per-call parameters override the instance defaults. Sampling is used
+        unless do_sample is False or the temperature is 0 (greedy decoding).
+        If the deadline passes or is cancelled, decoding stops after the current
+        step, the partial answer is returned and deadline.triggered is set.
+        Token counts and the prefill/decode split are written to stats if given.
+        """
         
         max_tokens = max_tokens or self.max_tokens
+        temperature = self.temperature if temperature is None else temperature
+        top_p = self.top_p if top_p is None else top_p
+        do_sample = temperature > 0 if do_sample is None else do_sample and temperature > 0
         
         # Format message (Mistral format)
         messages = [
@@ -71,24 +410,439 @@ class LocalLLMClient:
             return_tensors="pt"
         ).to(self.device)
         
+        generate_kwargs = {}
+        if do_sample:
+            generate_kwargs["temperature"] = temperature
+            generate_kwargs["top_p"] = top_p
+        stopping_criteria = StoppingCriteriaList()
+        stop = clean_stop(stop)
+        if stop:
+            stopping_criteria.append(StopSequenceCriteria(self.tokenizer, stop, input_ids.shape[1]))
+        if deadline is not None:
+            stopping_criteria.append(DeadlineCriteria(deadline))
+        first_token_timer = None
+        if stats is not None:
+            first_token_timer = FirstTokenTimer()
+            stopping_criteria.append(first_token_timer)
+        if stopping_criteria:
+            generate_kwargs["stopping_criteria"] = stopping_criteria
+        
+        assisted = self.assisted_monitor is not None and self.assisted_monitor.use_assistant()
+        if assisted:
+            generate_kwargs["assistant_model"] = self.draft_model
+            self._main_forwards.reset()
+            self._draft_forwards.reset()
+        
         # Generate
+        start_time = time.perf_counter()
         with torch.no_grad():
             output_ids = self.model.generate(
                 input_ids,
                 max_new_tokens=max_tokens,
-                temperature=self.temperature,
-                top_p=self.top_p,
-                do_sample=True,
+                do_sample=do_sample,
                 eos_token_id=self.tokenizer.eos_token_id,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **generate_kwargs
+            )
+        end_time = time.perf_counter()
+        elapsed_s = end_time - start_time
+        
+        new_tokens = output_ids.shape[1] - input_ids.shape[1]
+        if stats is not None:
+            prefill_end = first_token_timer.first_token_at or end_time
+            stats.prompt_tokens = input_ids.shape[1]
+            stats.completion_tokens = new_tokens
+            stats.prefill_ms = (prefill_end - start_time) * 1000
+            stats.decode_ms = (end_time - prefill_end) * 1000
+        LLM_GENERATE_SECONDS.observe(elapsed_s, backend="local")
+        TOKENS_GENERATED.inc(new_tokens, backend="local")
+        if self.assisted_monitor is not None:
+            self.assisted_monitor.record(
+                assisted,
+                new_tokens,
+                elapsed_s,
+                main_forwards=self._main_forwards.count if assisted else 0,
+                draft_forwards=self._draft_forwards.count if assisted else 0
             )
         
         # Decode
         response = self.tokenizer.decode(
             output_ids[0][input_ids.shape[1]:],
             skip_special_tokens=True
-        ).strip()
+        )
         
-        return response
+        return truncate_at_stop(response, stop).strip()
+    
+    def generate_batch(
+        self,
+        prompts: List[Tuple[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        do_sample: Optional[bool] = None,
+        stop: Optional[List[str]] = None,
+        deadline: Optional[Deadline] = None
+    ) -> List[str]:
+        """Generate responses for several (system_prompt, user_message) pairs at once.
+        
+        Prompts are left-padded into one batch so every decoding step is a single
+        forward pass. Assisted decoding is not used (it only supports batch size 1).
+        """
+        if len(prompts) == 1:
+            system_prompt, user_message = prompts[0]
+            return [self.generate(
+                system_prompt, user_message, max_tokens, temperature, top_p, do_sample, stop, deadline
+            )]
+        
+        max_tokens = max_tokens or self.max_tokens
+        temperature = self.temperature if temperature is None else temperature
+        top_p = self.top_p if top_p is None else top_p
+        do_sample = temperature > 0 if do_sample is None else do_sample and temperature > 0
+        
+        # Encode and left-pad (decoder-only models continue from the right edge)
+        encoded = [
+            self.tokenizer.apply_chat_template(
+                [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                tokenize=True,
+                add_generation_prompt=True
+            )
+            for system_prompt, user_message in prompts
+        ]
+        width = max(len(ids) for ids in encoded)
+        pad_id = self.tokenizer.pad_token_id
+        input_ids = torch.tensor(
+            [[pad_id] * (width - len(ids)) + ids for ids in encoded]
+        ).to(self.device)
+        attention_mask = torch.tensor(
+            [[0] * (width - len(ids)) + [1] * len(ids) for ids in encoded]
+        ).to(self.device)
+        
+        generate_kwargs = {}
+        if do_sample:
+            generate_kwargs["temperature"] = temperature
+            generate_kwargs["top_p"] = top_p
+        
+        stopping_criteria = StoppingCriteriaList()
+        stop = clean_stop(stop)
+        if stop:
+            stopping_criteria.append(
+                StopSequenceCriteria(self.tokenizer, stop, width, self.tokenizer.eos_token_id)
+            )
+        if deadline is not None:
+            stopping_criteria.append(DeadlineCriteria(deadline))
+        if stopping_criteria:
+            generate_kwargs["stopping_criteria"] = stopping_criteria
+        
+        with torch.no_grad(), LLM_GENERATE_SECONDS.time(backend="local"):
+            output_ids = self.model.generate(
+                input_ids,
+                attention_mask=attention_mask,
+                max_new_tokens=max_tokens,
+                do_sample=do_sample,
+                eos_token_id=self.tokenizer.eos_token_id,
+                pad_token_id=pad_id,
+                **generate_kwargs
+            )
+        
+        completions = output_ids[:, width:]
+        TOKENS_GENERATED.inc(int((completions != pad_id).sum()), backend="local")
+        
+        responses = self.tokenizer.batch_decode(completions, skip_special_tokens=True)
+        return [truncate_at_stop(response, stop).strip() for response in responses]
+
+class LLMServerError(RuntimeError):
+    """Raised when the inference server fails after all retries."""
+
+class HTTPLLMClient:
+    """Client for a local OpenAI-compatible inference server (llama.cpp, vLLM).
+    
+    Requests go through one pooled keep-alive httpx.AsyncClient owned by a
+    background event loop, so sync callers on any thread share connections.
+    """
+    
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+    
+    def __init__(
+        self,
+        base_url: str = "http://127.0.0.1:8080",
+        model_name: Optional[str] = None,
+        max_tokens: int = 512,
+        temperature: float = 0.3,
+        top_p: float = 0.9,
+        timeout: float = 60.0,
+        connect_timeout: float = 2.0,
+        max_retries: int = 2,
+        retry_backoff: float = 0.25,
+        max_connections: int = 16,
+        api_key: Optional[str] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        
+        self._client_kwargs = dict(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bearer {api_key}"} if api_key else {},
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            )
+        )
+        self._start()
+        
+        logger.info(f"Using inference server at {self.base_url}")
+    
+    def _start(self):
+        self._client = httpx.AsyncClient(**self._client_kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-http", daemon=True)
+        self._thread.start()
+    
+    def after_fork(self):
+        """Re-create the event loop thread and connection pool in a forked worker.
+        
+        Threads do not survive fork() and pooled sockets must not be shared
+        between processes.
+        """
+        self._start()
+    
+    def decoding_metrics(self) -> Dict[str, Any]:
+        """Decoding happens on the server; nothing to report locally."""
+        return {}
+    
+    def _payload(
+        self,
+        system_prompt: str,
+        user_message: str,
+        stream: bool,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        do_sample: Optional[bool] = None,
+        stop: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        temperature = self.temperature if temperature is None else temperature
+        if do_sample is False:
+            temperature = 0.0  # Servers decode greedily at temperature 0
+        
+        payload = {
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_message}
+            ],
+            "max_tokens": max_tokens or self.max_tokens,
+            "temperature": temperature,
+            "top_p": self.top_p if top_p is None else top_p,
+            "stream": stream
+        }
+        if stream:
+            # Servers that support it send the token counts in a final chunk
+            payload["stream_options"] = {"include_usage": True}
+        stop = clean_stop(stop)
+        if stop:
+            payload["stop"] = stop
+        if self.model_name:
+            payload["model"] = self.model_name
+        return payload
+    
+    async def _post_with_retries(self, payload: Dict[str, Any]) -> httpx.Response:
+        """Send a request, retrying transport errors and retryable status codes.
+        
+        The response is returned unread (streaming) and must be closed by the caller.
+        """
+        last_error = None
+        
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            
+            try:
+                request = self._client.build_request("POST", "/v1/chat/completions", json=payload)
+                response = await self._client.send(request, stream=True)
+            except httpx.TransportError as e:
+                last_error = f"{type(e).__name__}: {e}"
+                logger.warning(f"Inference server request failed (attempt {attempt + 1}): {last_error}")
+                continue
+            
+            if response.status_code in self.RETRY_STATUS_CODES:
+                await response.aread()
+                await response.aclose()
+                last_error = f"HTTP {response.status_code}"
+                logger.warning(f"Inference server returned {last_error} (attempt {attempt + 1})")
+                continue
+            
+            if response.status_code >= 400:
+                body = (await response.aread()).decode("utf-8", errors="replace")
+                await response.aclose()
+                raise LLMServerError(f"Inference server returned HTTP {response.status_code}: {body}")
+            
+            return response
+        
+        raise LLMServerError(f"Inference server unavailable after {self.max_retries + 1} attempts: {last_error}")
+    
+    async def agenerate(
+        self,
+        system_prompt: str,
+        user_message: str,
+        deadline: Optional[Deadline] = None,
+        stats: Optional[GenerationStats] = None,
+        **generation_kwargs
+    ) -> str:
+        """Generate response (async).
+        
+        Accepts the same per-call parameters as LocalLLMClient.generate. With a
+        deadline the response is streamed, so a partial answer can be returned.
+        Token counts come from the server's usage block (unknown when a
+        streamed response has none, e.g. cut off by the deadline); the
+        prefill/decode split is only known when streaming.
+        """
+        if deadline is not None:
+            return await self._agenerate_until(
+                deadline, system_prompt, user_message, stats=stats, **generation_kwargs
+            )
+        
+        payload = self._payload(system_prompt, user_message, stream=False, **generation_kwargs)
+        
+        with LLM_GENERATE_SECONDS.time(backend="http"):
+            response = await self._post_with_retries(payload)
+            try:
+                data = json.loads(await response.aread())
+            finally:
+                await response.aclose()
+        
+        usage = data.get("usage", {})
+        completion_tokens = usage.get("completion_tokens")
+        if completion_tokens:
+            TOKENS_GENERATED.inc(completion_tokens, backend="http")
+        if stats is not None:
+            stats.prompt_tokens = usage.get("prompt_tokens")
+            stats.completion_tokens = completion_tokens
+        
+        content = data["choices"][0]["message"]["content"]
+        return truncate_at_stop(content, generation_kwargs.get("stop")).strip()
+    
+    async def _agenerate_until(
+        self,
+        deadline: Deadline,
+        system_prompt: str,
+        user_message: str,
+        stats: Optional[GenerationStats] = None,
+        **generation_kwargs
+    ) -> str:
+        """Accumulate streamed deltas until done, the deadline passes or cancellation."""
+        parts = []
+        usage: Dict[str, Any] = {}
+        start_time = time.perf_counter()
+        first_delta_at = None
+        deltas = self.astream(system_prompt, user_message, usage=usage, **generation_kwargs)
+        try:
+            while True:
+                if deadline.should_stop():
+                    deadline.triggered = True
+                    break
+                
+                try:
+                    parts.append(await asyncio.wait_for(deltas.__anext__(), deadline.remaining()))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    deadline.triggered = True
+                    break
+                if first_delta_at is None:
+                    first_delta_at = time.perf_counter()
+        finally:
+            await deltas.aclose()
+        
+        # Deltas are not tokens (servers may stream several per chunk): count from usage only
+        completion_tokens = usage.get("completion_tokens")
+        if completion_tokens:
+            TOKENS_GENERATED.inc(completion_tokens, backend="http")
+        if stats is not None:
+            stats.prompt_tokens = usage.get("prompt_tokens")
+            stats.completion_tokens = completion_tokens
+        if stats is not None and first_delta_at is not None:
+            end_time = time.perf_counter()
+            stats.prefill_ms = (first_delta_at - start_time) * 1000
+            stats.decode_ms = (end_time - first_delta_at) * 1000
+        
+        return truncate_at_stop("".join(parts), generation_kwargs.get("stop")).strip()
+    
+    async def astream(
+        self,
+        system_prompt: str,
+        user_message: str,
+        usage: Optional[Dict[str, Any]] = None,
+        **generation_kwargs
+    ) -> AsyncIterator[str]:
+        """Stream response text deltas (async).
+        
+        If usage is given, it is updated with the server's usage block, if any.
+        """
+        payload = self._payload(system_prompt, user_message, stream=True, **generation_kwargs)
+        
+        response = await self._post_with_retries(payload)
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                
+                event = json.loads(data)
+                if usage is not None and event.get("usage"):
+                    usage.update(event["usage"])
+                # The usage chunk has no choices
+                choices = event.get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+        finally:
+            await response.aclose()
+    
+    def generate(self, system_prompt: str, user_message: str, **generation_kwargs) -> str:
+        """Generate response."""
+        return self._run(self.agenerate(system_prompt, user_message, **generation_kwargs))
+    
+    def generate_batch(self, prompts: List[Tuple[str, str]], **generation_kwargs) -> List[str]:
+        """Generate responses concurrently; the server batches them (continuous batching)."""
+        return self._run(self._agenerate_batch(prompts, **generation_kwargs))
+    
+    async def _agenerate_batch(self, prompts: List[Tuple[str, str]], **generation_kwargs) -> List[str]:
+        return await asyncio.gather(*(
+            self.agenerate(system_prompt, user_message, **generation_kwargs)
+            for system_prompt, user_message in prompts
+        ))
+    
+    def stream(self, system_prompt: str, user_message: str, **generation_kwargs) -> Iterator[str]:
+        """Stream response text deltas."""
+        deltas = self.astream(system_prompt, user_message, **generation_kwargs)
+        try:
+            while True:
+                try:
+                    yield self._run(deltas.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._run(deltas.aclose())
+    
+    def close(self):
+        """Close pooled connections and stop the background loop."""
+        self._run(self._client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+    
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
 
 class MockLLMClient:
     """Mock LLM client for testing (doesn't require model download)."""
@@ -96,12 +850,40 @@ class MockLLMClient:
     def __init__(self, **kwargs):
         logger.info("Using MockLLMClient (for testing/demo purposes)")
     
-    def generate(self, system_prompt: str, user_message: str, max_tokens: Optional[int] = None) -> str:
-        """Return mock response."""
+    def decoding_metrics(self) -> Dict[str, Any]:
+        """Mock client has no assisted decoding."""
+        return {}
+    
+    def generate(
+        self,
+        system_prompt: str,
+        user_message: str,
+        max_tokens: Optional[int] = None,
+        stop: Optional[List[str]] = None,
+        stats: Optional[GenerationStats] = None,
+        **kwargs
+    ) -> str:
+        """Return mock response (token counts are whitespace words)."""
         # Simple mock response
         if "what" in user_message.lower():
-            return "Based on the provided documents, this question pertains to key information that is outlined in the source materials. The documents indicate that proper understanding requires careful review of the excerpts provided above."
+            response = "Based on the provided documents, this question pertains to key information that is outlined in the source materials. The documents indicate that proper understanding requires careful review of the excerpts provided above."
         elif "how" in user_message.lower():
-            return "According to the documents, the process involves several important steps and considerations as detailed in the relevant sections of the source material."
+            response = "According to the documents, the process involves several important steps and considerations as detailed in the relevant sections of the source material."
         else:
-            return "The provided documents contain relevant information on this topic. Please refer to the specific excerpts highlighted in the sources above for detailed information."
+            response = "The provided documents contain relevant information on this topic. Please refer to the specific excerpts highlighted in the sources above for detailed information."
+        
+        if max_tokens:
+            response = " ".join(response.split()[:max_tokens])
+        response = truncate_at_stop(response, stop).strip()
+        
+        if stats is not None:
+            stats.prompt_tokens = len(system_prompt.split()) + len(user_message.split())
+            stats.completion_tokens = len(response.split())
+        return response
+    
+    def generate_batch(self, prompts: List[Tuple[str, str]], **generation_kwargs) -> List[str]:
+        """Return mock responses."""
+        return [
+            self.generate(system_prompt, user_message, **generation_kwargs)
+            for system_prompt, user_message in prompts
+        ]
@@ -0,0 +1,43 @@
+"""Maximal Marginal Relevance: trade relevance to the query against redundancy among results."""
+from typing import List
+import numpy as np
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+def mmr_select(
+    query_embedding: np.ndarray,
+    candidate_embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5
+) -> List[int]:
+    """Greedily pick k candidates maximising lambda * relevance - (1 - lambda) * redundancy.
+    
+    Relevance is cosine similarity to the query, redundancy the highest cosine
+    similarity to an already picked candidate. The candidate similarity matrix
+    is computed once; each step is one vectorised update. lambda_mult=1 keeps
+    the relevance order, 0 maximises diversity. Returns candidate positions in
+    pick order.
+    """
+    candidates = _normalized(candidate_embeddings)
+    k = min(k, len(candidates))
+    if k <= 0:
+        return []
+    
+    relevance = candidates @ _normalized(query_embedding)
+    similarity = candidates @ candidates.T
+    
+    picked = [int(np.argmax(relevance))]
+    redundancy = similarity[picked[0]].copy()
+    available = np.ones(len(candidates), dtype=bool)
+    available[picked[0]] = False
+    
+    while len(picked) < k:
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    
+    return picked
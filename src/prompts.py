@@ -73,3 +73,15 @@ def create_simple_prompt(question: str, template: str = "qa") -> str:
     system_prompt = SYSTEM_PROMPTS.get(template, SYSTEM_PROMPTS["qa"])
     user_message = f"Question: {question}\n\nAnswer:"
     return system_prompt, user_message
+
+QUERY_REWRITE_PROMPT = """You rewrite search queries for a legal document search engine.
+
+INSTRUCTIONS:
+1. Rephrase the question using different legal terminology and synonyms.
+2. Keep the meaning of the question unchanged.
+3. Write one rephrasing per line, with no numbering or commentary."""
+
+def create_query_rewrite_prompt(question: str, num_variants: int = 3) -> str:
+    """Create prompt asking for alternative phrasings of a search query."""
+    user_message = f"Question: {question}\n\nWrite {num_variants} rephrasings:"
+    return QUERY_REWRITE_PROMPT, user_message
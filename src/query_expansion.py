@@ -0,0 +1,106 @@
+"""Multi-query retrieval: alternative phrasings of a question and reciprocal rank fusion of their results."""
+import re
+from typing import Any, Dict, List, Optional
+from src.prompts import create_query_rewrite_prompt
+
+# Legal terms and common equivalents (both directions where they are interchangeable)
+LEGAL_SYNONYMS: Dict[str, List[str]] = {
+    "agreement": ["contract"],
+    "contract": ["agreement"],
+    "terminate": ["cancel", "end"],
+    "termination": ["cancellation", "expiration"],
+    "landlord": ["lessor"],
+    "lessor": ["landlord"],
+    "tenant": ["lessee"],
+    "lessee": ["tenant"],
+    "employer": ["company"],
+    "employee": ["worker", "staff member"],
+    "confidential": ["proprietary", "non-public"],
+    "disclose": ["reveal", "share"],
+    "liability": ["responsibility"],
+    "liable": ["responsible"],
+    "indemnify": ["hold harmless", "compensate"],
+    "breach": ["violation", "default"],
+    "payment": ["compensation", "fee"],
+    "salary": ["compensation", "wages"],
+    "dispute": ["claim", "disagreement"],
+    "warranty": ["guarantee"],
+    "notice": ["notification"],
+    "obligation": ["duty", "requirement"],
+    "rent": ["lease payment"],
+    "privacy": ["data protection"],
+    "personal data": ["personal information"],
+    "governing law": ["jurisdiction"],
+    "jurisdiction": ["governing law"],
+}
+
+_SYNONYM_PATTERN = re.compile(
+    r'\b(' + "|".join(sorted(map(re.escape, LEGAL_SYNONYMS), key=len, reverse=True)) + r')\b',
+    re.IGNORECASE
+)
+_LIST_MARKER = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s*')
+
+def _dedupe(queries: List[str]) -> List[str]:
+    seen = set()
+    unique = []
+    for query in queries:
+        normalized = " ".join(query.casefold().split())
+        if normalized and normalized not in seen:
+            seen.add(normalized)
+            unique.append(query)
+    return unique
+
+def expand_query(query: str, max_variants: int = 3) -> List[str]:
+    """The query followed by up to max_variants rephrasings with legal synonyms.
+
+    Each variant replaces one matched term with one synonym, going through the
+    terms in query order; the first synonym of every term comes before the
+    second ones.
+    """
+    matches = list(_SYNONYM_PATTERN.finditer(query))
+    variants = [query]
+    depth = 0
+    while len(variants) <= max_variants:
+        added = False
+        for match in matches:
+            synonyms = LEGAL_SYNONYMS[match.group(1).lower()]
+            if depth < len(synonyms):
+                variants.append(query[:match.start()] + synonyms[depth] + query[match.end():])
+                added = True
+        if not added:
+            break
+        depth += 1
+    return _dedupe(variants)[:max_variants + 1]
+
+def llm_query_variants(llm_client, queries: List[str], num_variants: int = 3, max_tokens: int = 96) -> List[List[str]]:
+    """Rephrasings of each query written by the LLM, in one generate_batch call."""
+    prompts = [create_query_rewrite_prompt(query, num_variants) for query in queries]
+    outputs = llm_client.generate_batch(prompts, max_tokens=max_tokens, temperature=0.0, do_sample=False)
+    return [
+        [_LIST_MARKER.sub("", line).strip() for line in output.splitlines() if line.strip()][:num_variants]
+        for output in outputs
+    ]
+
+def reciprocal_rank_fusion(
+    rankings: List[List[Dict[str, Any]]],
+    k: Optional[int] = None,
+    rrf_k: int = 60
+) -> List[Dict[str, Any]]:
+    """Fuse rankings of chunks by reciprocal rank: score = sum of 1 / (rrf_k + rank).
+
+    Chunks are identified by chunk_id; the copy with the highest similarity
+    score is kept and gets an 'rrf_score'. Returns the best k (all if None),
+    ties in order of first appearance.
+    """
+    scores: Dict[str, float] = {}
+    best: Dict[str, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, start=1):
+            chunk_id = chunk['chunk_id']
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+            if chunk_id not in best or chunk.get('similarity_score', 0) > best[chunk_id].get('similarity_score', 0):
+                best[chunk_id] = chunk
+    
+    # sorted() is stable, and dicts keep first-appearance order
+    fused = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [{**best[chunk_id], 'rrf_score': scores[chunk_id]} for chunk_id in fused]
@@ -1,22 +1,74 @@
 """Main RAG pipeline."""
 import time
 import logging
-from typing import List, Dict, Any, Tuple
-from dataclasses import dataclass
+import threading
+from collections import defaultdict, deque
+from typing import List, Dict, Any, Tuple, Optional, Union, Callable
+from dataclasses import dataclass, field
+from src.cache import AnswerCache, SemanticCache
+from src.deadline import Deadline
 from src.embedding_manager import EmbeddingManager
-from src.prompts import create_rag_prompt
+from src.extractive import format_spans, rank_sentences_by_embedding, split_sentences
+from src.llm_client import GenerationStats
+from src.metrics import REGISTRY, timed_stage
+from src.prompts import create_rag_prompt, create_simple_prompt
+from src.query_expansion import expand_query, llm_query_variants, reciprocal_rank_fusion
+from src.safety import SafetyChecker
+from src.utils import PhaseTimer, normalize_question
 
 logger = logging.getLogger(__name__)
 
+NO_CONTEXT_ANSWER = "The provided documents do not contain information about this topic."
+
+GENERATION_PARAMS = ('temperature', 'max_tokens', 'do_sample', 'stop')
+
+ANSWER_MODES = ('auto', 'generate', 'extractive')
+
+DEGRADED_ANSWERS = REGISTRY.counter(
+    "legalrag_degraded_answers_total",
+    "Answers served extractively instead of by the LLM",
+    ["reason"]
+)
+SAFETY_CHECKS = REGISTRY.counter(
+    "legalrag_safety_checks_total",
+    "Answer safety checks run",
+    ["check", "passed"]
+)
+ANSWER_GROUNDING = REGISTRY.histogram(
+    "legalrag_answer_grounding",
+    "Lowest similarity of an answer sentence to the retrieved chunks",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+)
+
 @dataclass
 class RAGResult:
-    """Result of RAG query."""
+    """Result of RAG query.
+    
+    timings holds per-stage milliseconds (query_embedding, vector_search,
+    metadata_fetch, prompt_assembly, generation, prefill, decode) for the
+    stages that ran; token counts are None when the LLM backend does not
+    report them. cached results come from the answer cache; degraded
+    results are extractive answers served without the LLM under overload.
+    extractive results are answered by sentences picked with the embedding
+    model (answer_mode "extractive", or "auto" above the threshold).
+    safety holds the SafetyChecker results for generated RAG answers (None
+    when checks are off); deferred checks are added once they have run.
+    """
     question: str
     answer: str
     retrieved_chunks: List[Dict[str, Any]]
     sources: List[Dict[str, str]]
     latency_ms: float
     confidence_score: float = 0.0
+    truncated: bool = False
+    timings: Dict[str, float] = field(default_factory=dict)
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    tokens_per_second: Optional[float] = None
+    cached: bool = False
+    degraded: bool = False
+    extractive: bool = False
+    safety: Optional[Dict[str, Dict[str, Any]]] = None
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -25,9 +77,69 @@ class RAGResult:
             'retrieved_chunks': self.retrieved_chunks,
             'sources': self.sources,
             'latency_ms': self.latency_ms,
-            'confidence_score': self.confidence_score
+            'confidence_score': self.confidence_score,
+            'truncated': self.truncated,
+            'timings': self.timings,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'tokens_per_second': self.tokens_per_second,
+            'cached': self.cached,
+            'degraded': self.degraded,
+            'extractive': self.extractive,
+            'safety': self.safety
         }
 
+class OverloadPolicy:
+    """Decides when to shed LLM load and answer extractively instead.
+    
+    Overloaded when at least max_queue_depth requests wait for generation
+    (queue_depth is provided by the server), or when the p95 generation
+    latency over the last window seconds reaches max_latency_ms. Latency
+    samples age out, so once shedding stops generations the LLM is tried
+    again after at most window seconds.
+    """
+    
+    MAX_SAMPLES = 256
+    
+    def __init__(
+        self,
+        max_queue_depth: Optional[int] = None,
+        max_latency_ms: Optional[float] = None,
+        window: float = 30.0
+    ):
+        self.max_queue_depth = max_queue_depth
+        self.max_latency_ms = max_latency_ms
+        self.window = window
+        self.queue_depth: Optional[Callable[[], int]] = None
+        self._samples: "deque[Tuple[float, float]]" = deque(maxlen=self.MAX_SAMPLES)
+        self._lock = threading.Lock()
+    
+    def observe_generation(self, latency_ms: float):
+        with self._lock:
+            self._samples.append((time.monotonic(), latency_ms))
+    
+    def p95_latency_ms(self) -> Optional[float]:
+        """p95 generation latency within the window (None without samples)."""
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            latencies = sorted(latency for _, latency in self._samples)
+        if not latencies:
+            return None
+        return latencies[min(int(0.95 * len(latencies)), len(latencies) - 1)]
+    
+    def reason(self) -> Optional[str]:
+        """Why the LLM should be skipped right now ("queue_depth" or "latency"), or None."""
+        if self.max_queue_depth is not None and self.queue_depth is not None:
+            if self.queue_depth() >= self.max_queue_depth:
+                return "queue_depth"
+        if self.max_latency_ms is not None:
+            p95 = self.p95_latency_ms()
+            if p95 is not None and p95 >= self.max_latency_ms:
+                return "latency"
+        return None
+
 class RAGPipeline:
     """Orchestrates RAG: retrieval + generation."""
     
@@ -36,76 +148,529 @@ class RAGPipeline:
         embedding_manager: EmbeddingManager,
         llm_client,
         retriever_config: Dict[str, Any],
-        prompt_template: str = "legal"
+        prompt_template: str = "legal",
+        cache: Optional[AnswerCache] = None,
+        semantic_cache: Optional[SemanticCache] = None,
+        overload_policy: Optional[OverloadPolicy] = None,
+        extractive_sentences: int = 3,
+        extractive_threshold: Optional[float] = None,
+        extractive_max_candidates: int = 200,
+        safety_checks: bool = False,
+        defer_safety_checks: bool = True,
+        check_hallucination: bool = False,
+        grounding_threshold: float = 0.35,
+        reranker=None,
+        rerank_candidates: int = 20,
+        multi_query_variants: int = 0,
+        multi_query_llm: bool = False,
+        rrf_k: int = 60,
+        llm_batch_size: int = 8
     ):
         self.embedding_manager = embedding_manager
         self.llm_client = llm_client
         self.retriever_config = retriever_config
         self.prompt_template = prompt_template
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.overload_policy = overload_policy
+        self.extractive_sentences = extractive_sentences
+        self.extractive_threshold = extractive_threshold
+        self.extractive_max_candidates = extractive_max_candidates
+        self.safety_checks = safety_checks
+        self.defer_safety_checks = defer_safety_checks
+        self.check_hallucination = check_hallucination
+        self.grounding_threshold = grounding_threshold
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self.multi_query_variants = multi_query_variants
+        self.multi_query_llm = multi_query_llm
+        self.rrf_k = rrf_k
+        self.llm_batch_size = llm_batch_size
+    
+    def degrade_reason(self) -> Optional[str]:
+        """Why answers should currently be extractive (see OverloadPolicy), or None."""
+        return self.overload_policy.reason() if self.overload_policy is not None else None
+    
+    def _index_version(self) -> Optional[str]:
+        return getattr(self.embedding_manager.index, 'version', None)
+    
+    def _params_key(
+        self,
+        top_k: Optional[int],
+        use_rag: bool,
+        generation_params: Dict[str, Any],
+        answer_mode: str = "auto"
+    ) -> str:
+        """Everything besides the question that determines an answer."""
+        return AnswerCache.make_key(
+            top_k=top_k or self.retriever_config.get('top_k', 3),
+            use_rag=use_rag,
+            answer_mode=answer_mode,
+            extractive_threshold=self.extractive_threshold,
+            mmr_lambda=self.retriever_config.get('mmr_lambda'),
+            reranker=getattr(self.reranker, 'model_name', None),
+            multi_query=(self.multi_query_variants, self.multi_query_llm),
+            prompt_template=self.prompt_template,
+            model=getattr(self.llm_client, 'model_name', None) or type(self.llm_client).__name__,
+            embedding_model=getattr(self.embedding_manager.embedding_generator, 'model_name', None),
+            generation={key: value for key, value in generation_params.items() if value is not None}
+        )
+    
+    def _cache_key(
+        self,
+        question: str,
+        top_k: Optional[int],
+        use_rag: bool,
+        generation_params: Dict[str, Any],
+        answer_mode: str = "auto"
+    ) -> str:
+        return AnswerCache.make_key(
+            question=normalize_question(question),
+            params=self._params_key(top_k, use_rag, generation_params, answer_mode),
+            index_version=self._index_version()
+        )
+    
+    def cached_result(
+        self,
+        question: str,
+        top_k: Optional[int] = None,
+        use_rag: bool = True,
+        answer_mode: str = "auto",
+        **generation_params
+    ) -> Optional[RAGResult]:
+        """Return the cached answer for this request, or None.
+        
+        generation_params are the query() generation parameters (temperature,
+        max_tokens, do_sample, stop).
+        """
+        if self.cache is None:
+            return None
+        
+        start_time = time.perf_counter()
+        value = self.cache.get(self._cache_key(question, top_k, use_rag, generation_params, answer_mode))
+        if value is None:
+            return None
+        
+        result = RAGResult(**value)
+        result.question = question
+        result.cached = True
+        result.latency_ms = (time.perf_counter() - start_time) * 1000
+        result.timings = {'cache_lookup': result.latency_ms}
+        return result
+    
+    def _diversity_params(self) -> Dict[str, Any]:
+        """MMR search arguments from the retriever config ('mmr_lambda', 'mmr_fetch_k'), if enabled."""
+        if self.retriever_config.get('mmr_lambda') is None:
+            return {}
+        return {
+            'mmr_lambda': self.retriever_config['mmr_lambda'],
+            'fetch_k': self.retriever_config.get('mmr_fetch_k', 20)
+        }
+    
+    def query_variants(self, queries: List[str], llm_rewrites: bool = True) -> List[List[str]]:
+        """Each query followed by its rephrasings (legal synonyms, plus the LLM's if enabled and allowed)."""
+        variants = [expand_query(query, self.multi_query_variants) for query in queries]
+        if self.multi_query_llm and llm_rewrites:
+            rewrites = llm_query_variants(self.llm_client, queries, self.multi_query_variants)
+            variants = [
+                list(dict.fromkeys(expanded[:1] + rewritten + expanded[1:]))[:self.multi_query_variants + 1]
+                for expanded, rewritten in zip(variants, rewrites)
+            ]
+        return variants
     
-    def retrieve(self, query: str, top_k: int = None) -> List[Dict[str, Any]]:
-        """Retrieve relevant chunks."""
+    def _multi_query_search(
+        self,
+        queries: List[str],
+        k: int,
+        timer: Optional[PhaseTimer] = None,
+        llm_rewrites: bool = True
+    ) -> List[List[Dict[str, Any]]]:
+        """Search all variants of all queries at once and fuse each query's rankings (RRF).
+        
+        MMR, if enabled, picks the k results from each fused ranking of
+        fetch_k candidates.
+        """
+        with timed_stage("query_expansion", timer):
+            variants = self.query_variants(queries, llm_rewrites)
+        
+        diversity = self._diversity_params()
+        fetch_k = max(k, diversity['fetch_k']) if diversity else k
+        
+        # One encode call and one FAISS search for every variant
+        rankings = self.embedding_manager.search_batch(
+            [variant for query_variants in variants for variant in query_variants],
+            k=fetch_k,
+            timer=timer
+        )
+        
+        fused = []
+        with timed_stage("fusion", timer):
+            position = 0
+            for query_variants in variants:
+                fused.append(reciprocal_rank_fusion(
+                    rankings[position:position + len(query_variants)], fetch_k, self.rrf_k
+                ))
+                position += len(query_variants)
+        
+        if diversity:
+            with timed_stage("diversify", timer):
+                query_embeddings = self.embedding_manager.encode_queries(queries)
+                fused = [
+                    self.embedding_manager.diversify(query_embedding, chunks, k, diversity['mmr_lambda'])
+                    for query_embedding, chunks in zip(query_embeddings, fused)
+                ]
+        return fused
+    
+    def retrieve(
+        self,
+        query: str,
+        top_k: int = None,
+        timer: Optional[PhaseTimer] = None,
+        llm_rewrites: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Retrieve relevant chunks; stage timings go to timer if given.
+        
+        With multi_query_variants, rephrasings of the query are searched
+        together and their rankings fused by reciprocal rank; llm_rewrites=False
+        leaves out the LLM's rephrasings (for answers that must not call the
+        LLM). With a reranker, rerank_candidates chunks are fetched and the
+        reranker keeps the best top_k.
+        """
         if top_k is None:
             top_k = self.retriever_config.get('top_k', 3)
         
-        results = self.embedding_manager.search(query, k=top_k)
-        return results
+        k = max(top_k, self.rerank_candidates) if self.reranker is not None else top_k
+        if self.multi_query_variants:
+            candidates = self._multi_query_search([query], k, timer, llm_rewrites)[0]
+        else:
+            candidates = self.embedding_manager.search(query, k=k, timer=timer, **self._diversity_params())
+        
+        if self.reranker is None:
+            return candidates
+        return self.reranker.rerank(query, candidates, top_k, timer=timer)
+    
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        top_ks: List[Optional[int]],
+        timer: Optional[PhaseTimer] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Retrieve chunks for several queries with one encode call and one FAISS search."""
+        default_top_k = self.retriever_config.get('top_k', 3)
+        top_ks = [top_k or default_top_k for top_k in top_ks]
+        
+        k = max(top_ks)
+        if self.reranker is not None:
+            k = max(k, self.rerank_candidates)
+        
+        if self.multi_query_variants:
+            results = self._multi_query_search(queries, k, timer)
+        else:
+            results = self.embedding_manager.search_batch(queries, k=k, timer=timer, **self._diversity_params())
+        
+        if self.reranker is None:
+            return [chunks[:top_k] for chunks, top_k in zip(results, top_ks)]
+        return self.reranker.rerank_batch(queries, results, top_ks, timer=timer)
     
     def generate(
         self,
         question: str,
-        retrieved_chunks: List[Dict[str, Any]]
+        retrieved_chunks: List[Dict[str, Any]],
+        timer: Optional[PhaseTimer] = None,
+        **generation_kwargs
     ) -> Tuple[str, float]:
-        """Generate answer based on retrieved context."""
+        """Generate answer based on retrieved context.
+        
+        generation_kwargs (temperature, max_tokens, do_sample, stop, stats) are
+        passed through to the LLM client.
+        """
         
         if not retrieved_chunks:
-            return "The provided documents do not contain information about this topic.", 0.0
+            return NO_CONTEXT_ANSWER, 0.0
         
         # Create prompt
-        system_prompt, user_message = create_rag_prompt(
-            question,
-            retrieved_chunks,
-            self.prompt_template
-        )
+        with timed_stage("prompt_assembly", timer):
+            system_prompt, user_message = create_rag_prompt(
+                question,
+                retrieved_chunks,
+                self.prompt_template
+            )
         
         # Generate response
-        answer = self.llm_client.generate(system_prompt, user_message)
+        generation_start = time.perf_counter()
+        with timed_stage("generation", timer):
+            answer = self.llm_client.generate(system_prompt, user_message, **generation_kwargs)
+        if self.overload_policy is not None:
+            self.overload_policy.observe_generation((time.perf_counter() - generation_start) * 1000)
         
-        # Estimate confidence (simple heuristic)
-        avg_similarity = sum(c.get('similarity_score', 0) for c in retrieved_chunks) / len(retrieved_chunks)
-        confidence = float(avg_similarity)
+        return answer, self._estimate_confidence(retrieved_chunks)
+    
+    def extract_spans(
+        self,
+        question: str,
+        retrieved_chunks: List[Dict[str, Any]],
+        timer: Optional[PhaseTimer] = None
+    ) -> List[Tuple[float, str, Dict[str, Any]]]:
+        """Sentences of the chunks ranked by embedding similarity to the question.
+        
+        The question embedding normally comes from the retrieval cache; the
+        sentences are embedded in one batched encode call.
+        """
+        generator = self.embedding_manager.embedding_generator
+        with timed_stage("extractive", timer):
+            question_embedding = self.embedding_manager.encode_queries([question])[0]
+            return rank_sentences_by_embedding(
+                question_embedding,
+                retrieved_chunks,
+                lambda texts: generator.encode(texts, show_progress_bar=False),
+                self.extractive_max_candidates
+            )
+    
+    def check_safety(
+        self,
+        question: str,
+        answer: str,
+        retrieved_chunks: List[Dict[str, Any]],
+        only: Optional[Tuple[str, ...]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Run SafetyChecker checks (all, or those in only), logging failures and counting outcomes.
         
-        return answer, confidence
+        embedding_grounding runs only when check_hallucination is on.
+        """
+        checks = SafetyChecker.validate_response(answer, retrieved_chunks, question, only=only)
+        if self.check_hallucination and (only is None or 'embedding_grounding' in only):
+            checks['embedding_grounding'] = self.check_grounding(answer, retrieved_chunks)
+        for name, check in checks.items():
+            SAFETY_CHECKS.inc(check=name, passed=str(check['passed']).lower())
+            if not check['passed']:
+                logger.warning(f"Safety check {name} failed for '{question[:50]}': {check['message']}")
+        return checks
     
-    def query(self, question: str, top_k: int = None, use_rag: bool = True) -> RAGResult:
-        """Execute full RAG pipeline."""
-        start_time = time.time()
+    def check_grounding(self, answer: str, retrieved_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Compare answer sentences with the retrieved chunks in embedding space.
         
+        The sentences are embedded in one encode call; the chunks' vectors are
+        reconstructed from the index. Sentences whose best chunk similarity is
+        below grounding_threshold are reported as unsupported.
+        """
+        # Fragments such as a trailing "[Source]" carry no claim
+        sentences = [sentence for sentence in split_sentences(answer) if len(sentence.split()) >= 3]
+        if not sentences or not retrieved_chunks:
+            return {'passed': True, 'message': "Nothing to compare", 'support': None, 'unsupported': []}
+        
+        sentence_embeddings = self.embedding_manager.embedding_generator.encode(sentences, show_progress_bar=False)
+        chunk_embeddings = self.embedding_manager.chunk_embeddings(retrieved_chunks)
+        passed, message, support = SafetyChecker.check_embedding_grounding(
+            sentence_embeddings, chunk_embeddings, self.grounding_threshold
+        )
+        ANSWER_GROUNDING.observe(float(support.min()))
+        
+        return {
+            'passed': passed,
+            'message': message,
+            'support': round(float(support.min()), 4),
+            'unsupported': [sentence for sentence, score in zip(sentences, support) if score < self.grounding_threshold]
+        }
+    
+    def run_deferred_safety_checks(self, result: RAGResult):
+        """Run the checks query() left for later (SafetyChecker.DEFERRED_CHECKS).
+        
+        Meant to run after the response has been sent; the outcomes are
+        logged, counted in metrics and merged into result.safety.
+        """
+        if not self.defer_safety_checks or result.safety is None or result.cached:
+            return
+        with timed_stage("safety_checks_deferred"):
+            checks = self.check_safety(
+                result.question,
+                result.answer,
+                result.retrieved_chunks,
+                only=SafetyChecker.DEFERRED_CHECKS
+            )
+        # A new dict: the cached copy of the result may share the old one
+        result.safety = {**result.safety, **checks}
+    
+    @staticmethod
+    def _estimate_confidence(retrieved_chunks: List[Dict[str, Any]]) -> float:
+        """Estimate confidence (simple heuristic)."""
+        avg_similarity = sum(c.get('similarity_score', 0) for c in retrieved_chunks) / len(retrieved_chunks)
+        return float(avg_similarity)
+    
+    @staticmethod
+    def _extract_sources(retrieved_chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            {
+                'document': chunk['source_title'],
+                'chunk_id': chunk['chunk_id'],
+                'similarity': chunk.get('similarity_score', 0.0)
+            }
+            for chunk in retrieved_chunks
+        ]
+    
+    def query(
+        self,
+        question: str,
+        top_k: int = None,
+        use_rag: bool = True,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        do_sample: Optional[bool] = None,
+        stop: Optional[List[str]] = None,
+        deadline: Optional[Deadline] = None,
+        retrieved_chunks: Optional[List[Dict[str, Any]]] = None,
+        timer: Optional[PhaseTimer] = None,
+        use_cache: bool = True,
+        check_answer_cache: bool = True,
+        allow_degraded: bool = True,
+        degrade_reason: Optional[str] = None,
+        answer_mode: str = "auto"
+    ) -> RAGResult:
+        """Execute full RAG pipeline.
+        
+        Generation parameters left as None fall back to the LLM client defaults.
+        With a deadline, generation stops early once it passes (or the request
+        is cancelled) and the partial answer is flagged as truncated.
+        Pass retrieved_chunks to skip retrieval (e.g. when it ran on another
+        executor) together with the timer that retrieval recorded into, so the
+        result's stage breakdown stays complete. The answer cache is consulted
+        first unless retrieved_chunks is given or check_answer_cache=False
+        (the caller is expected to have checked cached_result() already).
+        After retrieval, the semantic cache can answer paraphrases of earlier
+        questions that retrieved compatible chunks. use_cache=False skips both
+        lookups; complete answers are stored either way.
+        Under overload (see OverloadPolicy), or when the caller passes
+        degrade_reason, RAG questions get an extractive answer without calling
+        the LLM, flagged as degraded and not cached; allow_degraded=False
+        always generates.
+        answer_mode "extractive" answers with the sentences most similar to
+        the question instead of generating; "auto" does so only when the best
+        sentence reaches extractive_threshold (unset = always generate);
+        "generate" always uses the LLM.
+        With safety checks on, generated RAG answers are checked by
+        SafetyChecker; when they are deferred, only the critical checks run
+        here and the caller runs the rest with run_deferred_safety_checks().
+        """
+        if answer_mode not in ANSWER_MODES:
+            raise ValueError(f"Unknown answer mode: {answer_mode}")
+        
+        start_time = time.perf_counter()
+        timer = timer if timer is not None else PhaseTimer()
+        stats = GenerationStats()
+        # Stages already recorded (retrieval run elsewhere) count towards latency
+        prior_ms = timer.total_ms()
+        
+        generation_params = {
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'do_sample': do_sample,
+            'stop': stop
+        }
+        
+        if use_cache and check_answer_cache and retrieved_chunks is None:
+            cached = self.cached_result(question, top_k, use_rag, answer_mode, **generation_params)
+            if cached is not None:
+                return cached
+        
+        generation_kwargs = {
+            key: value for key, value in {
+                **generation_params,
+                'deadline': deadline,
+                'stats': stats
+            }.items()
+            if value is not None
+        }
+        
+        semantic_key = None
+        spans = []
+        safety = None
         if use_rag:
-            # Retrieve
-            retrieved_chunks = self.retrieve(question, top_k)
+            reason = (degrade_reason or self.degrade_reason()) if allow_degraded else None
+            
+            # Retrieve (without LLM query rewrites when the answer will not use the LLM)
+            if retrieved_chunks is None:
+                retrieved_chunks = self.retrieve(
+                    question,
+                    top_k,
+                    timer=timer,
+                    llm_rewrites=reason is None and answer_mode != "extractive"
+                )
+            
+            if self.semantic_cache is not None and retrieved_chunks:
+                semantic_key = (
+                    self.embedding_manager.encode_queries([question])[0],
+                    self._params_key(top_k, use_rag, generation_params, answer_mode),
+                    [chunk['chunk_id'] for chunk in retrieved_chunks],
+                    self._index_version()
+                )
+                if use_cache:
+                    with timed_stage("semantic_cache", timer):
+                        hit = self.semantic_cache.lookup(*semantic_key)
+                    if hit is not None:
+                        return RAGResult(
+                            question=question,
+                            answer=hit['answer'],
+                            retrieved_chunks=retrieved_chunks,
+                            sources=self._extract_sources(retrieved_chunks),
+                            latency_ms=prior_ms + (time.perf_counter() - start_time) * 1000,
+                            confidence_score=self._estimate_confidence(retrieved_chunks),
+                            timings=dict(timer.timings),
+                            completion_tokens=hit['completion_tokens'],
+                            cached=True,
+                            extractive=hit.get('extractive', False)
+                        )
             
-            # Generate
-            answer, confidence = self.generate(question, retrieved_chunks)
+            if reason is not None and retrieved_chunks:
+                return self._extractive_result(question, retrieved_chunks, timer, prior_ms, start_time, reason)
+            
+            if retrieved_chunks and (
+                answer_mode == "extractive"
+                or (answer_mode == "auto" and self.extractive_threshold is not None)
+            ):
+                spans = self.extract_spans(question, retrieved_chunks, timer)
+                if answer_mode == "auto":
+                    spans = [span for span in spans if span[0] >= self.extractive_threshold]
+            
+            if spans:
+                # Answered by the documents' own sentences, no LLM call
+                spans = spans[:self.extractive_sentences]
+                answer = format_spans([(sentence, chunk) for _, sentence, chunk in spans])
+                confidence = spans[0][0]
+            else:
+                if deadline is not None:
+                    deadline.check("generation")
+                
+                # Generate
+                answer, confidence = self.generate(question, retrieved_chunks, timer=timer, **generation_kwargs)
+                
+                if self.safety_checks and retrieved_chunks:
+                    with timed_stage("safety_checks", timer):
+                        safety = self.check_safety(
+                            question,
+                            answer,
+                            retrieved_chunks,
+                            only=SafetyChecker.CRITICAL_CHECKS if self.defer_safety_checks else None
+                        )
             
             # Extract sources
-            sources = []
-            for chunk in retrieved_chunks:
-                sources.append({
-                    'document': chunk['source_title'],
-                    'chunk_id': chunk['chunk_id'],
-                    'similarity': chunk.get('similarity_score', 0.0)
-                })
+            sources = self._extract_sources(retrieved_chunks)
         else:
             # Zero-shot: generate without retrieval
-            from src.prompts import create_simple_prompt
-            system_prompt, user_message = create_simple_prompt(question, self.prompt_template)
-            answer = self.llm_client.generate(system_prompt, user_message)
+            with timed_stage("prompt_assembly", timer):
+                system_prompt, user_message = create_simple_prompt(question, self.prompt_template)
+            if deadline is not None:
+                deadline.check("generation")
+            with timed_stage("generation", timer):
+                answer = self.llm_client.generate(system_prompt, user_message, **generation_kwargs)
             retrieved_chunks = []
             sources = []
             confidence = 0.0
         
-        latency_ms = (time.time() - start_time) * 1000
+        latency_ms = prior_ms + (time.perf_counter() - start_time) * 1000
+        
+        # Prefill/decode split as measured by the LLM client
+        if stats.prefill_ms is not None:
+            timer.add("prefill", stats.prefill_ms)
+            timer.add("decode", stats.decode_ms)
         
         result = RAGResult(
             question=question,
@@ -113,7 +678,197 @@ class RAGPipeline:
             retrieved_chunks=retrieved_chunks,
             sources=sources,
             latency_ms=latency_ms,
-            confidence_score=confidence
+            confidence_score=confidence,
+            truncated=deadline is not None and deadline.triggered,
+            timings=dict(timer.timings),
+            prompt_tokens=stats.prompt_tokens,
+            completion_tokens=stats.completion_tokens,
+            tokens_per_second=stats.tokens_per_second(),
+            extractive=bool(spans),
+            safety=safety
         )
         
+        if not result.truncated:
+            if self.cache is not None:
+                self.cache.set(
+                    self._cache_key(question, top_k, use_rag, generation_params, answer_mode),
+                    result.to_dict()
+                )
+            if semantic_key is not None:
+                self.semantic_cache.add(
+                    *semantic_key,
+                    {'answer': answer, 'completion_tokens': stats.completion_tokens, 'extractive': result.extractive}
+                )
+        
         return result
+    
+    def _extractive_result(
+        self,
+        question: str,
+        retrieved_chunks: List[Dict[str, Any]],
+        timer: PhaseTimer,
+        prior_ms: float,
+        start_time: float,
+        reason: str
+    ) -> RAGResult:
+        # Same ranking as answer_mode "extractive": sentence embeddings only, no LLM
+        spans = self.extract_spans(question, retrieved_chunks, timer)[:self.extractive_sentences]
+        answer = format_spans([(sentence, chunk) for _, sentence, chunk in spans])
+        DEGRADED_ANSWERS.inc(reason=reason)
+        logger.info(f"Serving extractive answer ({reason})")
+        
+        return RAGResult(
+            question=question,
+            answer=answer,
+            retrieved_chunks=retrieved_chunks,
+            sources=self._extract_sources(retrieved_chunks),
+            latency_ms=prior_ms + (time.perf_counter() - start_time) * 1000,
+            confidence_score=self._estimate_confidence(retrieved_chunks),
+            timings=dict(timer.timings),
+            degraded=True
+        )
+    
+    def query_batch(
+        self,
+        queries: List[Dict[str, Any]],
+        deadline: Optional[Deadline] = None,
+        retrieved_chunks: Optional[List[List[Dict[str, Any]]]] = None
+    ) -> List[Union[RAGResult, Exception]]:
+        """Execute RAG for many questions at once.
+        
+        Each query is a dict with 'question' and optional 'top_k', 'use_rag',
+        'answer_mode' and generation parameters (see query); answer modes
+        pick extractive answers as in query(). The batch never degrades and
+        never reads the answer caches, which allow_degraded and use_cache
+        only permit. All RAG questions are embedded in one
+        encode call and searched in one FAISS call; generations sharing the same
+        parameters go to the LLM together, llm_batch_size prompts per call (the
+        KV cache grows with the batch). Results come back in input order; an
+        item that failed holds its exception instead of a RAGResult. Stage
+        timings are those of the whole batch; per-item token counts are not
+        tracked. Safety checks, when on, all run here: batches are not latency
+        sensitive.
+        """
+        start_time = time.perf_counter()
+        timer = PhaseTimer()
+        results: List[Union[RAGResult, Exception, None]] = [None] * len(queries)
+        
+        # Retrieve
+        rag_items = [i for i, q in enumerate(queries) if q.get('use_rag', True)]
+        if retrieved_chunks is None:
+            retrieved_chunks = [[] for _ in queries]
+            if rag_items:
+                batch_chunks = self.retrieve_batch(
+                    [queries[i]['question'] for i in rag_items],
+                    [queries[i].get('top_k') for i in rag_items],
+                    timer=timer
+                )
+                for i, chunks in zip(rag_items, batch_chunks):
+                    retrieved_chunks[i] = chunks
+        
+        if deadline is not None:
+            deadline.check("generation")
+        
+        # Extractive answers (answer modes as in query), no LLM
+        answers = {}
+        extractive = {}  # item -> confidence of its best sentence
+        for i, q in enumerate(queries):
+            answer_mode = q.get('answer_mode') or "auto"
+            if answer_mode not in ANSWER_MODES:
+                results[i] = ValueError(f"Unknown answer mode: {answer_mode}")
+                continue
+            if not (q.get('use_rag', True) and retrieved_chunks[i]) or answer_mode == "generate":
+                continue
+            if answer_mode == "auto" and self.extractive_threshold is None:
+                continue
+            spans = self.extract_spans(q['question'], retrieved_chunks[i], timer)
+            if answer_mode == "auto":
+                spans = [span for span in spans if span[0] >= self.extractive_threshold]
+            if spans:
+                spans = spans[:self.extractive_sentences]
+                answers[i] = format_spans([(sentence, chunk) for _, sentence, chunk in spans])
+                extractive[i] = spans[0][0]
+        
+        # Build prompts for the rest, grouped by generation parameters
+        groups = defaultdict(list)
+        with timed_stage("prompt_assembly", timer):
+            for i, q in enumerate(queries):
+                if i in answers or results[i] is not None:
+                    continue
+                if q.get('use_rag', True):
+                    if not retrieved_chunks[i]:
+                        answers[i] = NO_CONTEXT_ANSWER
+                        continue
+                    prompt = create_rag_prompt(q['question'], retrieved_chunks[i], self.prompt_template)
+                else:
+                    prompt = create_simple_prompt(q['question'], self.prompt_template)
+                
+                params = tuple(
+                    (key, tuple(q[key]) if key == 'stop' else q[key])
+                    for key in GENERATION_PARAMS
+                    if q.get(key) is not None
+                )
+                groups[params].append((i, prompt))
+        
+        # Generate
+        batches = [
+            (params, group[start:start + self.llm_batch_size])
+            for params, group in groups.items()
+            for start in range(0, len(group), self.llm_batch_size)
+        ]
+        for params, items in batches:
+            generation_kwargs = {key: list(value) if key == 'stop' else value for key, value in params}
+            if deadline is not None:
+                generation_kwargs['deadline'] = deadline
+            
+            try:
+                with timed_stage("generation", timer):
+                    batch_answers = self.llm_client.generate_batch(
+                        [prompt for _, prompt in items],
+                        **generation_kwargs
+                    )
+                answers.update((i, answer) for (i, _), answer in zip(items, batch_answers))
+            except Exception as e:
+                # Isolate the failing item(s) by retrying one by one
+                logger.warning(f"Batched generation failed ({e}), retrying items individually")
+                for i, (system_prompt, user_message) in items:
+                    try:
+                        answers[i] = self.llm_client.generate(system_prompt, user_message, **generation_kwargs)
+                    except Exception as item_error:
+                        results[i] = item_error
+        
+        safety = {}
+        if self.safety_checks:
+            with timed_stage("safety_checks", timer):
+                for i, q in enumerate(queries):
+                    if i in extractive or results[i] is not None:
+                        continue
+                    if retrieved_chunks[i] and q.get('use_rag', True):
+                        safety[i] = self.check_safety(q['question'], answers[i], retrieved_chunks[i])
+        
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        truncated = deadline is not None and deadline.triggered
+        
+        for i, q in enumerate(queries):
+            if results[i] is not None:
+                continue
+            
+            chunks = retrieved_chunks[i]
+            if i in extractive:
+                confidence = extractive[i]
+            else:
+                confidence = self._estimate_confidence(chunks) if chunks else 0.0
+            results[i] = RAGResult(
+                question=q['question'],
+                answer=answers[i],
+                retrieved_chunks=chunks,
+                sources=self._extract_sources(chunks),
+                latency_ms=latency_ms,
+                confidence_score=confidence,
+                truncated=truncated,
+                timings=dict(timer.timings),
+                extractive=i in extractive,
+                safety=safety.get(i)
+            )
+        
+        return results
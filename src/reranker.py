@@ -0,0 +1,114 @@
+"""Cross-encoder reranking of retrieved chunks."""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from sentence_transformers import CrossEncoder
+from src.metrics import REGISTRY, timed_stage
+from src.utils import PhaseTimer
+
+logger = logging.getLogger(__name__)
+
+RERANK_PAIRS = REGISTRY.counter(
+    "legalrag_rerank_pairs_total",
+    "(query, chunk) pairs scored for reranking",
+    ["cached"]
+)
+
+class CrossEncoderReranker:
+    """Reorders retrieved chunks by a cross-encoder's (query, chunk) relevance score.
+
+    Pairs not in the score cache are scored in one predict call (also across
+    the queries of rerank_batch), padded in forward passes of at most
+    batch_size pairs so large batches stay within memory. Scores are kept in
+    an LRU keyed by query and chunk content, so repeated and overlapping
+    questions only score new pairs. model_name is a model directory (or a
+    model already in the sentence-transformers cache).
+    """
+    
+    def __init__(
+        self,
+        model_name: str,
+        device: str = "cpu",
+        max_length: int = 512,
+        cache_size: int = 4096,
+        batch_size: int = 32,
+        warmup: bool = False
+    ):
+        logger.info(f"Loading reranker model: {model_name}")
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, device=device, max_length=max_length)
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        if warmup:
+            self.model.predict([("warm-up", "warm-up")], show_progress_bar=False)
+    
+    def score(self, query: str, chunks: List[Dict[str, Any]]) -> np.ndarray:
+        """Relevance score of each chunk for query (higher is better)."""
+        return self._score_pairs([(query, chunk.get('content', '')) for chunk in chunks])
+    
+    def _score_pairs(self, keys: List[Tuple[str, str]]) -> np.ndarray:
+        with self._lock:
+            scores = {key: self._scores.get(key) for key in keys}
+            for key, score in scores.items():
+                if score is not None:
+                    self._scores.move_to_end(key)
+        missing = [key for key, score in scores.items() if score is None]
+        RERANK_PAIRS.inc(len(keys) - len(missing), cached="true")
+        
+        if missing:
+            RERANK_PAIRS.inc(len(missing), cached="false")
+            predicted = self.model.predict(
+                missing, batch_size=min(len(missing), self.batch_size), show_progress_bar=False
+            )
+            with self._lock:
+                for key, score in zip(missing, predicted):
+                    scores[key] = float(score)
+                    self._scores[key] = float(score)
+                while len(self._scores) > self.cache_size:
+                    self._scores.popitem(last=False)
+        
+        return np.array([scores[key] for key in keys], dtype=np.float32)
+    
+    def rerank(
+        self,
+        query: str,
+        chunks: List[Dict[str, Any]],
+        k: int,
+        timer: Optional[PhaseTimer] = None
+    ) -> List[Dict[str, Any]]:
+        """The k best chunks by cross-encoder score, each with its 'rerank_score'."""
+        return self.rerank_batch([query], [chunks], [k], timer=timer)[0]
+    
+    def rerank_batch(
+        self,
+        queries: List[str],
+        chunk_lists: List[List[Dict[str, Any]]],
+        ks: List[int],
+        timer: Optional[PhaseTimer] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """rerank() for several queries, scoring all their uncached pairs in one predict call."""
+        keys = [
+            (query, chunk.get('content', ''))
+            for query, chunks in zip(queries, chunk_lists)
+            for chunk in chunks
+        ]
+        if not keys:
+            return [[] for _ in queries]
+        
+        with timed_stage("rerank", timer):
+            scores = self._score_pairs(keys)
+            
+            reranked = []
+            offset = 0
+            for chunks, k in zip(chunk_lists, ks):
+                chunk_scores = scores[offset:offset + len(chunks)]
+                offset += len(chunks)
+                # Stable sort keeps retrieval order among equal scores
+                order = np.argsort(-chunk_scores, kind="stable")[:k]
+                reranked.append([{**chunks[i], 'rerank_score': float(chunk_scores[i])} for i in order])
+            return reranked
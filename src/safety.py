@@ -1,7 +1,8 @@
 """Safety checks and hallucination prevention."""
 import re
 import logging
-from typing import Tuple, List
+from typing import Iterable, Tuple, List, Optional
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +22,14 @@ class SafetyChecker:
         "documents do not contain"
     ]
     
+    # One alternation, matched in a single pass by the C regex engine
+    _REFUSAL_PATTERN = re.compile("|".join(map(re.escape, REFUSAL_PHRASES)))
+    
+    # Checks cheap and important enough to run before the response is sent;
+    # the rest may run afterwards (see RAGPipeline.run_deferred_safety_checks)
+    CRITICAL_CHECKS = ('refusal',)
+    DEFERRED_CHECKS = ('source_grounding', 'length', 'embedding_grounding')
+    
     @staticmethod
     def check_source_grounding(answer: str, retrieved_chunks: List[dict]) -> Tuple[bool, str]:
         """Check if answer is grounded in sources."""
@@ -36,6 +45,33 @@ class SafetyChecker:
         
         return True, "Answer appears grounded"
     
+    @staticmethod
+    def check_embedding_grounding(
+        sentence_embeddings: np.ndarray,
+        chunk_embeddings: np.ndarray,
+        threshold: float
+    ) -> Tuple[bool, str, np.ndarray]:
+        """Check that every answer sentence is close to some retrieved chunk.
+        
+        Support of a sentence is its highest cosine similarity to any chunk;
+        returns the per-sentence support alongside the verdict.
+        """
+        
+        if not len(sentence_embeddings) or not len(chunk_embeddings):
+            return True, "Nothing to compare", np.empty(0, dtype=np.float32)
+        
+        def normalized(vectors):
+            vectors = np.asarray(vectors, dtype=np.float32)
+            return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        
+        support = (normalized(sentence_embeddings) @ normalized(chunk_embeddings).T).max(axis=1)
+        unsupported = int((support < threshold).sum())
+        
+        if unsupported:
+            return False, f"{unsupported} of {len(support)} sentences not supported by sources", support
+        
+        return True, "All sentences supported by sources", support
+    
     @staticmethod
     def check_appropriate_length(answer: str, context_length: int) -> Tuple[bool, str]:
         """Check if answer length is reasonable."""
@@ -55,11 +91,9 @@ class SafetyChecker:
     def detect_refusal(answer: str) -> Tuple[bool, str]:
         """Detect if model refused to answer."""
         
-        answer_lower = answer.lower()
-        
-        for phrase in SafetyChecker.REFUSAL_PHRASES:
-            if phrase in answer_lower:
-                return True, f"Detected refusal pattern: '{phrase}'"
+        match = SafetyChecker._REFUSAL_PATTERN.search(answer.lower())
+        if match is not None:
+            return True, f"Detected refusal pattern: '{match.group()}'"
         
         return False, "No refusal detected"
     
@@ -67,23 +101,28 @@ class SafetyChecker:
     def validate_response(
         answer: str,
         retrieved_chunks: List[dict],
-        question: str
+        question: str,
+        only: Optional[Iterable[str]] = None
     ) -> dict:
-        """Run all safety checks."""
+        """Run all safety checks, or just those named in only."""
         
         checks = {}
+        only = set(only) if only is not None else None
         
         # Check 1: Source grounding
-        grounded, msg = SafetyChecker.check_source_grounding(answer, retrieved_chunks)
-        checks['source_grounding'] = {'passed': grounded, 'message': msg}
+        if only is None or 'source_grounding' in only:
+            grounded, msg = SafetyChecker.check_source_grounding(answer, retrieved_chunks)
+            checks['source_grounding'] = {'passed': grounded, 'message': msg}
         
         # Check 2: Appropriate length
-        context_length = sum(len(c.get('content', '').split()) for c in retrieved_chunks)
-        length_ok, msg = SafetyChecker.check_appropriate_length(answer, context_length)
-        checks['length'] = {'passed': length_ok, 'message': msg}
+        if only is None or 'length' in only:
+            context_length = sum(len(c.get('content', '').split()) for c in retrieved_chunks)
+            length_ok, msg = SafetyChecker.check_appropriate_length(answer, context_length)
+            checks['length'] = {'passed': length_ok, 'message': msg}
         
         # Check 3: Refusal detection
-        refused, msg = SafetyChecker.detect_refusal(answer)
-        checks['refusal'] = {'passed': not refused, 'message': msg}
+        if only is None or 'refusal' in only:
+            refused, msg = SafetyChecker.detect_refusal(answer)
+            checks['refusal'] = {'passed': not refused, 'message': msg}
         
         return checks
@@ -0,0 +1,133 @@
+"""Versioned index snapshots: immutable directories written atomically, plus a CURRENT pointer."""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from src.embedding_manager import FAISSIndex
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "faiss_index.bin"
+METADATA_FILE = "faiss_index_metadata.json"  # written by FAISSIndex.save next to INDEX_FILE
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _fsync(path: Path):
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def write_snapshot(index: FAISSIndex, root: Path, **manifest_fields) -> Path:
+    """Write index, metadata and manifest to a new snapshot directory under root.
+
+    Files go to a temporary directory that is renamed into place once complete,
+    so readers never see a partial snapshot. The snapshot becomes current only
+    through set_current().
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    name = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{index.version}"
+    tmp_dir = root / f".tmp-{name}-{os.getpid()}"
+    
+    try:
+        index.save(tmp_dir / INDEX_FILE)
+        manifest = {
+            'name': name,
+            'version': index.version,
+            'created_at': time.time(),
+            'num_vectors': int(index.index.ntotal),
+            'embedding_dim': index.embedding_dim,
+            'metric': index.metric,
+            **manifest_fields,
+            'files': {
+                filename: _sha256(tmp_dir / filename)
+                for filename in (INDEX_FILE, METADATA_FILE)
+            }
+        }
+        with open(tmp_dir / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        
+        for filename in (INDEX_FILE, METADATA_FILE, MANIFEST_FILE):
+            _fsync(tmp_dir / filename)
+        os.rename(tmp_dir, root / name)
+        _fsync(root)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    
+    logger.info(f"Wrote index snapshot {root / name}")
+    return root / name
+
+def set_current(root: Path, snapshot: Path):
+    """Atomically point CURRENT at snapshot."""
+    root = Path(root)
+    tmp_path = root / f".{CURRENT_FILE}.{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(Path(snapshot).name + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, root / CURRENT_FILE)
+    _fsync(root)
+    logger.info(f"Current index snapshot: {Path(snapshot).name}")
+
+def current_snapshot(root: Path) -> Optional[Path]:
+    """Directory CURRENT points at, or None if there is none."""
+    pointer = Path(root) / CURRENT_FILE
+    try:
+        name = pointer.read_text(encoding='utf-8').strip()
+    except FileNotFoundError:
+        return None
+    return Path(root) / name if name else None
+
+def read_manifest(snapshot: Path) -> Dict[str, Any]:
+    with open(Path(snapshot) / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_snapshot(snapshot: Path, mmap: bool = False, verify: bool = True) -> Tuple[FAISSIndex, Dict[str, Any]]:
+    """Load a snapshot's index (checking file checksums if verify) and manifest."""
+    snapshot = Path(snapshot)
+    manifest = read_manifest(snapshot)
+    
+    if verify:
+        for filename, expected in manifest['files'].items():
+            if _sha256(snapshot / filename) != expected:
+                raise ValueError(f"Snapshot {snapshot.name}: checksum mismatch for {filename}")
+    
+    index = FAISSIndex.load(snapshot / INDEX_FILE, metric=manifest['metric'], mmap=mmap)
+    index.version = manifest['version']
+    index.snapshot = manifest['name']
+    return index, manifest
+
+def _created_at(snapshot: Path) -> float:
+    try:
+        return read_manifest(snapshot)['created_at']
+    except (OSError, ValueError, KeyError):
+        return snapshot.stat().st_mtime
+
+def prune_snapshots(root: Path, keep: int):
+    """Delete the oldest snapshots beyond keep, never the current one."""
+    root = Path(root)
+    current = current_snapshot(root)
+    snapshots = sorted(
+        (p for p in root.iterdir() if p.is_dir() and not p.name.startswith(".")),
+        key=_created_at
+    )
+    for snapshot in snapshots[:max(len(snapshots) - keep, 0)]:
+        if current is not None and snapshot.name == current.name:
+            continue
+        # Processes that memory-mapped the files keep them readable until they unmap
+        shutil.rmtree(snapshot, ignore_errors=True)
+        logger.info(f"Pruned index snapshot {snapshot.name}")
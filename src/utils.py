@@ -1,8 +1,10 @@
 """Utility functions."""
 import json
 import logging
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional
 import numpy as np
 
 def setup_logging(log_level: str = "INFO") -> logging.Logger:
@@ -13,6 +15,19 @@ def setup_logging(log_level: str = "INFO") -> logging.Logger:
     )
     return logging.getLogger(__name__)
 
+def configure_threads(num_threads: Optional[int] = None, num_interop_threads: Optional[int] = None) -> None:
+    """Pin torch intra-op / inter-op thread counts (call before loading models)."""
+    import torch
+    
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError as e:
+            # Can only be set once, before any inter-op parallel work has started
+            logging.getLogger(__name__).warning(f"Could not set inter-op threads: {e}")
+
 def save_json(data: Any, path: Path, indent: int = 2) -> None:
     """Save data to JSON file."""
     path.parent.mkdir(parents=True, exist_ok=True)
@@ -40,6 +55,10 @@ def load_jsonl(path: Path) -> List[Dict]:
                 data.append(json.loads(line))
     return data
 
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question (for dedup and cache keys)."""
+    return " ".join(question.casefold().split())
+
 def calculate_metrics(predictions: List[str], references: List[str]) -> Dict[str, float]:
     """Calculate basic text similarity metrics."""
     metrics = {}
@@ -88,3 +107,33 @@ class RangeAccumulator:
             'max': self.max(),
             'count': len(self.values)
         }
+
+class PhaseTimer:
+    """Measures named phases with a monotonic clock (milliseconds).
+    
+    on_phase, if given, is called with the phase name when a phase starts.
+    """
+    
+    def __init__(self, on_phase: Optional[Callable[[str], None]] = None):
+        self.timings = {}
+        self.on_phase = on_phase
+    
+    @contextmanager
+    def phase(self, name: str):
+        if self.on_phase is not None:
+            self.on_phase(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+    
+    def add(self, name: str, ms: float):
+        """Record a duration measured elsewhere (accumulates per name)."""
+        self.timings[name] = self.timings.get(name, 0.0) + ms
+    
+    def total_ms(self) -> float:
+        return sum(self.timings.values())
+    
+    def summary(self) -> str:
+        return ", ".join(f"{name}={ms:.0f}ms" for name, ms in self.timings.items())
@@ -0,0 +1,136 @@
+"""Tests for the HTTP API."""
+import json
+from unittest.mock import Mock
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from api.app import app, STATE
+from api.concurrency import StageExecutors
+from api.startup import StartupProgress
+from src.config import AppConfig
+from src.embedding_manager import EmbeddingManager, FAISSIndex
+
+@pytest.fixture
+def client(monkeypatch):
+    """Client of a ready app (startup not run) searching six one-hot chunks."""
+    generator = Mock()
+    generator.encode.side_effect = lambda texts, show_progress_bar=False: np.stack([
+        np.eye(6, dtype=np.float32)[int(text)] for text in texts
+    ])
+    monkeypatch.setattr("src.embedding_manager.EmbeddingGenerator", Mock(return_value=generator))
+    manager = EmbeddingManager("stub")
+    manager.index = FAISSIndex(embedding_dim=6)
+    manager.index.add(np.eye(6, dtype=np.float32), [
+        {
+            'chunk_id': f'chunk_{i}',
+            'content': f'Clause {i} of the agreement.',
+            'source_doc_id': f'doc_{i % 2}',
+            'source_title': f'Document {i % 2}',
+            'metadata': {'year': 2000 + i}
+        }
+        for i in range(6)
+    ])
+    
+    executors = StageExecutors(retrieval_workers=1, generation_workers=1)
+    monkeypatch.setitem(STATE, "config", AppConfig())
+    monkeypatch.setitem(STATE, "pipeline", Mock(embedding_manager=manager))
+    monkeypatch.setitem(STATE, "initialized", True)
+    monkeypatch.setitem(STATE, "executors", executors)
+    yield TestClient(app)
+    executors.shutdown()
+
+def test_search_pagination(client):
+    """Test that pages do not overlap and has_more marks the last one."""
+    first = client.post("/search", json={'query': "0", 'k': 4}).json()
+    second = client.post("/search", json={'query': "0", 'k': 4, 'offset': 4}).json()
+    
+    assert [hit['rank'] for hit in first['results']] == [1, 2, 3, 4]
+    assert first['results'][0]['chunk_id'] == 'chunk_0'
+    assert first['has_more'] is True
+    assert [hit['rank'] for hit in second['results']] == [5, 6]
+    assert second['has_more'] is False
+    ids = {hit['chunk_id'] for hit in first['results'] + second['results']}
+    assert len(ids) == 6
+
+def test_search_filters(client):
+    """Test filtering on chunk fields and nested metadata."""
+    response = client.post("/search", json={'query': "1", 'filters': {'source_doc_id': 'doc_1'}}).json()
+    assert response['results'][0]['chunk_id'] == 'chunk_1'
+    assert {hit['source_doc_id'] for hit in response['results']} == {'doc_1'}
+    assert len(response['results']) == 3
+    
+    response = client.post("/search", json={'query': "1", 'filters': {'metadata.year': [2002, 2004]}}).json()
+    assert sorted(hit['chunk_id'] for hit in response['results']) == ['chunk_2', 'chunk_4']
+    assert 'metadata_filter' in response['timings']
+    
+    response = client.post("/search", json={'query': "1", 'filters': {'source_doc_id': 'missing'}}).json()
+    assert response['results'] == [] and response['has_more'] is False
+
+def test_search_projections(client):
+    """Test that each field projection returns only its fields."""
+    def top_hit(**params):
+        return client.post("/search", json={'query': "3", 'k': 1, **params}).json()['results'][0]
+    
+    assert set(top_hit(fields="ids")) == {'rank', 'chunk_id', 'vector_id', 'score'}
+    
+    hit = top_hit(snippet_chars=6)
+    assert hit['snippet'] == "Clause..."
+    assert hit['source_title'] == 'Document 1'
+    assert 'chunk' not in hit
+    
+    hit = top_hit(fields="full")
+    assert hit['chunk']['content'] == 'Clause 3 of the agreement.'
+    assert hit['chunk']['metadata'] == {'year': 2003}
+    assert 'snippet' not in hit and 'vector_id' not in hit['chunk']
+
+def test_search_not_ready(client):
+    """Test 503 with Retry-After while the pipeline loads."""
+    STATE["initialized"] = False
+    response = client.post("/search", json={'query': "0"})
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+
+def test_ready_status_codes(client, monkeypatch, tmp_path):
+    """Test that /ready is 503 while loading or failed and 200 once ready."""
+    path = tmp_path / "startup_timings.json"
+    path.write_text(json.dumps({"index": 2000.0}))
+    monkeypatch.setitem(STATE, "startup", StartupProgress(path))
+    monkeypatch.setitem(STATE, "initialized", False)
+    monkeypatch.setitem(STATE, "error", None)
+    
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()['status'] == "loading"
+    assert response.json()['eta_seconds'] == 2.0
+    
+    STATE["initialized"] = True
+    STATE["startup"].finish()
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()['ready'] is True
+    
+    STATE["initialized"] = False
+    STATE["error"] = "out of memory"
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()['status'] == "error"
+
+def test_ask_while_loading(client, monkeypatch, tmp_path):
+    """Test that /ask gets 503 with Retry-After from the startup ETA while /health stays 200."""
+    path = tmp_path / "startup_timings.json"
+    path.write_text(json.dumps({"index": 2000.0}))
+    monkeypatch.setitem(STATE, "startup", StartupProgress(path))
+    monkeypatch.setitem(STATE, "initialized", False)
+    monkeypatch.setitem(STATE, "error", None)
+    
+    response = client.post("/ask", json={'question': "What does clause 1 say?"})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == "2"
+    
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json()['status'] == "ok"
+    assert response.json()['model_loaded'] is False
+    
+    STATE["error"] = "out of memory"
+    assert client.get("/health").status_code == 503
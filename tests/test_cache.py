@@ -0,0 +1,85 @@
+"""Tests for the answer cache."""
+import time
+import numpy as np
+from src.cache import AnswerCache, DiskCache, MemoryCache, SemanticCache, create_answer_cache
+
+def test_memory_cache_lru():
+    """Test that the least recently used entry is evicted first."""
+    cache = MemoryCache(max_entries=2, ttl=None)
+    cache.set("a", {"answer": 1})
+    cache.set("b", {"answer": 2})
+    cache.get("a")
+    cache.set("c", {"answer": 3})
+    
+    assert cache.get("a") == {"answer": 1}
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+def test_memory_cache_ttl():
+    """Test that expired entries read as missing."""
+    cache = MemoryCache(ttl=0.01)
+    cache.set("a", {"answer": 1})
+    time.sleep(0.02)
+    
+    assert cache.get("a") is None
+
+def test_disk_cache_persists(tmp_path):
+    """Test that entries survive reopening the store, and TTL applies."""
+    path = tmp_path / "answers.sqlite"
+    DiskCache(path).set("a", {"answer": "Clause A applies."})
+    
+    assert DiskCache(path).get("a") == {"answer": "Clause A applies."}
+    
+    expiring = DiskCache(path, ttl=0.0)
+    expiring.set("b", {"answer": 2})
+    assert expiring.get("b") is None
+
+def test_disk_cache_max_entries(tmp_path):
+    """Test that the store is trimmed to max_entries."""
+    cache = DiskCache(tmp_path / "answers.sqlite", max_entries=2)
+    for key in "abc":
+        cache.set(key, {"key": key})
+    
+    assert len(cache) == 2
+    assert cache.get("c") == {"key": "c"}
+
+def test_make_key_depends_on_all_parts():
+    """Test that keys differ when any part differs."""
+    key = AnswerCache.make_key(question="q", index_version="v1")
+    
+    assert key == AnswerCache.make_key(index_version="v1", question="q")
+    assert key != AnswerCache.make_key(question="q", index_version="v2")
+
+def test_create_answer_cache(tmp_path):
+    """Test backend selection from config values."""
+    assert create_answer_cache(None, 10, 60.0, tmp_path / "a.sqlite") is None
+    assert isinstance(create_answer_cache("memory", 10, 60.0, tmp_path / "a.sqlite").backend, MemoryCache)
+    assert isinstance(create_answer_cache("disk", 10, 60.0, tmp_path / "a.sqlite").backend, DiskCache)
+
+def test_semantic_cache_similarity_threshold():
+    """Test that only sufficiently similar questions hit."""
+    cache = SemanticCache(embedding_dim=2, threshold=0.9)
+    cache.add(np.array([1.0, 0.0]), "params", ["c1", "c2"], "v1", {"answer": "A"})
+    
+    assert cache.lookup(np.array([0.99, 0.05]), "params", ["c2", "c1"], "v1") == {"answer": "A"}
+    assert cache.lookup(np.array([0.5, 0.5]), "params", ["c1", "c2"], "v1") is None
+
+def test_semantic_cache_compatibility():
+    """Test that parameters, index version and chunk set must match."""
+    cache = SemanticCache(embedding_dim=2, threshold=0.9, min_chunk_overlap=0.5)
+    cache.add(np.array([1.0, 0.0]), "params", ["c1", "c2"], "v1", {"answer": "A"})
+    
+    assert cache.lookup(np.array([1.0, 0.0]), "other", ["c1", "c2"], "v1") is None
+    assert cache.lookup(np.array([1.0, 0.0]), "params", ["c1", "c2"], "v2") is None
+    assert cache.lookup(np.array([1.0, 0.0]), "params", ["c3", "c4"], "v1") is None
+    assert cache.lookup(np.array([1.0, 0.0]), "params", ["c1", "c2", "c3"], "v1") == {"answer": "A"}
+
+def test_semantic_cache_eviction():
+    """Test that the oldest entries are evicted beyond max_entries."""
+    cache = SemanticCache(embedding_dim=2, threshold=0.9, max_entries=1)
+    cache.add(np.array([1.0, 0.0]), "params", [], "v1", {"answer": "A"})
+    cache.add(np.array([0.0, 1.0]), "params", [], "v1", {"answer": "B"})
+    
+    assert len(cache) == 1
+    assert cache.lookup(np.array([1.0, 0.0]), "params", [], "v1") is None
+    assert cache.lookup(np.array([0.0, 1.0]), "params", [], "v1") == {"answer": "B"}
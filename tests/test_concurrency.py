@@ -0,0 +1,351 @@
+"""Tests for admission control and scheduling."""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import Mock
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+from api import app as app_module
+from api.concurrency import (
+    AdmissionController,
+    ClientPolicy,
+    Overloaded,
+    RateLimiter,
+    SingleFlight,
+    StageExecutors,
+    TokenBucket
+)
+from api.models import QueryRequest
+from src.config import AppConfig
+
+def test_admission_limits_in_flight():
+    """Test that requests beyond max_in_flight wait for a free slot."""
+    
+    async def scenario():
+        controller = AdmissionController(max_in_flight=2, max_queue=10)
+        active = []
+        peak = []
+        
+        async def request():
+            async with controller.slot():
+                active.append(1)
+                peak.append(len(active))
+                await asyncio.sleep(0.01)
+                active.pop()
+        
+        await asyncio.gather(*(request() for _ in range(6)))
+        return controller, max(peak)
+    
+    controller, peak = asyncio.run(scenario())
+    
+    assert peak == 2
+    assert controller.in_flight == 0
+    assert controller.queued == 0
+
+def test_admission_rejects_when_queue_full():
+    """Test rejection with Retry-After once the queue is full."""
+    
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=1)
+        release = asyncio.Event()
+        
+        async def hold():
+            async with controller.slot():
+                await release.wait()
+        
+        holder = asyncio.create_task(hold())
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        
+        with pytest.raises(Overloaded) as exc_info:
+            async with controller.slot():
+                pass
+        
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return exc_info.value
+    
+    error = asyncio.run(scenario())
+    
+    assert error.status_code == 503
+    assert error.retry_after >= 1
+
+def test_admission_queue_timeout():
+    """Test that waiting in the queue is bounded by the timeout."""
+    
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=5)
+        release = asyncio.Event()
+        
+        async def hold():
+            async with controller.slot():
+                await release.wait()
+        
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        
+        with pytest.raises(Overloaded):
+            async with controller.slot(timeout=0.01):
+                pass
+        
+        queued = controller.queued
+        release.set()
+        await holder
+        return controller, queued
+    
+    controller, queued = asyncio.run(scenario())
+    
+    assert queued == 0
+    assert controller.in_flight == 0
+
+def test_stage_executors():
+    """Test that blocking calls run on the stage executors."""
+    executors = StageExecutors(retrieval_workers=1, generation_workers=1)
+    
+    async def scenario():
+        return await executors.run_generation(lambda x, y=0: x + y, 1, y=2)
+    
+    assert asyncio.run(scenario()) == 3
+    executors.shutdown()
+
+def test_single_flight_coalesces():
+    """Test that concurrent calls with the same key share one computation."""
+    flights = SingleFlight()
+    calls = []
+    
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+    
+    async def scenario():
+        return await asyncio.gather(
+            flights.run("a", lambda: compute(1)),
+            flights.run("a", lambda: compute(1)),
+            flights.run("b", lambda: compute(5))
+        )
+    
+    results = asyncio.run(scenario())
+    
+    assert results == [(2, False), (2, True), (10, False)]
+    assert calls == [1, 5]
+    assert flights.in_flight == 0
+
+def test_single_flight_cancels_when_abandoned():
+    """Test that the shared computation survives one caller leaving, not all."""
+    flights = SingleFlight()
+    cancelled = []
+    
+    async def compute():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+    
+    async def scenario():
+        first = asyncio.ensure_future(flights.run("a", compute))
+        second = asyncio.ensure_future(flights.run("a", compute))
+        await asyncio.sleep(0)
+        
+        first.cancel()
+        await asyncio.sleep(0.01)
+        still_running = flights.in_flight == 1 and not cancelled
+        
+        second.cancel()
+        await asyncio.sleep(0.01)
+        return still_running
+    
+    assert asyncio.run(scenario()) is True
+    assert cancelled == [True]
+    assert flights.in_flight == 0
+
+def run_queued(controller, requests):
+    """Queue requests behind one held slot; returns the order they were admitted in."""
+    order = []
+    
+    async def scenario():
+        release = asyncio.Event()
+        
+        async def hold():
+            async with controller.slot():
+                await release.wait()
+        
+        async def request(name, policy):
+            async with controller.slot(policy=policy):
+                order.append(name)
+        
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        tasks = []
+        for name, policy in requests:
+            tasks.append(asyncio.create_task(request(name, policy)))
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(holder, *tasks, return_exceptions=True)
+        return tasks
+    
+    tasks = asyncio.run(scenario())
+    return order, tasks
+
+def test_admission_priority_classes():
+    """Test that interactive requests are admitted before queued batch requests."""
+    batch = ClientPolicy("bulk", priority="batch")
+    interactive = ClientPolicy("lawyer")
+    
+    order, _ = run_queued(
+        AdmissionController(max_in_flight=1),
+        [("b1", batch), ("b2", batch), ("i1", interactive)]
+    )
+    
+    assert order == ["i1", "b1", "b2"]
+
+def test_admission_fair_queuing():
+    """Test that clients of one class share slots by weight, not arrival order."""
+    heavy = ClientPolicy("heavy")
+    light = ClientPolicy("light")
+    
+    order, _ = run_queued(
+        AdmissionController(max_in_flight=1),
+        [("h1", heavy), ("h2", heavy), ("h3", heavy), ("l1", light), ("l2", light)]
+    )
+    
+    assert order.index("l1") < order.index("h3")
+    assert order.index("l2") < order.index("h3")
+    
+    weighted = ClientPolicy("weighted", weight=2.0)
+    order, _ = run_queued(
+        AdmissionController(max_in_flight=1),
+        [("h1", heavy), ("h2", heavy), ("w1", weighted), ("w2", weighted), ("w3", weighted)]
+    )
+    
+    assert order.index("w2") < order.index("h2")
+
+def test_admission_evicts_lower_priority_when_full():
+    """Test that a full queue makes room for interactive traffic by evicting batch work."""
+    batch = ClientPolicy("bulk", priority="batch")
+    
+    order, tasks = run_queued(
+        AdmissionController(max_in_flight=1, max_queue=2),
+        [("b1", batch), ("b2", batch), ("i1", ClientPolicy("lawyer"))]
+    )
+    
+    assert order == ["i1", "b1"]
+    assert isinstance(tasks[1].exception(), Overloaded)
+
+def test_rate_limiter():
+    """Test token-bucket rate limiting with 429 and Retry-After."""
+    limiter = RateLimiter()
+    policy = ClientPolicy("client", rate_limit=0.5, rate_burst=2)
+    
+    limiter.check(policy)
+    limiter.check(policy)
+    with pytest.raises(Overloaded) as exc_info:
+        limiter.check(policy)
+    limiter.check(ClientPolicy("other", rate_limit=0.5, rate_burst=2))
+    
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.retry_after == 2
+
+def test_token_bucket_refills():
+    """Test that tokens refill over time."""
+    bucket = TokenBucket(rate=1000.0, burst=1)
+    
+    assert bucket.take() == 0.0
+    assert bucket.take() > 0.0
+    time.sleep(0.005)
+    assert bucket.take() == 0.0
+
+def test_client_policy_unknown_keys_are_anonymous(monkeypatch):
+    """Test that API keys not in api.clients share one anonymous policy."""
+    api_config = SimpleNamespace(
+        clients={"known": {"priority": "batch", "rate_limit": 5.0}},
+        default_priority="interactive",
+        default_weight=1.0,
+        default_rate_limit=1.0,
+        default_rate_burst=1
+    )
+    monkeypatch.setitem(app_module.STATE, "config", SimpleNamespace(api=api_config))
+    
+    def policy(key=None):
+        headers = {app_module.API_KEY_HEADER: key} if key else {}
+        return app_module.client_policy(SimpleNamespace(headers=headers))
+    
+    assert policy("known").client == "known"
+    assert policy("known").priority == "batch"
+    assert policy("known").rate_limit == 5.0
+    for key in ("made-up-1", "made-up-2", None):
+        assert policy(key).client == "anonymous"
+        assert policy(key).rate_limit == 1.0
+    
+    limiter = RateLimiter()
+    limiter.check(policy("made-up-1"))
+    with pytest.raises(Overloaded):
+        limiter.check(policy("made-up-2"))
+
+def test_answer_question_degrades_only_before_queueing(monkeypatch):
+    """Test that a request holding an LLM slot is never degraded."""
+    pipeline = Mock(multi_query_llm=True)
+    pipeline.degrade_reason.return_value = None
+    executors = StageExecutors(retrieval_workers=1, generation_workers=1)
+    monkeypatch.setitem(app_module.STATE, "config", SimpleNamespace(api=SimpleNamespace(timeout=5.0)))
+    monkeypatch.setitem(app_module.STATE, "pipeline", pipeline)
+    monkeypatch.setitem(app_module.STATE, "executors", executors)
+    monkeypatch.setitem(app_module.STATE, "admission", AdmissionController(max_in_flight=1, max_queue=1))
+    request = QueryRequest(question="What does clause A say?", use_cache=False)
+    policy = ClientPolicy(client="anonymous")
+    
+    try:
+        asyncio.run(app_module.answer_question(request, policy))
+        assert pipeline.query.call_args.kwargs['allow_degraded'] is False
+        assert pipeline.query.call_args.kwargs['check_answer_cache'] is False
+        
+        pipeline.degrade_reason.return_value = "queue_full"
+        asyncio.run(app_module.answer_question(request, policy))
+        assert pipeline.query.call_args.kwargs['allow_degraded'] is True
+        assert pipeline.query.call_args.kwargs['degrade_reason'] == "queue_full"
+    finally:
+        executors.shutdown()
+
+def test_ask_cancelled_on_disconnect(monkeypatch):
+    """Test that a client disconnect cancels the deadline and stops generation with 499."""
+    generating = threading.Event()
+    stopped = threading.Event()
+    deadlines = []
+    
+    def query(**kwargs):
+        deadlines.append(kwargs['deadline'])
+        generating.set()
+        while not kwargs['deadline'].should_stop():
+            time.sleep(0.01)
+        stopped.set()
+        raise AssertionError("result of a cancelled request must not be used")
+    
+    async def is_disconnected():
+        return generating.is_set()
+    
+    pipeline = Mock(multi_query_llm=True, prompt_template="template")
+    pipeline.degrade_reason.return_value = None
+    pipeline.query.side_effect = query
+    executors = StageExecutors(retrieval_workers=1, generation_workers=1)
+    monkeypatch.setitem(app_module.STATE, "config", AppConfig())
+    monkeypatch.setitem(app_module.STATE, "pipeline", pipeline)
+    monkeypatch.setitem(app_module.STATE, "initialized", True)
+    monkeypatch.setitem(app_module.STATE, "executors", executors)
+    monkeypatch.setitem(app_module.STATE, "admission", AdmissionController(max_in_flight=1, max_queue=1))
+    monkeypatch.setitem(app_module.STATE, "single_flight", SingleFlight())
+    monkeypatch.setattr(app_module, "DISCONNECT_POLL_INTERVAL", 0.01)
+    request = QueryRequest(question="What does clause A say?", use_cache=False)
+    http_request = SimpleNamespace(headers={}, is_disconnected=is_disconnected)
+    
+    try:
+        with pytest.raises(HTTPException) as excinfo:
+            asyncio.run(app_module.ask_question(request, http_request, BackgroundTasks()))
+        
+        assert excinfo.value.status_code == 499
+        assert stopped.wait(timeout=5.0)
+        assert deadlines[0].cancelled is True
+        assert not deadlines[0].expired()
+    finally:
+        executors.shutdown()
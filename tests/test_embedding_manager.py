@@ -0,0 +1,157 @@
+"""Tests for FAISS index management."""
+from unittest.mock import Mock
+import numpy as np
+import pytest
+from src.embedding_manager import EmbeddingManager, FAISSIndex
+
+@pytest.fixture
+def saved_index(tmp_path):
+    """Small L2 index saved to disk."""
+    index = FAISSIndex(embedding_dim=4)
+    vectors = np.eye(4, dtype=np.float32)
+    index.add(vectors, [{'chunk_id': f'chunk_{i}'} for i in range(4)])
+    path = tmp_path / "faiss_index.bin"
+    index.save(path)
+    return path
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_load_index(saved_index, mmap):
+    """Test loading a saved index, read into memory or memory-mapped."""
+    index = FAISSIndex.load(saved_index, mmap=mmap)
+    
+    distances, indices = index.search(np.array([0, 0, 1, 0], dtype=np.float32), k=2)
+    
+    assert index.index.ntotal == 4
+    assert indices[0] == 2
+    assert distances[0] == pytest.approx(0.0)
+    assert index.chunk_metadata[2] == {'chunk_id': 'chunk_2'}
+
+def test_version_tracks_content(tmp_path):
+    """Test that the version changes with chunk content and survives save/load."""
+    vectors = np.eye(2, dtype=np.float32)
+    first = FAISSIndex(embedding_dim=2)
+    first.add(vectors, [{'chunk_id': 'doc_chunk_0', 'content': 'Rent is 100.'}, {'chunk_id': 'doc_chunk_1'}])
+    edited = FAISSIndex(embedding_dim=2)
+    edited.add(vectors, [{'chunk_id': 'doc_chunk_0', 'content': 'Rent is 200.'}, {'chunk_id': 'doc_chunk_1'}])
+    
+    assert first.version != edited.version
+    
+    first.save(tmp_path / "faiss_index.bin")
+    assert FAISSIndex.load(tmp_path / "faiss_index.bin").version == first.version
+
+def test_search_restricted_to_ids(saved_index):
+    """Test that an id selector excludes other vectors from the search."""
+    index = FAISSIndex.load(saved_index)
+    
+    distances, indices = index.search_batch(np.array([0, 0, 1, 0], dtype=np.float32), k=4, ids=np.array([0, 3]))
+    
+    assert sorted(indices[0][:2]) == [0, 3]
+    assert list(indices[0][2:]) == [-1, -1]
+
+@pytest.fixture
+def manager(monkeypatch):
+    """EmbeddingManager over four one-hot chunks; queries embed as one-hot too."""
+    generator = Mock()
+    generator.encode.side_effect = lambda texts, show_progress_bar=False: np.stack([
+        np.eye(4, dtype=np.float32)[int(text)] for text in texts
+    ])
+    monkeypatch.setattr("src.embedding_manager.EmbeddingGenerator", Mock(return_value=generator))
+    
+    manager = EmbeddingManager("stub")
+    manager.index = FAISSIndex(embedding_dim=4)
+    manager.index.add(np.eye(4, dtype=np.float32), [
+        {'chunk_id': f'chunk_{i}', 'source_doc_id': f'doc_{i % 2}', 'metadata': {'year': 2000 + i}}
+        for i in range(4)
+    ])
+    return manager
+
+def test_search_offset(manager):
+    """Test paging through the ranking with offset."""
+    first = manager.search("2", k=2)
+    second = manager.search("2", k=2, offset=2)
+    
+    assert first[0]['chunk_id'] == 'chunk_2'
+    assert first[0]['vector_id'] == 2
+    assert len(second) == 2
+    assert not {r['chunk_id'] for r in first} & {r['chunk_id'] for r in second}
+
+def test_search_filters(manager):
+    """Test filtering on chunk fields and nested metadata."""
+    results = manager.search("2", k=4, filters={'source_doc_id': 'doc_1'})
+    assert [r['chunk_id'] for r in results] in (['chunk_1', 'chunk_3'], ['chunk_3', 'chunk_1'])
+    
+    results = manager.search("2", k=4, filters={'metadata.year': [2000, 2002]})
+    assert [r['chunk_id'] for r in results] == ['chunk_2', 'chunk_0']
+    
+    assert manager.search("2", k=4, filters={'source_doc_id': 'missing'}) == []
+
+def test_filter_postings():
+    """Test that filters are answered from postings kept in step with the chunks."""
+    index = FAISSIndex(embedding_dim=2)
+    index.add(np.eye(2, dtype=np.float32).repeat(2, axis=0), [
+        {'chunk_id': f'chunk_{i}', 'content': f'text {i}', 'source_doc_id': f'doc_{i // 2}', 'metadata': {'tags': ['a']}}
+        for i in range(4)
+    ])
+    
+    assert set(index.postings) == {'chunk_id', 'source_doc_id', 'metadata.tags'}
+    assert index.postings['metadata.tags'] == {}
+    assert list(index.matching_ids({'source_doc_id': 'doc_1'})) == [2, 3]
+    assert list(index.matching_ids({'source_doc_id': ['doc_0', 'doc_1'], 'chunk_id': 'chunk_1'})) == [1]
+    assert list(index.matching_ids({'content': 'text 3'})) == [3]
+    assert list(index.matching_ids({'source_doc_id': 'doc_1', 'chunk_id': 'chunk_0'})) == []
+    
+    index.remove_documents(['doc_0'])
+    assert list(index.matching_ids({'source_doc_id': 'doc_1'})) == [0, 1]
+    assert list(index.copy().matching_ids({'chunk_id': 'chunk_3'})) == [1]
+
+def test_filter_postings_extended_on_add():
+    """Test that adding updates the postings in place of a rebuild, leaving copies' sources alone."""
+    index = FAISSIndex(embedding_dim=2)
+    index.add(np.eye(2, dtype=np.float32), [
+        {'chunk_id': 'a', 'source_doc_id': 'doc_0'},
+        {'chunk_id': 'b', 'source_doc_id': 'doc_1'}
+    ])
+    updated = index.copy()
+    updated.add(np.eye(2, dtype=np.float32), [
+        {'chunk_id': 'c', 'source_doc_id': 'doc_1'},
+        {'chunk_id': 'd', 'source_doc_id': 'doc_2'}
+    ])
+    
+    assert list(updated.matching_ids({'source_doc_id': 'doc_1'})) == [1, 2]
+    assert list(updated.matching_ids({'source_doc_id': 'doc_2'})) == [3]
+    assert list(index.matching_ids({'source_doc_id': 'doc_1'})) == [1]
+    assert 'doc_2' not in index.postings['source_doc_id']
+    
+    rebuilt = updated.copy()
+    rebuilt._build_postings()
+    for name, values in rebuilt.postings.items():
+        assert {value: list(ids) for value, ids in values.items()} == {
+            value: list(ids) for value, ids in updated.postings[name].items()
+        }
+
+def test_chunk_embeddings_from_index(manager):
+    """Test that result vectors come from the index, and stale results are re-encoded."""
+    results = manager.search("2", k=2)
+    assert np.array_equal(manager.chunk_embeddings(results), np.eye(4, dtype=np.float32)[[2, results[1]['vector_id']]])
+    manager.embedding_generator.encode.assert_called_once()  # the query only
+    
+    stale = {'chunk_id': 'gone', 'vector_id': 1, 'content': '3'}
+    embeddings = manager.chunk_embeddings([results[0], stale])
+    assert np.array_equal(embeddings, np.eye(4, dtype=np.float32)[[2, 3]])
+    assert manager.embedding_generator.encode.call_count == 2
+
+def test_search_mmr(manager):
+    """Test that MMR skips a near-duplicate of the best result."""
+    index = FAISSIndex(embedding_dim=4)
+    index.add(
+        np.array([[1, 0.1, 0, 0], [1, 0.15, 0, 0], [0.7, 0, 0.7, 0], [0, 0, 0, 1]], dtype=np.float32),
+        [{'chunk_id': f'chunk_{i}'} for i in range(4)]
+    )
+    manager.index = index
+    
+    plain = manager.search("0", k=2)
+    diverse = manager.search("0", k=2, mmr_lambda=0.5, fetch_k=4)
+    
+    assert [r['chunk_id'] for r in plain] == ['chunk_0', 'chunk_1']
+    assert [r['chunk_id'] for r in diverse] == ['chunk_0', 'chunk_2']
+    assert [r['chunk_id'] for r in manager.search("0", k=2, mmr_lambda=1.0, fetch_k=4)] == ['chunk_0', 'chunk_1']
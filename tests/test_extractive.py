@@ -0,0 +1,53 @@
+"""Tests for extractive answers."""
+import numpy as np
+from src.extractive import format_spans, rank_sentences_by_embedding, split_sentences
+
+CHUNKS = [
+    {
+        'source_title': 'Lease Agreement',
+        'content': 'The tenant pays rent monthly. The landlord may terminate the lease with 30 days notice.'
+    },
+    {
+        'source_title': 'NDA',
+        'content': 'Confidential information must not be disclosed.\nThis agreement lasts two years.'
+    }
+]
+
+def test_split_sentences():
+    """Test sentence splitting at punctuation and line breaks."""
+    assert split_sentences(CHUNKS[1]['content']) == [
+        'Confidential information must not be disclosed.',
+        'This agreement lasts two years.'
+    ]
+
+def test_format_spans_cites_sources():
+    """Test one sentence per line, each followed by its source document."""
+    picks = [(split_sentences(chunk['content'])[-1], chunk) for chunk in CHUNKS]
+    assert format_spans(picks) == (
+        'The landlord may terminate the lease with 30 days notice. [Lease Agreement]\n'
+        'This agreement lasts two years. [NDA]'
+    )
+    assert format_spans([('Untitled.', {})]) == 'Untitled. [Unknown]'
+    assert format_spans([]) == ""
+
+def test_rank_sentences_by_embedding():
+    """Test cosine ranking with one encode call for all sentences."""
+    calls = []
+    
+    def encode(texts):
+        calls.append(texts)
+        return np.array([[1.0, 0.0] if 'terminate' in text else [0.0, 1.0] for text in texts])
+    
+    ranked = rank_sentences_by_embedding(np.array([2.0, 0.0]), CHUNKS, encode)
+    
+    assert len(calls) == 1 and len(calls[0]) == 4
+    assert ranked[0][:2] == (1.0, 'The landlord may terminate the lease with 30 days notice.')
+    assert ranked[0][2]['source_title'] == 'Lease Agreement'
+    assert [sentence for _, sentence, _ in ranked[1:]] == [
+        'The tenant pays rent monthly.',
+        'Confidential information must not be disclosed.',
+        'This agreement lasts two years.'
+    ]
+    
+    assert len(rank_sentences_by_embedding(np.array([1.0, 0.0]), CHUNKS, encode, max_candidates=2)) == 2
+    assert rank_sentences_by_embedding(np.array([1.0, 0.0]), [], encode) == []
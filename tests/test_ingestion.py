@@ -0,0 +1,122 @@
+"""Tests for online document ingestion."""
+import time
+from unittest.mock import Mock
+import numpy as np
+import pytest
+from src.data_loader import Document
+from src.document_processor import DocumentProcessor
+from src.embedding_manager import EmbeddingManager, FAISSIndex
+from src.ingestion import IngestionWorker
+
+def embed(texts, show_progress_bar=False):
+    """Deterministic 8-dim bag-of-words embedding."""
+    vectors = np.zeros((len(texts), 8), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.split():
+            vectors[row, sum(map(ord, word)) % 8] += 1.0
+    return vectors
+
+@pytest.fixture
+def manager(monkeypatch):
+    """EmbeddingManager with a stub embedding model and one indexed document."""
+    generator = Mock(embedding_dim=8)
+    generator.encode.side_effect = embed
+    monkeypatch.setattr("src.embedding_manager.EmbeddingGenerator", Mock(return_value=generator))
+    
+    manager = EmbeddingManager("stub")
+    manager.index = FAISSIndex(embedding_dim=8)
+    manager.index.add(embed(["lease agreement"]), [{'chunk_id': 'old_chunk_0', 'source_doc_id': 'old'}])
+    return manager
+
+@pytest.fixture
+def worker(manager):
+    """Worker that is driven synchronously through process_batch."""
+    return IngestionWorker(manager, DocumentProcessor(chunk_size=4, chunk_overlap=1))
+
+def test_add_document(worker, manager):
+    """Test that an added document is chunked, embedded once and searchable."""
+    old_index = manager.index
+    job = worker.submit_add(Document("new", "New", "one two three four five six seven", "test"))
+    
+    worker.process_batch([job])
+    
+    assert job.status == "done"
+    assert job.chunks == 3
+    assert manager.index is not old_index
+    assert manager.index.index.ntotal == 4
+    assert job.index_version == manager.index.version != old_index.version
+    assert old_index.index.ntotal == 1  # readers holding the old index are unaffected
+    assert manager.embedding_generator.encode.call_count == 1
+    assert manager.search("five six seven", k=1)[0]['source_doc_id'] == "new"
+
+def test_replace_and_delete_document(worker, manager):
+    """Test that re-adding replaces chunks and a later delete in the batch wins."""
+    first = worker.submit_add(Document("new", "New", "one two", "test"))
+    worker.process_batch([first])
+    
+    replace = worker.submit_add(Document("new", "New", "three four", "test"))
+    delete_old = worker.submit_delete("old")
+    worker.process_batch([replace, delete_old])
+    
+    assert [m['source_doc_id'] for m in manager.index.chunk_metadata] == ["new"]
+    assert manager.index.chunk_metadata[0]['content'] == "three four"
+    assert delete_old.chunks == 1
+    
+    delete_new = worker.submit_delete("new")
+    worker.process_batch([delete_new])
+    assert manager.index.index.ntotal == 0
+    assert worker.get_job(delete_new.job_id).status == "done"
+
+def test_batch_applied_as_one_update(worker, manager, monkeypatch):
+    """Test that a batch changes the index once, with the jobs' submission-order effects."""
+    jobs = [
+        worker.submit_add(Document("a", "A", "one two", "test")),
+        worker.submit_add(Document("b", "B", "three four", "test")),
+        worker.submit_delete("a"),
+        worker.submit_add(Document("a", "A", "five six seven eight nine", "test")),
+        worker.submit_delete("old")
+    ]
+    calls = []
+    replace_documents = FAISSIndex.replace_documents
+    
+    def replace(index, *args):
+        calls.append(args)
+        return replace_documents(index, *args)
+    
+    monkeypatch.setattr(FAISSIndex, "replace_documents", replace)
+    
+    worker.process_batch(jobs)
+    
+    assert len(calls) == 1
+    assert [job.chunks for job in jobs] == [1, 1, 1, 2, 1]
+    assert [m['source_doc_id'] for m in manager.index.chunk_metadata] == ["b", "a", "a"]
+    assert list(manager.index.matching_ids({'source_doc_id': 'a'})) == [1, 2]
+    assert manager.search("five six seven", k=1)[0]['source_doc_id'] == "a"
+
+def test_failed_batch(worker, manager):
+    """Test that an embedding failure fails the batch and leaves the index alone."""
+    manager.embedding_generator.encode.side_effect = RuntimeError("boom")
+    old_index = manager.index
+    job = worker.submit_add(Document("new", "New", "one two", "test"))
+    
+    worker.process_batch([job])
+    
+    assert job.status == "failed"
+    assert job.error == "boom"
+    assert manager.index is old_index
+
+def test_worker_thread(worker, manager):
+    """Test that the background thread applies queued jobs."""
+    worker.start()
+    try:
+        job = worker.submit_add(Document("new", "New", "one two", "test"))
+        for _ in range(100):
+            if job.status == "done":
+                break
+            time.sleep(0.05)
+    finally:
+        worker.stop()
+    
+    assert job.status == "done"
+    assert worker.queued == 0
+    assert manager.index.index.ntotal == 2
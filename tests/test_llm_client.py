@@ -0,0 +1,235 @@
+"""Tests for LLM clients."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import torch
+from src.deadline import Deadline
+from src.llm_client import (
+    AssistedDecodingMonitor,
+    GenerationStats,
+    HTTPLLMClient,
+    LLMServerError,
+    MockLLMClient,
+    StopSequenceCriteria,
+    clean_stop,
+    truncate_at_stop
+)
+
+class StubCompletionHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible chat completion endpoint."""
+    
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(payload)
+        
+        if self.server.failures_left > 0:
+            self.server.failures_left -= 1
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        
+        if payload.get('stream'):
+            events = [{'choices': [{'delta': {'content': text}}]} for text in ['Clause ', 'A ', 'applies.']]
+            if self.server.stream_usage and payload.get('stream_options', {}).get('include_usage'):
+                events.append({'choices': [], 'usage': {'prompt_tokens': 12, 'completion_tokens': 4}})
+            body = ''.join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+            content_type = 'text/event-stream'
+        else:
+            body = json.dumps({
+                'choices': [{'message': {'content': ' Clause A applies. '}}],
+                'usage': {'prompt_tokens': 12, 'completion_tokens': 3}
+            })
+            content_type = 'application/json'
+        
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    """Local stub inference server."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubCompletionHandler)
+    server.requests = []
+    server.failures_left = 0
+    server.stream_usage = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def http_client(stub_server):
+    """HTTP client pointed at the stub server."""
+    client = HTTPLLMClient(
+        base_url=f"http://127.0.0.1:{stub_server.server_address[1]}",
+        max_tokens=64,
+        max_retries=2,
+        retry_backoff=0.01
+    )
+    yield client
+    client.close()
+
+def test_assisted_monitor_acceptance_rate():
+    """Test acceptance rate estimation from forward pass counts."""
+    monitor = AssistedDecodingMonitor(min_acceptance_rate=0.4, min_samples=1)
+    
+    # 20 new tokens from 5 verification passes -> 15 accepted out of 20 proposed
+    monitor.record(True, new_tokens=20, elapsed_s=1.0, main_forwards=5, draft_forwards=20)
+    
+    metrics = monitor.metrics()
+    assert metrics['acceptance_rate'] == pytest.approx(0.75)
+    assert metrics['enabled'] is True
+
+def test_assisted_monitor_fallback_and_probe():
+    """Test fallback to normal decoding when drafts are rejected."""
+    monitor = AssistedDecodingMonitor(min_acceptance_rate=0.5, min_samples=2, probe_interval=3)
+    
+    for _ in range(2):
+        monitor.record(True, new_tokens=10, elapsed_s=1.0, main_forwards=9, draft_forwards=20)
+    
+    assert monitor.use_assistant() is False
+    assert monitor.metrics()['fallbacks'] == 1
+    
+    # Re-probe after enough plain generations
+    for _ in range(3):
+        monitor.record(False, new_tokens=10, elapsed_s=0.5)
+    
+    assert monitor.use_assistant() is True
+
+def test_assisted_monitor_speedup():
+    """Test speed-up relative to plain decoding."""
+    monitor = AssistedDecodingMonitor()
+    
+    monitor.record(False, new_tokens=10, elapsed_s=1.0)
+    monitor.record(True, new_tokens=20, elapsed_s=1.0, main_forwards=5, draft_forwards=20)
+    
+    assert monitor.metrics()['speedup'] == pytest.approx(2.0)
+
+class WordTokenizer:
+    """Tokenizer stub: token id i is the word VOCAB[i]."""
+    
+    VOCAB = ['The', 'fee', 'is', '100', 'USD', '.', 'Question', ':']
+    
+    def encode(self, text, add_special_tokens=False):
+        return [self.VOCAB.index(w) for w in text.split()]
+    
+    def decode(self, ids, skip_special_tokens=True):
+        return ' '.join(self.VOCAB[int(i)] for i in ids)
+
+def test_truncate_at_stop():
+    """Test truncation at the earliest stop sequence."""
+    assert truncate_at_stop("Answer. Question: next", ["Question:"]) == "Answer. "
+    assert truncate_at_stop("a b c", ["c", "b"]) == "a "
+    assert truncate_at_stop("a b c", None) == "a b c"
+    assert truncate_at_stop("a b c", ["z"]) == "a b c"
+
+def test_clean_stop():
+    """Test that empty stop strings are dropped."""
+    assert clean_stop(["", "Question:"]) == ["Question:"]
+    assert clean_stop([""]) is None
+    assert clean_stop(None) is None
+
+def test_stop_sequence_criteria():
+    """Test stopping as soon as a stop sequence is generated."""
+    tokenizer = WordTokenizer()
+    criteria = StopSequenceCriteria(tokenizer, ["Question :"], prompt_length=2)
+    
+    prompt = [0, 1]
+    assert not criteria(torch.tensor([prompt + [2, 3, 4]]), None)
+    assert criteria(torch.tensor([prompt + [2, 3, 4, 6, 7]]), None)
+    
+    # Batch: a row stays done after its stop string scrolls out of the tail or it
+    # finishes with EOS and is padded (pad != eos)
+    criteria = StopSequenceCriteria(tokenizer, ["Question :"], prompt_length=2, eos_token_id=5)
+    assert not criteria(torch.tensor([prompt + [6, 7], prompt + [2, 3]]), None)
+    assert criteria(torch.tensor([prompt + [6, 7, 2, 3, 4], prompt + [2, 3, 4, 3, 5]]), None)
+    
+    criteria = StopSequenceCriteria(tokenizer, ["Question :"], prompt_length=2, eos_token_id=5)
+    assert not criteria(torch.tensor([prompt + [2, 5], prompt + [2, 3]]), None)
+    assert criteria(torch.tensor([prompt + [2, 5, 0, 0], prompt + [2, 3, 6, 7]]), None)
+    
+    # Stop strings inside the prompt are ignored
+    criteria = StopSequenceCriteria(tokenizer, ["fee"], prompt_length=2)
+    assert not criteria(torch.tensor([prompt + [2, 3]]), None)
+
+def test_mock_client_generation_params():
+    """Test per-call max_tokens and stop sequences on the mock client."""
+    client = MockLLMClient()
+    
+    assert len(client.generate("System", "what?", max_tokens=5).split()) == 5
+    assert client.generate("System", "what?", stop=["documents"]) == "Based on the provided"
+
+def test_http_client_generate(http_client, stub_server):
+    """Test non-streaming completion against the stub server."""
+    answer = http_client.generate("System prompt", "What is clause A?")
+    
+    assert answer == "Clause A applies."
+    request = stub_server.requests[0]
+    assert request['messages'][0] == {'role': 'system', 'content': 'System prompt'}
+    assert request['max_tokens'] == 64
+    assert request['stream'] is False
+
+def test_http_client_generation_stats(http_client, stub_server):
+    """Test token counts from usage and the prefill/decode split when streaming."""
+    stats = GenerationStats()
+    http_client.generate("System", "What is clause A?", stats=stats)
+    assert (stats.prompt_tokens, stats.completion_tokens) == (12, 3)
+    assert stats.prefill_ms is None
+    
+    stats = GenerationStats()
+    http_client.generate("System", "What is clause A?", deadline=Deadline(30.0), stats=stats)
+    assert (stats.prompt_tokens, stats.completion_tokens) == (12, 4)
+    assert stats.prefill_ms >= 0 and stats.decode_ms >= 0
+    
+    # Without a usage block the streamed chunks are not counted as tokens
+    stub_server.stream_usage = False
+    stats = GenerationStats()
+    answer = http_client.generate("System", "What is clause A?", deadline=Deadline(30.0), stats=stats)
+    assert answer == "Clause A applies."
+    assert (stats.prompt_tokens, stats.completion_tokens) == (None, None)
+    assert stats.tokens_per_second() is None
+
+def test_http_client_generation_params(http_client, stub_server):
+    """Test per-call generation parameters in the request payload."""
+    answer = http_client.generate(
+        "System prompt",
+        "What is clause A?",
+        max_tokens=8,
+        do_sample=False,
+        stop=["applies"]
+    )
+    
+    assert answer == "Clause A"
+    request = stub_server.requests[0]
+    assert request['max_tokens'] == 8
+    assert request['temperature'] == 0.0
+    assert request['stop'] == ["applies"]
+    
+    http_client.generate("System prompt", "What is clause A?", stop=[""])
+    assert 'stop' not in stub_server.requests[1]
+
+def test_http_client_stream(http_client):
+    """Test streaming completion."""
+    deltas = list(http_client.stream("System prompt", "What is clause A?"))
+    
+    assert ''.join(deltas) == "Clause A applies."
+
+def test_http_client_retries(http_client, stub_server):
+    """Test retry on retryable status codes."""
+    stub_server.failures_left = 2
+    
+    assert http_client.generate("System prompt", "Question?") == "Clause A applies."
+    assert len(stub_server.requests) == 3
+    
+    stub_server.failures_left = 3
+    with pytest.raises(LLMServerError):
+        http_client.generate("System prompt", "Question?")
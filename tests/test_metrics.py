@@ -0,0 +1,49 @@
+"""Tests for metrics."""
+import pytest
+from src.metrics import MetricsRegistry
+
+def test_counter_and_gauge_exposition():
+    """Test counter and gauge text exposition."""
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ["status"])
+    depth = registry.gauge("queue_depth", "Queue depth")
+    
+    requests.inc(status="200")
+    requests.inc(2, status="500")
+    depth.set_function(lambda: 3)
+    
+    text = registry.render()
+    
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{status="200"} 1.0' in text
+    assert 'requests_total{status="500"} 2.0' in text
+    assert "queue_depth 3.0" in text
+
+def test_histogram_buckets():
+    """Test cumulative histogram buckets, sum and count."""
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", ["stage"], buckets=(0.1, 1.0))
+    
+    latency.observe(0.05, stage="search")
+    latency.observe(0.5, stage="search")
+    latency.observe(5.0, stage="search")
+    
+    text = registry.render()
+    
+    assert 'latency_seconds_bucket{stage="search",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{stage="search",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{stage="search",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{stage="search"} 3' in text
+    assert latency.sum(stage="search") == pytest.approx(5.55)
+
+def test_registry_get_or_create():
+    """Test that metrics are shared by name and labels are validated."""
+    registry = MetricsRegistry()
+    counter = registry.counter("hits_total", "Hits", ["cache"])
+    
+    assert registry.counter("hits_total", "Hits", ["cache"]) is counter
+    
+    with pytest.raises(ValueError):
+        registry.gauge("hits_total", "Hits", ["cache"])
+    with pytest.raises(ValueError):
+        counter.inc(result="hit")
@@ -0,0 +1,14 @@
+"""Tests for Maximal Marginal Relevance selection."""
+import numpy as np
+from src.mmr import mmr_select
+
+def test_mmr_select():
+    """Test that lambda trades relevance against redundancy."""
+    query = np.array([1.0, 0.5])
+    candidates = np.array([[1.0, 0.4], [1.0, 0.45], [0.3, 1.0], [-1.0, 0.0]])
+    
+    assert mmr_select(query, candidates, 3, lambda_mult=1.0) == [1, 0, 2]
+    assert mmr_select(query, candidates, 3, lambda_mult=0.5) == [1, 2, 0]
+    assert mmr_select(query, candidates, 2, lambda_mult=0.3) == [1, 3]
+    assert len(mmr_select(query, candidates, 10)) == 4
+    assert mmr_select(query, candidates[:0], 3) == []
@@ -0,0 +1,85 @@
+"""Tests for pre-fork multi-worker serving."""
+import gc
+import json
+import os
+import signal
+import socket
+import time
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+from unittest.mock import Mock
+from api import prefork
+from api.app import STATE
+from src.config import AppConfig
+
+def fake_pipeline_loader(calls):
+    def initialize_pipeline(config=None):
+        calls.append(config)
+        return SimpleNamespace(overload_policy=None, llm_client=Mock())
+    return initialize_pipeline
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def test_preload_uses_given_config(monkeypatch):
+    """Test that the pipeline and the workers' app state use the config being served."""
+    calls = []
+    monkeypatch.setattr(prefork, "initialize_pipeline", fake_pipeline_loader(calls))
+    monkeypatch.setitem(STATE, "pipeline", None)
+    monkeypatch.setitem(STATE, "initialized", False)
+    monkeypatch.setitem(STATE, "config", STATE["config"])
+    config = AppConfig()
+    
+    try:
+        prefork.preload(config)
+    finally:
+        gc.unfreeze()
+    
+    assert calls == [config]
+    assert STATE["config"] is config
+    assert STATE["initialized"] is True
+
+def get(url: str):
+    """Response body of url, waiting up to 10 s for the server to come up."""
+    for _ in range(100):
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                return response.read().decode("utf-8")
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.1)
+    return None
+
+def test_serve_forks_ready_workers(monkeypatch):
+    """Smoke test: preload, fork two workers, answer /ready and expose each worker's metrics."""
+    calls = []
+    monkeypatch.setattr(prefork, "initialize_pipeline", fake_pipeline_loader(calls))
+    config = AppConfig()
+    config.api.host = "127.0.0.1"
+    config.api.port = free_port()
+    config.api.workers = 2
+    config.api.metrics_port = free_port()
+    
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 0
+        try:
+            prefork.serve(config)
+        except BaseException:
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+    
+    try:
+        body = get(f"http://127.0.0.1:{config.api.port}/ready")
+        assert body is not None and json.loads(body)["status"] == "ready"
+        for worker_index in range(2):
+            metrics = get(f"http://127.0.0.1:{config.api.metrics_port + worker_index}/metrics")
+            assert metrics is not None and "# TYPE legalrag_stage_seconds histogram" in metrics
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        _, status = os.waitpid(pid, 0)
+    
+    assert os.waitstatus_to_exitcode(status) == 0
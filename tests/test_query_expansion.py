@@ -0,0 +1,43 @@
+"""Tests for multi-query expansion and rank fusion."""
+from unittest.mock import Mock
+from src.query_expansion import expand_query, llm_query_variants, reciprocal_rank_fusion
+
+def test_expand_query():
+    """Test synonym variants: first synonyms of every term before second ones."""
+    variants = expand_query("Can the landlord terminate the agreement?", max_variants=4)
+    
+    assert variants == [
+        "Can the landlord terminate the agreement?",
+        "Can the lessor terminate the agreement?",
+        "Can the landlord cancel the agreement?",
+        "Can the landlord terminate the contract?",
+        "Can the landlord end the agreement?"
+    ]
+    assert expand_query("Can the Landlord leave?", max_variants=1) == [
+        "Can the Landlord leave?",
+        "Can the lessor leave?"
+    ]
+    assert expand_query("What is the weather?") == ["What is the weather?"]
+
+def test_llm_query_variants():
+    """Test one batched generation and parsing of list-formatted rewrites."""
+    llm = Mock()
+    llm.generate_batch.return_value = ["1. First rewrite\n2) Second rewrite\n\n- Third\nFourth"]
+    
+    assert llm_query_variants(llm, ["Question?"], num_variants=3) == [["First rewrite", "Second rewrite", "Third"]]
+    llm.generate_batch.assert_called_once()
+
+def test_reciprocal_rank_fusion():
+    """Test that chunks ranked well by several queries win."""
+    rankings = [
+        [{'chunk_id': 'a', 'similarity_score': 0.9}, {'chunk_id': 'b', 'similarity_score': 0.5}],
+        [{'chunk_id': 'b', 'similarity_score': 0.8}, {'chunk_id': 'c', 'similarity_score': 0.7}],
+        [{'chunk_id': 'b', 'similarity_score': 0.6}, {'chunk_id': 'a', 'similarity_score': 0.4}]
+    ]
+    
+    fused = reciprocal_rank_fusion(rankings, k=2, rrf_k=60)
+    
+    assert [chunk['chunk_id'] for chunk in fused] == ['b', 'a']
+    assert fused[0]['similarity_score'] == 0.8
+    assert fused[0]['rrf_score'] == 1 / 62 + 1 / 61 + 1 / 61
+    assert len(reciprocal_rank_fusion(rankings)) == 3
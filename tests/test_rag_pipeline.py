@@ -1,7 +1,13 @@
 """Tests for RAG pipeline."""
+import time
 import pytest
-from unittest.mock import Mock, MagicMock
-from src.rag_pipeline import RAGPipeline, RAGResult
+from unittest.mock import ANY, Mock, MagicMock
+import numpy as np
+from src.cache import CACHE_REQUESTS, AnswerCache, MemoryCache, SemanticCache
+from src.deadline import Deadline, DeadlineExceeded
+from src.llm_client import GenerationStats
+from src.rag_pipeline import OverloadPolicy, RAGPipeline, RAGResult
+from src.utils import PhaseTimer
 
 @pytest.fixture
 def mock_embedding_manager():
@@ -42,6 +48,86 @@ def test_retrieve(pipeline, mock_embedding_manager):
     assert results[0]['source_title'] == 'Test Contract'
     mock_embedding_manager.search.assert_called_once()
 
+def test_retrieve_mmr(mock_embedding_manager, mock_llm_client):
+    """Test that configured MMR diversification is passed to the search."""
+    pipeline = RAGPipeline(
+        embedding_manager=mock_embedding_manager,
+        llm_client=mock_llm_client,
+        retriever_config={'top_k': 3, 'mmr_lambda': 0.6, 'mmr_fetch_k': 30}
+    )
+    
+    pipeline.retrieve("What is clause A?")
+    
+    mock_embedding_manager.search.assert_called_once_with(
+        "What is clause A?", k=3, timer=None, mmr_lambda=0.6, fetch_k=30
+    )
+
+def test_retrieve_rerank(mock_embedding_manager, mock_llm_client):
+    """Test that the reranker picks top_k out of rerank_candidates."""
+    reranker = Mock()
+    reranker.rerank.return_value = ['best']
+    pipeline = RAGPipeline(
+        embedding_manager=mock_embedding_manager,
+        llm_client=mock_llm_client,
+        retriever_config={'top_k': 3},
+        reranker=reranker,
+        rerank_candidates=10
+    )
+    
+    assert pipeline.retrieve("What is clause A?") == ['best']
+    mock_embedding_manager.search.assert_called_once_with("What is clause A?", k=10, timer=None)
+    reranker.rerank.assert_called_once_with(
+        "What is clause A?", mock_embedding_manager.search.return_value, 3, timer=None
+    )
+
+def test_retrieve_multi_query(mock_embedding_manager, mock_llm_client):
+    """Test that query variants are searched in one batch and fused."""
+    mock_embedding_manager.search_batch.return_value = [
+        [{'chunk_id': 'a', 'similarity_score': 0.9}, {'chunk_id': 'b', 'similarity_score': 0.8}],
+        [{'chunk_id': 'b', 'similarity_score': 0.85}, {'chunk_id': 'c', 'similarity_score': 0.7}]
+    ]
+    pipeline = RAGPipeline(
+        embedding_manager=mock_embedding_manager,
+        llm_client=mock_llm_client,
+        retriever_config={'top_k': 2},
+        multi_query_variants=1
+    )
+    
+    results = pipeline.retrieve("Can the tenant sublet?")
+    
+    mock_embedding_manager.search_batch.assert_called_once_with(
+        ["Can the tenant sublet?", "Can the lessee sublet?"], k=2, timer=None
+    )
+    mock_embedding_manager.search.assert_not_called()
+    assert [chunk['chunk_id'] for chunk in results] == ['b', 'a']
+
+def test_multi_query_llm_rewrites(mock_embedding_manager, mock_llm_client):
+    """Test LLM rewrites, skipped for answers that must not use the LLM, and MMR after fusion."""
+    mock_embedding_manager.search_batch.return_value = [[{
+        'chunk_id': 'a', 'content': 'Rent is due.', 'source_title': 'Lease', 'similarity_score': 0.9, 'chunk_index': 0
+    }]] * 3
+    mock_embedding_manager.diversify.side_effect = lambda embedding, chunks, k, lambda_mult: chunks[:k]
+    mock_embedding_manager.encode_queries.return_value = np.array([[1.0, 0.0]])
+    mock_embedding_manager.embedding_generator.encode.return_value = np.array([[1.0, 0.0]])
+    mock_llm_client.generate_batch.return_value = ["When is rent payable?"]
+    pipeline = RAGPipeline(
+        embedding_manager=mock_embedding_manager,
+        llm_client=mock_llm_client,
+        retriever_config={'top_k': 1, 'mmr_lambda': 0.5, 'mmr_fetch_k': 8},
+        multi_query_variants=2,
+        multi_query_llm=True
+    )
+    
+    pipeline.retrieve("When is rent due?")
+    mock_llm_client.generate_batch.assert_called_once()
+    assert mock_embedding_manager.search_batch.call_args.kwargs == {'k': 8, 'timer': None}
+    mock_embedding_manager.diversify.assert_called_once()
+    
+    pipeline.query("When is rent due?", answer_mode="extractive", use_cache=False)
+    pipeline.query("When is rent due?", degrade_reason="queue_depth", use_cache=False)
+    mock_llm_client.generate_batch.assert_called_once()
+    mock_llm_client.generate.assert_not_called()
+
 def test_generate(pipeline, mock_llm_client):
     """Test generation."""
     chunks = [{
@@ -79,3 +165,341 @@ def test_empty_retrieval(pipeline, mock_embedding_manager):
     result = pipeline.query("Unknown topic?", use_rag=True)
     
     assert "do not contain" in result.answer.lower() or result.answer != ""
+
+def test_query_generation_params(pipeline, mock_llm_client, mock_embedding_manager):
+    """Test per-request generation parameters reach the LLM client."""
+    mock_embedding_manager.search.return_value = [{
+        'chunk_id': 'doc1_chunk_0',
+        'content': 'Test content',
+        'source_title': 'Test Doc',
+        'chunk_index': 0,
+        'similarity_score': 0.9
+    }]
+    
+    pipeline.query("Test question?", temperature=0.0, max_tokens=16, stop=["\n\n"])
+    
+    _, kwargs = mock_llm_client.generate.call_args
+    assert isinstance(kwargs.pop('stats'), GenerationStats)
+    assert kwargs == {'temperature': 0.0, 'max_tokens': 16, 'stop': ["\n\n"]}
+
+def test_query_timings_and_tokens(pipeline, mock_llm_client, mock_embedding_manager):
+    """Test the per-stage breakdown and token accounting on the result."""
+    def generate(system_prompt, user_message, stats=None, **kwargs):
+        stats.prompt_tokens = 120
+        stats.completion_tokens = 11
+        stats.prefill_ms = 50.0
+        stats.decode_ms = 500.0
+        return "Answer"
+    
+    mock_llm_client.generate.side_effect = generate
+    
+    result = pipeline.query("Test question?", use_rag=False)
+    
+    assert result.prompt_tokens == 120
+    assert result.completion_tokens == 11
+    assert result.tokens_per_second == pytest.approx(20.0)
+    assert result.timings['prefill'] == 50.0
+    assert result.timings['decode'] == 500.0
+    assert {'prompt_assembly', 'generation'} <= set(result.timings)
+    assert result.to_dict()['timings'] == result.timings
+
+def test_query_timer_from_retrieval(pipeline, mock_embedding_manager):
+    """Test that retrieval run separately shares its timer with query."""
+    mock_embedding_manager.search.return_value[0]['chunk_index'] = 0
+    timer = PhaseTimer()
+    timer.add('query_embedding', 3.0)
+    chunks = pipeline.retrieve("Test question?", timer=timer)
+    
+    result = pipeline.query("Test question?", retrieved_chunks=chunks, timer=timer)
+    
+    mock_embedding_manager.search.assert_called_once_with("Test question?", k=3, timer=timer)
+    assert result.timings['query_embedding'] == 3.0
+    assert 'generation' in result.timings
+
+def test_query_deadline_exceeded(pipeline, mock_llm_client):
+    """Test that an expired deadline stops the query before generation."""
+    deadline = Deadline(timeout=0.0)
+    
+    with pytest.raises(DeadlineExceeded):
+        pipeline.query("Test question?", use_rag=False, deadline=deadline)
+    
+    mock_llm_client.generate.assert_not_called()
+
+def test_query_truncated(pipeline, mock_llm_client):
+    """Test that a generation cut short by the deadline is flagged."""
+    deadline = Deadline(timeout=30.0)
+    
+    def generate(system_prompt, user_message, deadline=None, **kwargs):
+        deadline.triggered = True
+        return "Partial answer"
+    
+    mock_llm_client.generate.side_effect = generate
+    
+    result = pipeline.query("Test question?", use_rag=False, deadline=deadline)
+    
+    assert result.truncated is True
+    assert result.answer == "Partial answer"
+
+def test_query_batch(pipeline, mock_embedding_manager, mock_llm_client):
+    """Test batched retrieval and generation."""
+    chunk = {
+        'chunk_id': 'doc1_chunk_0',
+        'content': 'Test content',
+        'source_title': 'Test Doc',
+        'chunk_index': 0,
+        'similarity_score': 0.8
+    }
+    mock_embedding_manager.search_batch.return_value = [[chunk, chunk], [chunk, chunk]]
+    mock_llm_client.generate_batch.side_effect = lambda prompts, **kwargs: [f"answer {i}" for i in range(len(prompts))]
+    
+    results = pipeline.query_batch([
+        {'question': 'First?', 'top_k': 1},
+        {'question': 'Second?'},
+        {'question': 'Third?', 'use_rag': False, 'max_tokens': 8}
+    ])
+    
+    # One encode + search for both RAG questions, one generate_batch per parameter set
+    mock_embedding_manager.search_batch.assert_called_once_with(['First?', 'Second?'], k=3, timer=ANY)
+    assert mock_llm_client.generate_batch.call_count == 2
+    
+    assert [r.question for r in results] == ['First?', 'Second?', 'Third?']
+    assert len(results[0].sources) == 1
+    assert len(results[1].sources) == 2
+    assert results[2].sources == []
+    assert [r.answer for r in results] == ['answer 0', 'answer 1', 'answer 0']
+
+def test_query_batch_llm_batch_size(pipeline, mock_llm_client):
+    """Test that a large group is generated in micro-batches of llm_batch_size."""
+    pipeline.llm_batch_size = 2
+    mock_llm_client.generate_batch.side_effect = lambda prompts, **kwargs: [
+        user_message.split()[1] for _, user_message in prompts
+    ]
+    
+    results = pipeline.query_batch([{'question': f'Q{i}?', 'use_rag': False} for i in range(5)])
+    
+    assert [len(call.args[0]) for call in mock_llm_client.generate_batch.call_args_list] == [2, 2, 1]
+    assert [r.answer for r in results] == [f'Q{i}?' for i in range(5)]
+
+def test_query_batch_answer_modes(pipeline, mock_embedding_manager, mock_llm_client):
+    """Test that batch items honour answer_mode like query()."""
+    chunk = {
+        'chunk_id': 'doc1_chunk_0',
+        'content': 'Rent is due monthly.',
+        'source_title': 'Lease',
+        'chunk_index': 0,
+        'similarity_score': 0.8
+    }
+    mock_embedding_manager.search_batch.return_value = [[chunk], [chunk], [chunk]]
+    mock_embedding_manager.encode_queries.return_value = np.array([[1.0, 0.0]])
+    mock_embedding_manager.embedding_generator.encode.return_value = np.array([[0.6, 0.8]])
+    mock_llm_client.generate_batch.side_effect = lambda prompts, **kwargs: ["generated"] * len(prompts)
+    
+    results = pipeline.query_batch([
+        {'question': 'When is rent due?', 'answer_mode': 'extractive'},
+        {'question': 'When is rent due?', 'answer_mode': 'auto'},
+        {'question': 'When is rent due?', 'answer_mode': 'bogus'}
+    ])
+    
+    assert results[0].extractive is True
+    assert results[0].answer == "Rent is due monthly. [Lease]"
+    assert results[0].confidence_score == pytest.approx(0.6)
+    assert results[1].extractive is False and results[1].answer == "generated"
+    assert isinstance(results[2], ValueError)
+    assert [len(call.args[0]) for call in mock_llm_client.generate_batch.call_args_list] == [1]
+    
+    pipeline.extractive_threshold = 0.5
+    results = pipeline.query_batch([{'question': 'When is rent due?', 'answer_mode': 'auto'}])
+    assert results[0].extractive is True
+    mock_llm_client.generate_batch.assert_called_once()
+
+def test_query_batch_item_errors(pipeline, mock_embedding_manager, mock_llm_client):
+    """Test that one failing item does not fail the batch."""
+    mock_llm_client.generate_batch.side_effect = RuntimeError("batch failed")
+    
+    def generate(system_prompt, user_message, **kwargs):
+        if 'Bad?' in user_message:
+            raise ValueError("bad item")
+        return "ok"
+    
+    mock_llm_client.generate.side_effect = generate
+    
+    results = pipeline.query_batch([
+        {'question': 'Good?', 'use_rag': False},
+        {'question': 'Bad?', 'use_rag': False}
+    ])
+    
+    assert results[0].answer == "ok"
+    assert isinstance(results[1], ValueError)
+
+def test_query_answer_cache(mock_embedding_manager, mock_llm_client):
+    """Test that repeated questions are served from the cache until the index changes."""
+    mock_embedding_manager.search.return_value[0]['chunk_index'] = 0
+    mock_embedding_manager.index.version = "v1"
+    pipeline = RAGPipeline(
+        embedding_manager=mock_embedding_manager,
+        llm_client=mock_llm_client,
+        retriever_config={'top_k': 3},
+        cache=AnswerCache(MemoryCache())
+    )
+    
+    first = pipeline.query("What is clause A?")
+    second = pipeline.query("  what is CLAUSE a? ")
+    other_params = pipeline.query("What is clause A?", max_tokens=8)
+    
+    assert first.cached is False
+    assert second.cached is True
+    assert second.answer == first.answer
+    assert second.question == "  what is CLAUSE a? "
+    assert other_params.cached is False
+    assert mock_llm_client.generate.call_count == 2
+    
+    mock_embedding_manager.index.version = "v2"
+    assert pipeline.query("What is clause A?").cached is False
+    
+    # A caller that already checked cached_result() is not counted twice
+    misses = CACHE_REQUESTS.value(result="miss")
+    assert pipeline.cached_result("What is clause B?", 3, True, "auto") is None
+    assert pipeline.query("What is clause B?", top_k=3, check_answer_cache=False).cached is False
+    assert CACHE_REQUESTS.value(result="miss") == misses + 1
+
+def test_query_semantic_cache(mock_embedding_manager, mock_llm_client):
+    """Test that a paraphrase retrieving the same chunks reuses the answer."""
+    mock_embedding_manager.search.return_value[0]['chunk_index'] = 0
+    mock_embedding_manager.encode_queries.return_value = np.array([[1.0, 0.0]])
+    pipeline = RAGPipeline(
+        embedding_manager=mock_embedding_manager,
+        llm_client=mock_llm_client,
+        retriever_config={'top_k': 3},
+        semantic_cache=SemanticCache(embedding_dim=2, threshold=0.9)
+    )
+    
+    first = pipeline.query("What does the NDA require of the recipient?")
+    second = pipeline.query("Recipient obligations in the NDA")
+    bypassed = pipeline.query("Recipient obligations in the NDA", use_cache=False)
+    
+    assert second.cached is True
+    assert second.answer == first.answer
+    assert 'semantic_cache' in second.timings
+    assert bypassed.cached is False
+    assert mock_llm_client.generate.call_count == 2
+
+def test_query_degraded_under_overload(mock_embedding_manager, mock_llm_client):
+    """Test that an overloaded pipeline answers extractively without the LLM."""
+    policy = OverloadPolicy(max_queue_depth=2)
+    policy.queue_depth = lambda: 5
+    mock_embedding_manager.encode_queries.return_value = np.array([[1.0, 0.0]])
+    mock_embedding_manager.embedding_generator.encode.return_value = np.array([[1.0, 0.0]])
+    pipeline = RAGPipeline(
+        embedding_manager=mock_embedding_manager,
+        llm_client=mock_llm_client,
+        retriever_config={'top_k': 3},
+        cache=AnswerCache(MemoryCache()),
+        overload_policy=policy
+    )
+    
+    result = pipeline.query("What is the test contract?")
+    
+    assert result.degraded is True
+    assert result.answer == "This is a test contract. [Test Contract]"
+    assert result.sources[0]['chunk_id'] == 'doc1_chunk_0'
+    assert 'extractive' in result.timings
+    mock_embedding_manager.embedding_generator.encode.assert_called_once()
+    mock_llm_client.generate.assert_not_called()
+    assert pipeline.cache.get(pipeline._cache_key("What is the test contract?", None, True, {})) is None
+    
+    mock_embedding_manager.search.return_value[0]['chunk_index'] = 0
+    result = pipeline.query("What is the test contract?", allow_degraded=False)
+    assert result.degraded is False
+    mock_llm_client.generate.assert_called_once()
+
+def test_query_extractive_modes(mock_embedding_manager, mock_llm_client):
+    """Test extractive answers without the LLM, and auto mode's confidence threshold."""
+    mock_embedding_manager.search.return_value[0]['content'] = 'Clause A covers payment. The weather is nice.'
+    mock_embedding_manager.search.return_value[0]['chunk_index'] = 0
+    mock_embedding_manager.encode_queries.return_value = np.array([[1.0, 0.0]])
+    mock_embedding_manager.embedding_generator.encode.side_effect = lambda texts, **kwargs: np.array(
+        [[0.8, 0.6] if 'Clause A' in text else [0.0, 1.0] for text in texts]
+    )
+    pipeline = RAGPipeline(
+        embedding_manager=mock_embedding_manager,
+        llm_client=mock_llm_client,
+        retriever_config={'top_k': 3},
+        extractive_sentences=1,
+        extractive_threshold=0.9
+    )
+    
+    result = pipeline.query("What does clause A cover?", answer_mode="extractive")
+    assert result.extractive is True
+    assert result.answer == "Clause A covers payment. [Test Contract]"
+    assert result.confidence_score == pytest.approx(0.8)
+    assert 'extractive' in result.timings
+    mock_llm_client.generate.assert_not_called()
+    
+    # Best sentence below the threshold: auto falls back to the LLM
+    result = pipeline.query("What does clause A cover?")
+    assert result.extractive is False
+    mock_llm_client.generate.assert_called_once()
+    
+    pipeline.extractive_threshold = 0.5
+    result = pipeline.query("What does clause A cover?")
+    assert result.extractive is True
+    mock_llm_client.generate.assert_called_once()
+    
+    with pytest.raises(ValueError):
+        pipeline.query("What does clause A cover?", answer_mode="summarize")
+
+def test_query_safety_checks(mock_embedding_manager, mock_llm_client):
+    """Test critical safety checks inline and the rest deferred."""
+    mock_embedding_manager.search.return_value[0]['chunk_index'] = 0
+    mock_llm_client.generate.return_value = "I cannot answer that."
+    pipeline = RAGPipeline(
+        embedding_manager=mock_embedding_manager,
+        llm_client=mock_llm_client,
+        retriever_config={'top_k': 3},
+        safety_checks=True
+    )
+    
+    result = pipeline.query("What is clause A?")
+    assert list(result.safety) == ['refusal']
+    assert result.safety['refusal']['passed'] is False
+    assert 'safety_checks' in result.timings
+    
+    pipeline.run_deferred_safety_checks(result)
+    assert set(result.safety) == {'refusal', 'source_grounding', 'length'}
+    assert result.safety['length']['passed'] is False
+    
+    pipeline.defer_safety_checks = False
+    result = pipeline.query("What is clause A?")
+    assert set(result.safety) == {'refusal', 'source_grounding', 'length'}
+    
+    assert pipeline.query("What is clause A?", use_rag=False).safety is None
+
+def test_check_grounding(pipeline, mock_embedding_manager):
+    """Test embedding grounding with chunk vectors taken from the index."""
+    mock_embedding_manager.embedding_generator.encode.return_value = np.array([[1.0, 0.0], [0.0, 1.0]])
+    mock_embedding_manager.chunk_embeddings.return_value = np.array([[1.0, 0.1]])
+    
+    check = pipeline.check_grounding(
+        "Clause A requires payment. The moon is made of cheese. [Doc]",
+        mock_embedding_manager.search.return_value
+    )
+    
+    mock_embedding_manager.embedding_generator.encode.assert_called_once_with(
+        ["Clause A requires payment.", "The moon is made of cheese."], show_progress_bar=False
+    )
+    assert check['passed'] is False
+    assert check['unsupported'] == ["The moon is made of cheese."]
+    assert check['support'] < 0.35
+
+def test_overload_policy_latency_window():
+    """Test that slow generations trigger shedding until they age out."""
+    policy = OverloadPolicy(max_latency_ms=100.0, window=0.05)
+    assert policy.reason() is None
+    
+    policy.observe_generation(20.0)
+    policy.observe_generation(500.0)
+    assert policy.reason() == "latency"
+    
+    time.sleep(0.06)
+    assert policy.p95_latency_ms() is None
+    assert policy.reason() is None
@@ -0,0 +1,66 @@
+"""Tests for cross-encoder reranking."""
+from unittest.mock import Mock
+import pytest
+import src.reranker as reranker_module
+from src.reranker import CrossEncoderReranker
+
+CHUNKS = [
+    {'chunk_id': 'a', 'content': 'Rent is due monthly.'},
+    {'chunk_id': 'b', 'content': 'The lease may be terminated with notice.'},
+    {'chunk_id': 'c', 'content': 'Termination requires 30 days notice.'}
+]
+
+@pytest.fixture
+def reranker(monkeypatch):
+    """Reranker whose model scores a pair by the number of shared words."""
+    model = Mock()
+    model.predict.side_effect = lambda pairs, **kwargs: [
+        len(set(query.lower().split()) & set(content.lower().split())) for query, content in pairs
+    ]
+    monkeypatch.setattr("src.reranker.CrossEncoder", Mock(return_value=model))
+    return CrossEncoderReranker("stub", cache_size=4)
+
+def test_loads_local_model(reranker):
+    """Test the model arguments (sentence-transformers 2.3 has no local_files_only)."""
+    reranker_module.CrossEncoder.assert_called_once_with("stub", device="cpu", max_length=512)
+
+def test_rerank_keeps_best(reranker):
+    """Test that chunks are reordered by score and cut to k."""
+    results = reranker.rerank("termination requires the lease terminated", CHUNKS, k=2)
+    
+    assert [r['chunk_id'] for r in results] == ['b', 'c']
+    assert results[0]['rerank_score'] > results[1]['rerank_score']
+    assert 'rerank_score' not in CHUNKS[1]
+    assert reranker.rerank("anything", [], k=2) == []
+
+def test_rerank_score_cache(reranker):
+    """Test that cached pairs are not scored again, in one batch for the rest."""
+    reranker.score("termination notice", CHUNKS[:2])
+    reranker.score("termination notice", CHUNKS)
+    
+    calls = reranker.model.predict.call_args_list
+    assert len(calls) == 2
+    assert calls[1].args[0] == [("termination notice", CHUNKS[2]['content'])]
+    
+    # LRU bound
+    reranker.score("another question", CHUNKS)
+    assert len(reranker._scores) == 4
+
+def test_rerank_batch_one_predict(reranker):
+    """Test that the uncached pairs of all queries are scored in one call."""
+    results = reranker.rerank_batch(
+        ["lease terminated", "rent due"],
+        [CHUNKS, CHUNKS[:2]],
+        [1, 1]
+    )
+    
+    assert [[r['chunk_id'] for r in chunks] for chunks in results] == [['b'], ['a']]
+    reranker.model.predict.assert_called_once()
+    assert len(reranker.model.predict.call_args.args[0]) == 5
+    assert reranker.model.predict.call_args.kwargs['batch_size'] == 5
+    
+    # Forward passes are capped at batch_size pairs
+    reranker.batch_size = 2
+    reranker.score("other question", CHUNKS)
+    assert reranker.model.predict.call_args.kwargs['batch_size'] == 2
+    assert reranker.rerank_batch(["q"], [[]], [3]) == [[]]
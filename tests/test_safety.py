@@ -1,4 +1,5 @@
 """Tests for safety checks."""
+import numpy as np
 import pytest
 from src.safety import SafetyChecker
 
@@ -12,6 +13,24 @@ def test_detect_refusal():
     # Should not detect refusal
     refused, msg = SafetyChecker.detect_refusal("Based on the documents, the answer is...")
     assert refused is False
+    
+    # The earliest phrase in the answer is reported
+    refused, msg = SafetyChecker.detect_refusal("The fee is Not Specified; the documents do not contain it.")
+    assert refused is True
+    assert msg == "Detected refusal pattern: 'not specified'"
+
+def test_check_embedding_grounding():
+    """Test that sentences far from every chunk are flagged."""
+    chunks = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    sentences = np.array([[2.0, 0.1, 0.0], [0.0, 0.0, 1.0]])
+    
+    passed, msg, support = SafetyChecker.check_embedding_grounding(sentences, chunks, threshold=0.5)
+    assert passed is False
+    assert "1 of 2" in msg
+    assert support[0] > 0.9 and support[1] == pytest.approx(0.0)
+    
+    passed, msg, support = SafetyChecker.check_embedding_grounding(sentences[:1], chunks, threshold=0.5)
+    assert passed is True
 
 def test_check_appropriate_length():
     """Test length validation."""
@@ -43,3 +62,6 @@ def test_validate_response():
     assert 'refusal' in checks
     assert 'length' in checks
     assert 'source_grounding' in checks
+    
+    refusal_only = SafetyChecker.validate_response(answer, chunks, "What is clause A?", only=['refusal'])
+    assert list(refusal_only) == ['refusal']
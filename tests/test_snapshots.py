@@ -0,0 +1,74 @@
+"""Tests for versioned index snapshots and hot swap."""
+from types import SimpleNamespace
+from unittest.mock import Mock
+import numpy as np
+import pytest
+from api.startup import reload_index
+from src.embedding_manager import FAISSIndex
+from src.snapshots import current_snapshot, load_snapshot, prune_snapshots, set_current, write_snapshot
+
+def make_index(n: int) -> FAISSIndex:
+    index = FAISSIndex(embedding_dim=4)
+    index.add(np.random.rand(n, 4).astype(np.float32), [{'chunk_id': f'chunk_{i}'} for i in range(n)])
+    return index
+
+def test_write_and_load_snapshot(tmp_path):
+    """Test that a snapshot round-trips and becomes current only via set_current."""
+    index = make_index(3)
+    snapshot = write_snapshot(index, tmp_path, embedding_model="stub")
+    
+    assert current_snapshot(tmp_path) is None
+    assert not [p for p in tmp_path.iterdir() if p.name.startswith(".tmp")]
+    
+    set_current(tmp_path, snapshot)
+    loaded, manifest = load_snapshot(current_snapshot(tmp_path))
+    
+    assert manifest['embedding_model'] == "stub"
+    assert manifest['num_vectors'] == 3
+    assert loaded.version == index.version
+    assert loaded.snapshot == snapshot.name
+    assert loaded.chunk_metadata == index.chunk_metadata
+
+def test_load_snapshot_checksum_mismatch(tmp_path):
+    """Test that a modified snapshot file is rejected."""
+    snapshot = write_snapshot(make_index(2), tmp_path)
+    with open(snapshot / "faiss_index_metadata.json", 'a') as f:
+        f.write(" ")
+    
+    with pytest.raises(ValueError, match="checksum"):
+        load_snapshot(snapshot)
+
+def test_prune_snapshots_keeps_current(tmp_path):
+    """Test that pruning removes old snapshots but never the current one."""
+    snapshots = [write_snapshot(make_index(n), tmp_path) for n in (1, 2, 3)]
+    set_current(tmp_path, snapshots[0])
+    
+    prune_snapshots(tmp_path, keep=1)
+    
+    assert sorted(p.name for p in tmp_path.iterdir() if p.is_dir()) == sorted([snapshots[0].name, snapshots[2].name])
+
+def test_reload_index(tmp_path):
+    """Test swapping the current snapshot into a running pipeline."""
+    set_current(tmp_path, write_snapshot(make_index(5), tmp_path, embedding_model="stub"))
+    old_index = make_index(2)
+    manager = SimpleNamespace(
+        index=old_index,
+        metric="l2",
+        update_lock=Mock(__enter__=Mock(), __exit__=Mock(return_value=False)),
+        embedding_generator=SimpleNamespace(model_name="stub", embedding_dim=4)
+    )
+    config = SimpleNamespace(
+        data=SimpleNamespace(snapshot_dir=tmp_path),
+        rag=SimpleNamespace(index_mmap=False)
+    )
+    
+    result = reload_index(SimpleNamespace(embedding_manager=manager), config)
+    
+    assert manager.index.index.ntotal == 5
+    assert result['previous_version'] == old_index.version
+    assert result['version'] == manager.index.version
+    assert old_index.index.ntotal == 2
+    
+    manager.embedding_generator.model_name = "other"
+    with pytest.raises(ValueError, match="built with stub"):
+        reload_index(SimpleNamespace(embedding_manager=manager), config)
@@ -0,0 +1,33 @@
+"""Tests for startup progress reporting."""
+import json
+from api.startup import StartupProgress
+
+def test_startup_progress_without_history(tmp_path):
+    """Test that the ETA is unknown on a first start and history is saved when ready."""
+    path = tmp_path / "startup_timings.json"
+    progress = StartupProgress(path)
+    
+    with progress.timer.phase("index"):
+        assert progress.phase == "index"
+        assert progress.eta_seconds() is None
+    
+    progress.finish()
+    
+    assert progress.ready is True
+    assert progress.eta_seconds() == 0.0
+    assert set(json.loads(path.read_text())) == {"index"}
+
+def test_startup_progress_eta_from_history(tmp_path):
+    """Test that the ETA counts down the phases still to run."""
+    path = tmp_path / "startup_timings.json"
+    path.write_text(json.dumps({"embedding_model": 2000.0, "index": 6000.0, "llm": 2000.0}))
+    progress = StartupProgress(path)
+    
+    with progress.timer.phase("embedding_model"):
+        pass
+    
+    assert 7.9 < progress.eta_seconds() <= 8.0
+    assert 0.19 < progress.fraction_done() <= 0.2
+    
+    progress.fail("out of memory")
+    assert progress.eta_seconds() is None